@@ -20,8 +20,5 @@ def main():
 
 
 if __name__ == '__main__':
-    # database = DatabaseManager()
-    # for i in range(3000, 3500):
-    #     database.add_player_from_id(i)
-    # Раскомментировать для быстрого заполнения базы
+    # Для быстрого заполнения базы: python manage.py crawl 3000-3500
     main()
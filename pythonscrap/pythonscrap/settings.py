@@ -41,6 +41,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # Первым, чтобы в замер попадала вся обработка запроса (метрики на /metrics)
+    'scraper.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -86,6 +88,45 @@ DATABASES = {
     }
 }
 
+# Асинхронные представления (scraper/async_views.py) для запуска под ASGI, например:
+# ASYNC_VIEWS=1 uvicorn pythonscrap.asgi:application
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', '0') == '1'
+
+# Журнал приложения. LOG_LEVEL задаёт уровень сообщений scraper, а LOG_SAMPLE_RATE — долю
+# сообщений DEBUG и INFO, которые попадают в журнал (предупреждения и ошибки пишутся всегда)
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+LOG_SAMPLE_RATE = float(os.getenv('LOG_SAMPLE_RATE', 1))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'filters': {
+        'sampled': {
+            '()': 'scraper.services.log_sampling.SamplingFilter',
+            'rate': LOG_SAMPLE_RATE,
+        },
+    },
+    'formatters': {
+        'plain': {
+            'format': '%(asctime)s %(levelname)s %(name)s: %(message)s',
+        },
+    },
+    'handlers': {
+        'console': {
+            'class': 'logging.StreamHandler',
+            'formatter': 'plain',
+            'filters': ['sampled'],
+        },
+    },
+    'loggers': {
+        'scraper': {
+            'handlers': ['console'],
+            'level': LOG_LEVEL,
+            'propagate': False,
+        },
+    },
+}
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
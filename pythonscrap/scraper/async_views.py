@@ -0,0 +1,205 @@
+# scraper/async_views.py
+# Асинхронные версии представлений из views.py для запуска под ASGI (ASYNC_VIEWS=1).
+# Запросы к базе идут через AsyncDatabaseManager, а скрапинг — задачами asyncio,
+# поэтому медленные ответы gomafia.pro не занимают потоки сервера.
+from django.http import HttpResponse, JsonResponse
+from django.shortcuts import render
+from django.utils.cache import get_conditional_response
+from django.utils.safestring import mark_safe
+from django.views.decorators.http import require_safe
+from scraper.db.async_database import AsyncDatabaseManager
+from scraper.services.jobs import AsyncScrapeJobQueue
+from scraper.services.statistics import StatisticsCache
+from scraper.services.downsampling import downsample
+from scraper.services.metrics import PROMETHEUS_CONTENT_TYPE, REGISTRY
+from scraper.views import (_elo_chart_params, _elo_etag, _job_status_response, _player_not_found,
+                           _search_params, _search_response, _validators, _with_cache_headers)
+
+
+async def index(request):
+    return render(request, 'scraper/main.html')
+
+
+async def player_tournaments(request):
+    tournaments = []
+    player_id = None
+    job_id = None
+    error = None
+    database = AsyncDatabaseManager()
+
+    if request.method == 'POST':
+        new_player_id = request.POST.get('new_player_id')  # Получаем новый ID игрока
+        player_id = request.POST.get('player_id')  # Получаем ID из выпадающего списка
+
+        if new_player_id:  # Приоритет нового ID
+            try:
+                player_id = int(new_player_id)
+                if await database.is_player_exists(player_id):
+                    tournaments = await database.get_tournaments_by_user_id(player_id)
+                else:
+                    job_id = await AsyncScrapeJobQueue().enqueue(player_id)
+            except Exception as e:
+                error = f"Ошибка получения данных: {str(e)}"
+        elif player_id:  # Если введен только ID из списка
+            try:
+                player_id = int(player_id)
+                tournaments = await database.get_tournaments_by_user_id(player_id)
+            except Exception as e:
+                error = f"Ошибка получения данных: {str(e)}"
+        else:
+            error = "Выберите игрока или введите его ID."
+    elif request.GET.get('player_id'):  # Переход со страницы после завершения фонового скрапинга
+        try:
+            player_id = int(request.GET['player_id'])
+            tournaments = await database.get_tournaments_by_user_id(player_id)
+        except Exception as e:
+            error = f"Ошибка получения данных: {str(e)}"
+
+    return render(request, 'scraper/player_tournaments.html', {
+        'player_id': player_id,
+        'tournaments': tournaments,
+        'job_id': job_id,
+        'error': error,
+    })
+
+
+async def player_elo_graph(request):
+    database = AsyncDatabaseManager()
+    error = None
+    job_id = None
+    dates_json = []
+    elo_values_json = []
+    player_id = request.GET.get('player_id')  # Получаем ID игрока из GET-запроса
+    bucket, method, points = _elo_chart_params(request)
+    if player_id:
+        try:
+            if await database.is_player_exists(int(player_id)):
+                for date, elo in await database.get_elo_series(int(player_id), bucket):
+                    dates_json.append(date)
+                    elo_values_json.append(elo)
+                if method:
+                    dates_json, elo_values_json = downsample(dates_json, elo_values_json, method, points)
+            else:
+                job_id = await AsyncScrapeJobQueue().enqueue(int(player_id))
+        except ValueError:
+            error = "Неверный формат ID игрока. Пожалуйста, введите число."
+
+    return render(request, 'scraper/player_elo_graph.html', {
+        'player_id': player_id,
+        'dates_json': dates_json,
+        'elo_values_json': elo_values_json,
+        'bucket': bucket,
+        'downsample': method,
+        'points': points,
+        'job_id': job_id,
+        'error': error
+    })
+
+
+async def player_search(request):
+    """Поиск игроков для автодополнения, параметры как у views.player_search."""
+    query, limit, after_login, after_id = _search_params(request)
+    if not query.strip():
+        return JsonResponse({'results': [], 'next': None})
+    rows = await AsyncDatabaseManager().search_users(query, limit + 1, after_login, after_id)
+    return _search_response(rows, limit)
+
+
+async def scrape_job_status(request, job_id):
+    """Возвращает статус фоновой задачи скрапинга для опроса со страниц игрока."""
+    return _job_status_response(await AsyncScrapeJobQueue().get_status(job_id))
+
+
+async def _get_statistics():
+    """Статистика из кэша процесса; при смене версии перечитывается асинхронно."""
+    database = AsyncDatabaseManager()
+    version = (await database.get_stats_meta())['version']
+    cache = StatisticsCache()
+    return cache.peek(version) or cache.store(version, await database.get_tournament_count_by_city(),
+                                              await database.get_tournament_load_by_date())
+
+
+async def statistics_view(request):
+    stats = await _get_statistics()
+
+    return render(request, 'scraper/statistics.html', {
+        'cities_json': mark_safe(stats['cities_json']),  # [{"city": ..., "count": ...}]
+        'dates_json': mark_safe(stats['dates_json']),  # [{"date": ..., "count": ...}]
+    })
+
+
+async def _conditional_json(request, etag, last_modified, build_payload):
+    """Как views._conditional_json, но build_payload — корутина, которая вызывается только для ответа 200."""
+    etag, last_modified = _validators(etag, last_modified)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = JsonResponse(await build_payload())
+    return _with_cache_headers(response, etag, last_modified)
+
+
+@require_safe
+async def api_player_tournaments(request, player_id):
+    """Турниры игрока в JSON. ETag строится из версии последнего скрапинга игрока."""
+    database = AsyncDatabaseManager()
+    version = await database.get_player_version(player_id)
+    if version is None:
+        return _player_not_found(player_id)
+
+    async def build_payload():
+        return {'player_id': player_id, 'tournaments': await database.get_tournaments_by_user_id(player_id)}
+
+    return await _conditional_json(request, f"tournaments-{player_id}-{version['scrape_version']}",
+                                   version['scraped_at'], build_payload)
+
+
+@require_safe
+async def api_player_roles(request, player_id):
+    """Статистика игрока по ролям (игры, победы, процент побед) в JSON."""
+    database = AsyncDatabaseManager()
+    version = await database.get_player_version(player_id)
+    if version is None:
+        return _player_not_found(player_id)
+
+    async def build_payload():
+        return {'player_id': player_id, 'roles': await database.get_role_stats(player_id)}
+
+    return await _conditional_json(request, f"roles-{player_id}-{version['scrape_version']}",
+                                   version['scraped_at'], build_payload)
+
+
+@require_safe
+async def api_player_elo(request, player_id):
+    """Ряд ELO игрока в JSON, параметры как у views.api_player_elo."""
+    bucket, method, points = _elo_chart_params(request)
+    database = AsyncDatabaseManager()
+    version = await database.get_player_version(player_id)
+    if version is None:
+        return _player_not_found(player_id)
+
+    async def build_payload():
+        series = await database.get_elo_series(player_id, bucket)
+        dates = [date for date, _ in series]
+        values = [elo for _, elo in series]
+        if method:
+            dates, values = downsample(dates, values, method, points)
+        return {'player_id': player_id, 'bucket': bucket, 'downsample': method, 'dates': dates, 'elo': values}
+
+    return await _conditional_json(request, _elo_etag(player_id, version, bucket, method, points),
+                                   version['scraped_at'], build_payload)
+
+
+@require_safe
+async def api_statistics(request):
+    """Сводная статистика турниров в JSON. ETag строится из версии stats_meta."""
+    meta = await AsyncDatabaseManager().get_stats_meta()
+
+    async def build_payload():
+        stats = await _get_statistics()
+        return {'cities': stats['cities'], 'dates': stats['dates']}
+
+    return await _conditional_json(request, f"stats-{meta['version']}", meta['updated_at'], build_payload)
+
+
+async def metrics(request):
+    """Метрики процесса в формате Prometheus, как views.metrics."""
+    return HttpResponse(REGISTRY.render(), content_type=PROMETHEUS_CONTENT_TYPE)
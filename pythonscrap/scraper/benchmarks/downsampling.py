@@ -0,0 +1,62 @@
+"""
+Скорость прореживания ряда ELO: векторный LTTB и min/max против эталонного LTTB на чистом Python.
+
+Ряд синтетический — случайное блуждание ELO на заданном количестве турниров.
+
+Запуск из каталога pythonscrap:
+    python -m scraper.benchmarks.downsampling [--points 10000] [--target 500] [--repeat 20]
+"""
+import argparse
+import timeit
+import numpy as np
+from scraper.services.downsampling import lttb_indices, lttb_indices_python, minmax_indices
+
+
+def make_series(points, seed=7113):
+    """Возвращает синтетический ряд: дни от начала отсчёта и накопленное ELO."""
+    rng = np.random.default_rng(seed)
+    x = np.cumsum(rng.integers(1, 8, points)).astype(np.float64)
+    y = 1000 + np.cumsum(rng.normal(0, 15, points))
+    return x, y
+
+
+def run(points=10000, target=500, repeat=20):
+    """Замеряет каждую реализацию и возвращает среднее время в миллисекундах."""
+    x, y = make_series(points)
+    x_list, y_list = x.tolist(), y.tolist()
+
+    # Площади считаются в разном порядке операций, поэтому при почти равных треугольниках
+    # реализации могут выбрать разные точки; сверяется только форма результата
+    expected = target if 3 <= target < points else points
+    for indices in (lttb_indices(x, y, target), lttb_indices_python(x_list, y_list, target)):
+        indices = np.asarray(indices)
+        if len(indices) != expected or indices[0] != 0 or indices[-1] != points - 1:
+            raise Exception("LTTB вернул неверное количество точек или потерял концы ряда")
+        if not (np.diff(indices) > 0).all():
+            raise Exception("LTTB вернул неупорядоченные индексы")
+    minmax = minmax_indices(y, target)
+    if y[minmax].max() != y.max() or y[minmax].min() != y.min():
+        raise Exception("min/max потерял пик ряда")
+
+    timings = {
+        "lttb_numpy": lambda: lttb_indices(x, y, target),
+        "lttb_python": lambda: lttb_indices_python(x_list, y_list, target),
+        "minmax_numpy": lambda: minmax_indices(y, target),
+    }
+    return {name: timeit.timeit(func, number=repeat) / repeat * 1000 for name, func in timings.items()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--points", type=int, default=10000, help="Длина исходного ряда")
+    parser.add_argument("--target", type=int, nargs="+", default=[500, 50], help="Сколько точек оставить")
+    parser.add_argument("--repeat", type=int, default=20, help="Количество повторов")
+    args = parser.parse_args()
+
+    for target in args.target:
+        for name, ms in run(args.points, target, args.repeat).items():
+            print(f"{args.points} -> {target}: {name} {ms:.3f} ms")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,48 @@
+"""
+Сравнение скорости извлечения __NEXT_DATA__: быстрый поиск подстрок против полного разбора BeautifulSoup.
+
+Запуск из каталога pythonscrap:
+    python -m scraper.benchmarks.extract_next_data [--repeat 200] [страница.html ...]
+"""
+import argparse
+import glob
+import os
+import timeit
+from scraper.services.gomafia_scraper import find_next_data, soup_next_data
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+
+def benchmark_page(html_content, repeat):
+    """Возвращает среднее время (в миллисекундах) обоих способов извлечения на одной странице."""
+    if find_next_data(html_content) != soup_next_data(html_content):
+        raise Exception("Быстрый и полный разбор вернули разные данные")
+
+    fast = timeit.timeit(lambda: find_next_data(html_content), number=repeat) / repeat
+    soup = timeit.timeit(lambda: soup_next_data(html_content), number=repeat) / repeat
+    return {"fast_ms": fast * 1000, "soup_ms": soup * 1000, "speedup": soup / fast}
+
+
+def run(paths=None, repeat=200):
+    """Замеряет оба способа на каждой странице и возвращает результаты по именам файлов."""
+    paths = paths or sorted(glob.glob(os.path.join(FIXTURES_DIR, "*.html")))
+    results = {}
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            results[os.path.basename(path)] = benchmark_page(f.read(), repeat)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("paths", nargs="*", help="HTML-страницы (по умолчанию все файлы из fixtures)")
+    parser.add_argument("--repeat", type=int, default=200, help="Количество повторов на страницу")
+    args = parser.parse_args()
+
+    for name, result in run(args.paths, args.repeat).items():
+        print(f"{name}: fast {result['fast_ms']:.3f} ms, BeautifulSoup {result['soup_ms']:.3f} ms, "
+              f"ускорение x{result['speedup']:.1f}")
+
+
+if __name__ == "__main__":
+    main()
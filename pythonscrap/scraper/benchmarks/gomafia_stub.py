@@ -0,0 +1,166 @@
+"""
+Локальная замена gomafia.pro для замеров: HTTP-сервер, который отдаёт синтетические страницы истории
+с __NEXT_DATA__ в том же формате, что и сайт.
+
+Количество страниц истории, игр в турнире и задержка ответа настраиваются. Турниры выбираются
+из общего набора, поэтому у разных игроков они пересекаются, как на настоящем сайте.
+
+Запуск из каталога pythonscrap (сервер работает до Ctrl+C):
+    python -m scraper.benchmarks.gomafia_stub [--port 8001] [--pages 3] [--latency 0.05]
+"""
+import argparse
+import functools
+import json
+import os
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from scraper.benchmarks.insert_rows import BENCH_TOURNAMENT_BASE
+from scraper.services.gomafia_scraper import PlayerScraper, parse_next_data
+
+FIXTURE_PAGE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures", "player_history_page.html")
+NOT_FOUND_HTML = "<html><body><h1>Игрок не найден</h1></body></html>"
+
+ROLES = [("red", "Мирный"), ("sheriff", "Шериф"), ("mafia", "Мафия"), ("don", "Дон")]
+RESULTS = [("city", "Мирные"), ("mafia", "Мафия")]
+CITIES = ["Иркутск", "Москва", "Казань", "Новосибирск", "Санкт-Петербург"]
+
+
+class GomafiaStub:
+    """
+    Сервер заглушки в фоновом потоке. У каждого игрока pages полных страниц истории
+    по PlayerScraper.PAGE_SIZE турниров, в каждом турнире games_per_tournament игр.
+    Игроки из missing_ids отвечают страницей «Игрок не найден».
+    """
+    PAGE_PATTERN = re.compile(r"^/stats/(\d+)\?tab=history&page=(\d+)$")
+
+    def __init__(self, pages=3, games_per_tournament=10, latency=0.0, tournament_pool=5000,
+                 missing_ids=(), host="127.0.0.1", port=0):
+        if tournament_pool < pages * PlayerScraper.PAGE_SIZE:
+            raise ValueError("Набор турниров меньше истории одного игрока")
+        self.pages = pages
+        self.games_per_tournament = games_per_tournament
+        self.latency = latency
+        self.tournament_pool = tournament_pool
+        self.missing_ids = set(missing_ids)
+        self.requests = 0
+        self._requests_lock = threading.Lock()
+        with open(FIXTURE_PAGE, encoding="utf-8") as f:
+            # Профиль игрока берём с настоящей страницы, чтобы набор полей совпадал с сайтом
+            self._user = parse_next_data(f.read())["props"]["pageProps"]["serverData"]["user"]
+        self._server = ThreadingHTTPServer((host, port), self._handler_class())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        """Адрес для PlayerScraper.BASE_URL."""
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/stats/"
+
+    @property
+    def history_total(self):
+        return self.pages * PlayerScraper.PAGE_SIZE
+
+    def _handler_class(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"  # keep-alive, как у настоящего сайта
+
+            def do_GET(self):
+                match = stub.PAGE_PATTERN.match(self.path)
+                if match is None:
+                    self._reply(404, "<html><body>Not found</body></html>")
+                    return
+                with stub._requests_lock:
+                    stub.requests += 1
+                if stub.latency:
+                    time.sleep(stub.latency)
+                self._reply(200, stub.page(int(match.group(1)), int(match.group(2))))
+
+            def _reply(self, status, html):
+                body = html.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def tournament(self, tournament_id, player_id, index):
+        """Турнир в формате истории gomafia.pro; данные самого турнира зависят только от его ID."""
+        n = tournament_id - BENCH_TOURNAMENT_BASE
+        date_start = f"20{10 + n % 15:02d}-{1 + n % 12:02d}-{1 + n % 28:02d}"
+        games = []
+        for game_num in range(1, self.games_per_tournament + 1):
+            role, role_translate = ROLES[(player_id + n + game_num) % len(ROLES)]
+            win, win_translate = RESULTS[(n + game_num) % len(RESULTS)]
+            games.append({"game_num": str(game_num), "role": role, "role_translate": role_translate,
+                          "place": str(1 + (player_id + game_num) % 10), "win": win, "win_translate": win_translate,
+                          "elo": (player_id + game_num) % 41 - 20})
+        return {"id": str(tournament_id), "title": f"Турнир {n}", "date_start": date_start, "date_end": date_start,
+                "country_translate": "Россия", "city_translate": CITIES[n % len(CITIES)],
+                "place": str(1 + (player_id + index) % 50), "gg": "10.00", "elo": (player_id + index) % 131 - 50,
+                "games": games}
+
+    @functools.lru_cache(maxsize=4096)
+    def page(self, player_id, page):
+        """HTML страницы истории игрока; страницы кэшируются, чтобы их построение не попадало в замер."""
+        if player_id in self.missing_ids:
+            return NOT_FOUND_HTML
+        first = (page - 1) * PlayerScraper.PAGE_SIZE
+        history = []
+        for index in range(first, min(first + PlayerScraper.PAGE_SIZE, self.history_total)):
+            tournament_id = BENCH_TOURNAMENT_BASE + (player_id * 37 + index) % self.tournament_pool
+            history.append(self.tournament(tournament_id, player_id, index))
+        user = dict(self._user, id=str(player_id), login=f"bench{player_id}")
+        next_data = {"props": {"pageProps": {"serverData": {
+            "user": user, "history": history, "historyTotal": self.history_total,
+        }}}}
+        return ('<!DOCTYPE html><html><head><title>gomafia</title></head><body><div id="__next"></div>'
+                f'<script id="__NEXT_DATA__" type="application/json">{json.dumps(next_data, ensure_ascii=False)}'
+                '</script></body></html>')
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name="gomafia-stub", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+        if self._thread is not None:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8001, help="Порт сервера")
+    parser.add_argument("--pages", type=int, default=3, help="Страниц истории у каждого игрока")
+    parser.add_argument("--games", type=int, default=10, help="Игр в каждом турнире")
+    parser.add_argument("--latency", type=float, default=0.0, help="Задержка ответа в секундах")
+    args = parser.parse_args()
+
+    stub = GomafiaStub(args.pages, args.games, args.latency, port=args.port).start()
+    print(f"Заглушка gomafia.pro: GOMAFIA_BASE_URL={stub.url}")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        stub.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,154 @@
+"""
+Сравнение скорости записи игр и турниров: построчные INSERT против пакетной вставки DatabaseManager.
+
+SQLite замеряется на базе в памяти, PostgreSQL — на базе из переменных окружения POSTGRES_*
+внутри транзакции, которая затем откатывается.
+
+Запуск из каталога pythonscrap:
+    python -m scraper.benchmarks.insert_rows [--games 5000] [--tournaments 500] [--postgres]
+"""
+import argparse
+import random
+import sqlite3
+import time
+
+BENCH_USER_ID = -1  # Временный пользователь, под которым пишутся строки замера
+BENCH_TOURNAMENT_BASE = 2_000_000_000  # ID турниров замера в PostgreSQL, чтобы не пересекаться с настоящими
+
+
+def make_rows(games_count, tournaments_count):
+    """Генерирует синтетические игры и турниры в формате PlayerScraper.extract_data."""
+    roles = [("red", "Мирный"), ("sheriff", "Шериф"), ("mafia", "Мафия"), ("don", "Дон")]
+    wins = [("city", "Мирные"), ("mafia", "Мафия")]
+    games = []
+    per_tournament = max(tournaments_count, 1)
+    for i in range(games_count):
+        role, role_translate = random.choice(roles)
+        win, win_translate = random.choice(wins)
+        # Игры распределяются по турнирам по кругу, номер игры растёт с каждым кругом
+        games.append({'tournament_id': str(i % per_tournament), 'game_num': str(i // per_tournament + 1),
+                      'role': role, 'role_translate': role_translate, 'place': str(random.randint(1, 10)),
+                      'win': win, 'win_translate': win_translate, 'elo': random.randint(-20, 30)})
+    tournaments = []
+    for i in range(tournaments_count):
+        tournaments.append({'id': str(i), 'title': f"Турнир {i}", 'date_start': f"2024-{i % 12 + 1:02d}-01",
+                            'date_end': f"2024-{i % 12 + 1:02d}-02", 'country_translate': "Россия",
+                            'city_translate': random.choice(["Иркутск", "Москва", "Казань"]),
+                            'place': str(random.randint(1, 50)), 'gg': "10.00", 'elo': random.randint(-50, 80)})
+    return games, tournaments
+
+
+def measure(insert, games, tournaments):
+    """Возвращает количество записанных строк в секунду."""
+    started = time.perf_counter()
+    insert([dict(game) for game in games], [dict(tournament) for tournament in tournaments])
+    return (len(games) + len(tournaments)) / (time.perf_counter() - started)
+
+
+def bench_sqlite(games, tournaments):
+    from scraper.db.postgres import DatabaseManager as SqliteDatabaseManager
+
+    # Экземпляр в обход синглтона, чтобы не трогать файл user_data.db
+    database = object.__new__(SqliteDatabaseManager)
+    database._conn = sqlite3.connect(":memory:")
+    database._conn.row_factory = sqlite3.Row
+    database._create_tables()
+    cursor = database._conn.cursor()
+
+    def row_by_row(games_data, tournaments_data):
+        for game in games_data:
+            game['user_id'] = BENCH_USER_ID
+            cursor.execute("""
+            INSERT INTO games (user_id, role, role_translate, place, win, win_translate, elo)
+            VALUES (:user_id, :role, :role_translate, :place, :win, :win_translate, :elo)
+            """, game)
+        for tournament in tournaments_data:
+            tournament['user_id'] = BENCH_USER_ID
+            cursor.execute("""
+            INSERT INTO tournaments (user_id, title, date_start, date_end, country_translate,
+            city_translate, place, gg, elo)
+            VALUES (:user_id, :title, :date_start, :date_end, :country_translate,
+            :city_translate, :place, :gg, :elo)
+            """, tournament)
+
+    def batched(games_data, tournaments_data):
+        database._insert_games(cursor, BENCH_USER_ID, games_data)
+        database._insert_tournaments(cursor, BENCH_USER_ID, tournaments_data)
+
+    results = {}
+    for name, insert in (("row_by_row", row_by_row), ("batched", batched)):
+        results[name] = measure(insert, games, tournaments)
+        database._conn.rollback()
+    database._conn.close()
+    return results
+
+
+def bench_postgres(games, tournaments):
+    from scraper.db.database import DatabaseManager
+
+    database = DatabaseManager()
+    results = {}
+    for name in ("row_by_row", "batched"):
+        with database._connection() as conn, conn.cursor() as cursor:
+            cursor.execute("INSERT INTO users (id, login) VALUES (%s, %s)", (BENCH_USER_ID, "benchmark"))
+
+            def row_by_row(games_data, tournaments_data):
+                for tournament in tournaments_data:
+                    tournament['user_id'] = BENCH_USER_ID
+                    tournament['tournament_id'] = BENCH_TOURNAMENT_BASE + int(tournament['id'])
+                    cursor.execute("""
+                    INSERT INTO tournaments (id, title, date_start, date_end, country_translate, city_translate)
+                    VALUES (%(tournament_id)s, %(title)s, %(date_start)s, %(date_end)s, %(country_translate)s,
+                    %(city_translate)s)
+                    ON CONFLICT (id) DO NOTHING
+                    """, tournament)
+                    cursor.execute("""
+                    INSERT INTO participations (user_id, tournament_id, place, gg, elo)
+                    VALUES (%(user_id)s, %(tournament_id)s, %(place)s, %(gg)s, %(elo)s)
+                    """, tournament)
+                for game in games_data:
+                    game['user_id'] = BENCH_USER_ID
+                    game['tournament_id'] = BENCH_TOURNAMENT_BASE + int(game['tournament_id'])
+                    cursor.execute("""
+                    INSERT INTO games (user_id, tournament_id, game_num, role_id, place, win_id, elo)
+                    VALUES (%(user_id)s, %(tournament_id)s, %(game_num)s,
+                    (SELECT id FROM game_roles WHERE code = %(role)s), %(place)s,
+                    (SELECT id FROM game_results WHERE code = %(win)s), %(elo)s)
+                    """, game)
+
+            def batched(games_data, tournaments_data):
+                for tournament in tournaments_data:
+                    tournament['id'] = str(BENCH_TOURNAMENT_BASE + int(tournament['id']))
+                for game in games_data:
+                    game['tournament_id'] = str(BENCH_TOURNAMENT_BASE + int(game['tournament_id']))
+                database._insert_tournaments(cursor, BENCH_USER_ID, tournaments_data)
+                database._insert_games(cursor, BENCH_USER_ID, games_data)
+
+            results[name] = measure(row_by_row if name == "row_by_row" else batched, games, tournaments)
+            conn.rollback()
+    return results
+
+
+def run(games_count=5000, tournaments_count=500, postgres=False):
+    """Замеряет обе стратегии записи и возвращает строки в секунду по каждой базе."""
+    games, tournaments = make_rows(games_count, tournaments_count)
+    results = {"sqlite": bench_sqlite(games, tournaments)}
+    if postgres:
+        results["postgres"] = bench_postgres(games, tournaments)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=5000, help="Количество игр")
+    parser.add_argument("--tournaments", type=int, default=500, help="Количество турниров")
+    parser.add_argument("--postgres", action="store_true", help="Также замерить PostgreSQL из POSTGRES_*")
+    args = parser.parse_args()
+
+    for backend, result in run(args.games, args.tournaments, args.postgres).items():
+        print(f"{backend}: построчно {result['row_by_row']:.0f} строк/с, пакетно {result['batched']:.0f} строк/с, "
+              f"ускорение x{result['batched'] / result['row_by_row']:.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,173 @@
+"""
+Набор замеров для отслеживания регрессий производительности между запусками.
+
+Замеряются: разбор страницы истории, запись строк в базу (см. insert_rows), полный цикл
+add_player_from_id против локальной заглушки gomafia.pro (см. gomafia_stub) и задержки p50/p99
+четырёх страниц сайта. Результат — JSON, который можно сохранить и сравнить со следующим запуском.
+
+Замер пишет игроков и турниры только во временную базу (см. scraper.db.temporary), которая создаётся
+на сервере из POSTGRES_* и удаляется после запуска; с базой из POSTGRES_DB замер работать отказывается.
+
+Запуск из каталога pythonscrap:
+    python manage.py benchmark [--output result.json] [--baseline previous.json]
+"""
+import platform
+import time
+import timeit
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from django.test import Client
+from django.urls import reverse
+from scraper.benchmarks import insert_rows
+from scraper.benchmarks.gomafia_stub import FIXTURE_PAGE, GomafiaStub
+from scraper.db.database import DatabaseManager
+from scraper.db.temporary import is_temporary_database, temporary_database
+from scraper.services.gomafia_scraper import PlayerScraper, parse_next_data
+from scraper.services.http_client import HttpClient
+
+BENCH_PLAYER_BASE = 2_100_000_000  # ID игроков замера, чтобы не пересекаться с настоящими
+VIEWS = {
+    "index": lambda player_id: reverse("index"),
+    "player_tournaments": lambda player_id: f"{reverse('player_tournaments')}?player_id={player_id}",
+    "player_elo_graph": lambda player_id: f"{reverse('player_elo_graph')}?player_id={player_id}",
+    "stats": lambda player_id: reverse("stats"),
+}
+DEFAULT_CONFIG = {
+    "players": 50,  # Игроков в замере add_player_from_id
+    "pages": 3,  # Страниц истории у каждого игрока
+    "games": 10,  # Игр в каждом турнире
+    "latency": 0.0,  # Задержка ответа заглушки в секундах
+    "workers": 8,  # Игроков, добавляемых одновременно
+    "parse_repeat": 200,  # Повторов разбора страницы
+    "view_repeat": 200,  # Запросов к каждой странице
+    "insert_games": 5000,  # Игр в замере записи строк
+    "insert_tournaments": 500,  # Турниров в замере записи строк
+}
+
+
+def percentile(values, q):
+    """Перцентиль q (0..100) по ближайшему рангу."""
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, round(q / 100 * len(ordered)) - 1))]
+
+
+def bench_parse(stub, repeat):
+    """Среднее время разбора одной страницы истории (__NEXT_DATA__ и extract_data) в миллисекундах."""
+    with open(FIXTURE_PAGE, encoding="utf-8") as f:
+        pages = {"fixture": f.read(), "synthetic": stub.page(BENCH_PLAYER_BASE, 1)}
+
+    def parse(html_content):
+        scraper = PlayerScraper(BENCH_PLAYER_BASE)
+        scraper.next_data.append(parse_next_data(html_content))
+        return scraper.extract_data()
+
+    results = {}
+    for name, html_content in pages.items():
+        results[f"parse.{name}_page_ms"] = timeit.timeit(lambda: parse(html_content), number=repeat) / repeat * 1000
+    return results
+
+
+def bench_insert(games_count, tournaments_count):
+    """Строки в секунду при построчной и пакетной записи в SQLite и PostgreSQL."""
+    results = {}
+    for backend, result in insert_rows.run(games_count, tournaments_count, postgres=True).items():
+        for strategy, rows_per_s in result.items():
+            results[f"insert.{backend}_{strategy}_rows_per_s"] = rows_per_s
+    return results
+
+
+def bench_scrape(database, stub, player_ids, workers):
+    """Пропускная способность полного цикла add_player_from_id против заглушки."""
+    requests_before = stub.requests
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        statuses = list(executor.map(database.add_player_from_id, player_ids))
+    elapsed = time.perf_counter() - started
+    failed = [player_id for player_id, status in zip(player_ids, statuses) if status.get("status") != "success"]
+    if failed:
+        raise Exception(f"Не удалось добавить игроков замера: {failed[:10]}")
+    return {
+        "scrape.players_per_s": len(player_ids) / elapsed,
+        "scrape.pages_per_s": (stub.requests - requests_before) / elapsed,
+    }
+
+
+def bench_views(player_ids, repeat):
+    """Задержки p50/p99 страниц сайта в миллисекундах; запросы идут в процессе, без сети."""
+    client = Client(SERVER_NAME="localhost")
+    results = {}
+    for name, url_for in VIEWS.items():
+        timings = []
+        for i in range(repeat):
+            url = url_for(player_ids[i % len(player_ids)])
+            started = time.perf_counter()
+            response = client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise Exception(f"Страница {url} вернула HTTP {response.status_code}")
+        results[f"views.{name}.p50_ms"] = percentile(timings, 50)
+        results[f"views.{name}.p99_ms"] = percentile(timings, 99)
+    return results
+
+
+def check_database(database):
+    """Отказывается запускать замер не на временной базе, чтобы не писать в рабочую."""
+    with database._connection() as conn, conn.cursor() as cursor:
+        cursor.execute("SELECT current_database() AS name")
+        name = cursor.fetchone()['name']
+    if not is_temporary_database(name):
+        raise Exception(f"Замер запускается только на временной базе, а не на {name}")
+
+
+def run(**config):
+    """Выполняет все замеры и возвращает {"meta": ..., "metrics": {имя: значение}}."""
+    config = {**DEFAULT_CONFIG, **config}
+    http = HttpClient()
+    player_ids = list(range(BENCH_PLAYER_BASE, BENCH_PLAYER_BASE + config["players"]))
+    metrics = {}
+
+    base_url, cache, rate_limiter = PlayerScraper.BASE_URL, http.cache, http.rate_limiter
+    with temporary_database(), GomafiaStub(config["pages"], config["games"], config["latency"]) as stub:
+        database = DatabaseManager()
+        check_database(database)
+        PlayerScraper.BASE_URL, http.cache, http.rate_limiter = stub.url, None, None
+        try:
+            metrics.update(bench_parse(stub, config["parse_repeat"]))
+            metrics.update(bench_insert(config["insert_games"], config["insert_tournaments"]))
+            metrics.update(bench_scrape(database, stub, player_ids, config["workers"]))
+            metrics.update(bench_views(player_ids, config["view_repeat"]))
+        finally:
+            PlayerScraper.BASE_URL, http.cache, http.rate_limiter = base_url, cache, rate_limiter
+
+    return {
+        "meta": {
+            "created_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "config": config,
+        },
+        "metrics": metrics,
+    }
+
+
+def lower_is_better(name):
+    """Время (…_ms) должно уменьшаться, пропускная способность (…_per_s) — расти."""
+    return name.endswith("_ms")
+
+
+def compare(current, baseline, threshold=0.2):
+    """
+    Сравнивает результаты с базовыми и возвращает список изменений
+    {"metric", "baseline", "current", "change", "regression"}; change — относительное изменение,
+    положительное значение означает ухудшение. Регрессия — ухудшение больше threshold.
+    """
+    changes = []
+    for name, value in sorted(current["metrics"].items()):
+        base = baseline["metrics"].get(name)
+        if not base:
+            continue
+        change = (value - base) / base if lower_is_better(name) else (base - value) / base
+        changes.append({"metric": name, "baseline": base, "current": value, "change": change,
+                        "regression": change > threshold})
+    return changes
+
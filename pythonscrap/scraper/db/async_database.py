@@ -0,0 +1,316 @@
+import asyncio
+import logging
+import threading
+from contextlib import asynccontextmanager
+from typing import List, Dict, Optional
+from psycopg import AsyncConnection, AsyncCursor
+from psycopg.conninfo import make_conninfo
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+from ..services.gomafia_scraper import AsyncPlayerScraper, PlayerNotFoundError
+from ..services.metrics import record_query
+from .database import (DatabaseManager, ELO_BUCKET_SERIES_SQL, ELO_SERIES_SQL, RECLAIM_STALE_JOB_SQL, ROLE_STATS_SQL,
+                       SEARCH_USERS_SQL, TOURNAMENTS_BY_USER_SQL, _timed, search_users_params)
+
+logger = logging.getLogger(__name__)
+
+
+class _CountingAsyncCursor(AsyncCursor):
+    """AsyncCursor, который учитывает выполненные запросы в метриках текущего HTTP-запроса."""
+
+    async def execute(self, query, params=None, **kwargs):
+        record_query()
+        return await super().execute(query, params, **kwargs)
+
+
+class AsyncDatabaseManager:
+    """
+    Асинхронный доступ к базе данных для ASGI-представлений на psycopg3 с пулом AsyncConnectionPool.
+    Запросы чтения выполняются в цикле событий и не занимают потоки. Запись скачанного игрока
+    (пакетные INSERT и пересчёт статистики) выполняет DatabaseManager в отдельном потоке: она занимает
+    доли секунды, а скрапинг, на который уходит почти всё время, идёт асинхронно.
+    Пул привязан к циклу событий, поэтому для каждого цикла создаётся свой экземпляр.
+    """
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __new__(cls):
+        loop = asyncio.get_running_loop()
+        with cls._instances_lock:
+            instance = cls._instances.get(loop)
+            if instance is None:
+                # Экземпляры закрытых циклов больше не нужны
+                for closed in [key for key in cls._instances if key.is_closed()]:
+                    del cls._instances[closed]
+                instance = super().__new__(cls)
+                instance._pool = None
+                instance._pool_lock = asyncio.Lock()
+                instance._sync = None
+                instance._inflight = {}  # ID игрока -> задача добавления, выполняемая сейчас в этом цикле
+                cls._instances[loop] = instance
+        return instance
+
+    async def _get_pool(self) -> AsyncConnectionPool:
+        """Открывает пул при первом обращении."""
+        if self._pool is None:
+            async with self._pool_lock:
+                if self._pool is None:
+                    # Синхронный менеджер применяет миграции схемы и выполняет запись игроков
+                    self._sync = await asyncio.to_thread(DatabaseManager)
+                    pool = AsyncConnectionPool(
+                        self._conninfo(),
+                        min_size=DatabaseManager.POOL_MIN,
+                        max_size=DatabaseManager.POOL_MAX,
+                        timeout=DatabaseManager.POOL_TIMEOUT,
+                        kwargs={"row_factory": dict_row, "cursor_factory": _CountingAsyncCursor},
+                        open=False,
+                    )
+                    try:
+                        await pool.open(wait=True)
+                    except Exception as e:
+                        logger.error("Ошибка подключения к базе данных: %s", e)
+                        raise
+                    self._pool = pool
+        return self._pool
+
+    @staticmethod
+    def _conninfo() -> str:
+        """Строка подключения из тех же переменных окружения POSTGRES_*, что и у DatabaseManager."""
+        return make_conninfo(**DatabaseManager._connection_params())
+
+    async def _fetchone(self, query: str, params=None) -> Optional[Dict]:
+        """Выполняет запрос в отдельной транзакции и возвращает первую строку или None."""
+        pool = await self._get_pool()
+        async with pool.connection() as conn:
+            cursor = await conn.execute(query, params)
+            return await cursor.fetchone()
+
+    async def _fetchall(self, query: str, params=None) -> List[Dict]:
+        """Выполняет запрос в отдельной транзакции и возвращает все строки."""
+        pool = await self._get_pool()
+        async with pool.connection() as conn:
+            cursor = await conn.execute(query, params)
+            return await cursor.fetchall()
+
+    @_timed
+    async def is_player_exists(self, player_id: int) -> bool:
+        """Проверяет, существует ли игрок с данным ID в базе данных."""
+        return await self._fetchone("SELECT 1 FROM users WHERE id = %s AND load_id IS NULL", (player_id,)) is not None
+
+    @_timed
+    async def get_player_version(self, player_id: int) -> Optional[Dict]:
+        """Возвращает {"scrape_version", "scraped_at"} игрока или None, если его нет в базе."""
+        return await self._fetchone("SELECT scrape_version, scraped_at FROM users WHERE id = %s AND load_id IS NULL",
+                                    (player_id,))
+
+    @_timed
+    async def get_tournaments_by_user_id(self, user_id: int) -> List[Dict]:
+        """Получает массив турниров по ID игрока."""
+        return await self._fetchall(TOURNAMENTS_BY_USER_SQL, {"user_id": user_id})
+
+    @_timed
+    async def get_elo_series(self, player_id: int, bucket: str = None) -> List[tuple]:
+        """Возвращает ряд (дата, ELO) игрока, как DatabaseManager.get_elo_series, но без кэша в памяти."""
+        if bucket is not None and bucket not in DatabaseManager.ELO_BUCKETS:
+            raise ValueError(f"Неизвестный период группировки: {bucket}")
+        params = {"start_elo": DatabaseManager.START_ELO, "user_id": player_id, "bucket": bucket}
+        rows = await self._fetchall(ELO_SERIES_SQL if bucket is None else ELO_BUCKET_SERIES_SQL, params)
+        return [(row['date'], row['elo']) for row in rows]
+
+    @_timed
+    async def get_role_stats(self, player_id: int) -> List[Dict]:
+        """Статистика игрока по ролям: количество игр, побед и процент побед."""
+        return await self._fetchall(ROLE_STATS_SQL, {"user_id": player_id})
+
+    @_timed
+    async def get_stats_meta(self) -> Dict:
+        """Возвращает {"version", "updated_at"} сводной статистики."""
+        row = await self._fetchone("SELECT version, updated_at FROM stats_meta WHERE id = 1")
+        return row or {"version": 0, "updated_at": None}
+
+    @_timed
+    async def get_tournament_count_by_city(self) -> List[Dict]:
+        """Получает количество турниров по городам из сводной таблицы."""
+        return await self._fetchall("""
+        SELECT city, count FROM city_tournament_stats WHERE count > 0 ORDER BY count DESC
+        """)
+
+    @_timed
+    async def get_tournament_load_by_date(self) -> List[Dict]:
+        """Получает нагрузку по количеству турниров на каждую дату из сводной таблицы."""
+        return await self._fetchall("""
+        SELECT to_char(date, 'YYYY-MM-DD') AS date, count FROM date_tournament_stats WHERE count > 0
+        ORDER BY count DESC
+        """)
+
+    @_timed
+    async def search_users(self, query: str, limit: int = 20, after_login: str = None,
+                           after_id: int = None) -> List[Dict]:
+        """Ищет игроков по логину или ID, как DatabaseManager.search_users."""
+        return await self._fetchall(SEARCH_USERS_SQL, search_users_params(query, limit, after_login, after_id))
+
+    @_timed
+    async def create_scrape_job(self, player_id: int, stale_after: float = None) -> Dict:
+        """
+        Ставит скрапинг игрока в очередь, как DatabaseManager.create_scrape_job:
+        возвращает {"id", "created", "reclaimed"}, брошенную задачу возвращает в очередь.
+        """
+        pool = await self._get_pool()
+        while True:
+            async with pool.connection() as conn:
+                cursor = await conn.execute("""
+                INSERT INTO scrape_jobs (player_id) VALUES (%s)
+                ON CONFLICT (player_id) WHERE status IN ('queued', 'running') DO NOTHING
+                RETURNING id
+                """, (player_id,))
+                row = await cursor.fetchone()
+                if row:
+                    return {"id": row['id'], "created": True, "reclaimed": False}
+                cursor = await conn.execute("""
+                SELECT id FROM scrape_jobs WHERE player_id = %s AND status IN ('queued', 'running')
+                """, (player_id,))
+                row = await cursor.fetchone()
+                # Задача могла завершиться между INSERT и SELECT — тогда пробуем снова
+                if row:
+                    reclaimed = False
+                    if stale_after is not None:
+                        cursor = await conn.execute(RECLAIM_STALE_JOB_SQL,
+                                                    {"id": row['id'], "stale_after": stale_after})
+                        reclaimed = await cursor.fetchone() is not None
+                    return {"id": row['id'], "created": False, "reclaimed": reclaimed}
+
+    @_timed
+    async def get_pending_scrape_jobs(self, stale_after: float) -> List[Dict]:
+        """Возвращает задачи, ожидающие выполнения, как DatabaseManager.get_pending_scrape_jobs."""
+        pool = await self._get_pool()
+        async with pool.connection() as conn:
+            await conn.execute("""
+            UPDATE scrape_jobs SET status = 'queued', started_at = NULL
+            WHERE status = 'running' AND started_at < now() - make_interval(secs => %s)
+            """, (stale_after,))
+            cursor = await conn.execute("SELECT id, player_id FROM scrape_jobs WHERE status = 'queued' ORDER BY id")
+            return await cursor.fetchall()
+
+    @_timed
+    async def claim_scrape_job(self, job_id: int) -> bool:
+        """Атомарно переводит задачу из очереди в работу; False, если её уже забрал другой обработчик."""
+        return await self._fetchone("""
+        UPDATE scrape_jobs SET status = 'running', started_at = now()
+        WHERE id = %s AND status = 'queued'
+        RETURNING id
+        """, (job_id,)) is not None
+
+    @_timed
+    async def finish_scrape_job(self, job_id: int, error: str = None):
+        """Отмечает задачу выполненной или, если передана ошибка, завершившейся с ошибкой."""
+        pool = await self._get_pool()
+        async with pool.connection() as conn:
+            await conn.execute("""
+            UPDATE scrape_jobs SET status = %s, error = %s, finished_at = now()
+            WHERE id = %s
+            """, ('failed' if error else 'done', error, job_id))
+
+    @_timed
+    async def get_scrape_job(self, job_id: int) -> Optional[Dict]:
+        """Возвращает задачу скрапинга по ID или None."""
+        return await self._fetchone("""
+        SELECT id, player_id, status, error, created_at, started_at, finished_at
+        FROM scrape_jobs WHERE id = %s
+        """, (job_id,))
+
+    @asynccontextmanager
+    async def _player_lock(self, player_id: int):
+        """
+        Та же advisory-блокировка по ID игрока, что и DatabaseManager._player_lock, поэтому скрапинг
+        одного игрока разделяется и между ASGI-воркерами, и с синхронными процессами. Держится на отдельном
+        соединении вне пула; при отмене задачи ожидание блокировки прерывается вместе с соединением.
+        """
+        conn = await AsyncConnection.connect(self._conninfo(), autocommit=True)
+        try:
+            await conn.execute("SELECT pg_advisory_lock(%s, %s)", (DatabaseManager.PLAYER_LOCK_NAMESPACE, player_id))
+            yield
+        finally:
+            # Закрытие соединения снимает и его блокировки
+            await conn.close()
+
+    async def add_player_from_id(self, player_id: int) -> Dict[str, str]:
+        """
+        Добавляет игрока в базу данных на основе ID.
+        Одновременные вызовы для одного ID в цикле событий ждут единственный скрапинг и получают его результат,
+        а между процессами скрапинг разделяется advisory-блокировкой.
+        """
+        player_id = int(player_id)
+        task = self._inflight.get(player_id)
+        if task is None:
+            task = asyncio.create_task(self._add_player_locked(player_id))
+            self._inflight[player_id] = task
+            task.add_done_callback(lambda _: self._inflight.pop(player_id, None))
+        # shield: отмена одного запроса не прерывает скрапинг для остальных ожидающих
+        return await asyncio.shield(task)
+
+    async def _add_player_locked(self, player_id: int) -> Dict[str, str]:
+        """Скрапит игрока под advisory-блокировкой, если его ещё нет в базе."""
+        async with self._player_lock(player_id):
+            # Пока ждали блокировку, игрока мог добавить другой процесс
+            if await self.is_player_exists(player_id):
+                return {"status": "success"}
+            return await self._scrape_and_insert_player(player_id)
+
+    async def _scrape_and_insert_player(self, player_id: int) -> Dict[str, str]:
+        """
+        Скачивает игрока асинхронным скраппером и записывает его в базу пакетами по мере разбора страниц,
+        как DatabaseManager.insert_player_stream.
+        """
+        scraper = AsyncPlayerScraper(player_id)
+        batches = scraper.iter_batches()
+        try:
+            # Первый пакет заполняет профиль игрока; его ошибки обрабатываются так же, как ошибки следующих
+            first = await anext(batches, None)
+            load_id = await asyncio.to_thread(self._sync.begin_player_load, scraper.user_data)
+            if load_id is None:
+                await batches.aclose()
+                return {"status": "success"}
+            batch = first
+            while batch is not None:
+                await asyncio.to_thread(self._sync.write_player_batch, player_id, load_id, *batch)
+                batch = await anext(batches, None)
+            await asyncio.to_thread(self._sync.finish_player_load, player_id, load_id)
+            return {"status": "success"}
+        except PlayerNotFoundError:
+            logger.warning("Игрока с ID %s нет на gomafia.pro.", player_id)
+            return {"status": "error"}
+        except Exception as e:
+            logger.exception("Ошибка при добавлении игрока с ID %s: %s", player_id, e)
+            return {"status": "error"}
+
+    async def refresh_player_from_id(self, player_id: int) -> Dict[str, str]:
+        """
+        Инкрементально обновляет игрока асинхронным скраппером, как DatabaseManager.refresh_player_from_id.
+        Если игрока ещё нет в базе, добавляет его полностью.
+        """
+        player_id = int(player_id)
+        if not await self.is_player_exists(player_id):
+            return await self.add_player_from_id(player_id)
+
+        try:
+            scraper = AsyncPlayerScraper(player_id)
+            state = await asyncio.to_thread(self._sync.get_stored_tournaments_state, player_id)
+            if state["has_legacy"]:
+                # У старых строк нет ID gomafia, сопоставить их с сайтом нельзя — перезагружаем историю целиком
+                await scraper.get_player_tournaments()
+                (user_data, tournaments_data, games_data), replace = scraper.extract_data(), True
+            else:
+                await scraper.fetch_new_history(state["known_ids"], state["total"])
+                user_data, tournaments_data, games_data = scraper.extract_data(exclude_ids=state["known_ids"])
+                replace = False
+            await asyncio.to_thread(self._sync.upsert_player_delta, user_data, tournaments_data, games_data, replace)
+            return {"status": "success", "new_tournaments": len(tournaments_data)}
+        except Exception as e:
+            logger.exception("Ошибка при обновлении игрока с ID %s: %s", player_id, e)
+            return {"status": "error"}
+
+    async def close(self):
+        """Закрыть все соединения пула."""
+        if self._pool is not None:
+            await self._pool.close()
+            logger.info("Соединения с базой данных закрыты.")
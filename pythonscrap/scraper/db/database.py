@@ -1,40 +1,247 @@
+import logging
 import os
+import secrets
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import date
+from itertools import chain
 import psycopg2
-from psycopg2.extras import RealDictCursor
-from typing import List, Dict
-from ..services.gomafia_scraper import PlayerScraper
+from psycopg2 import pool, sql
+from psycopg2.extras import RealDictCursor, execute_values
+from typing import List, Dict, Optional
+from ..services.gomafia_scraper import PlayerNotFoundError, PlayerScraper
+from ..services.metrics import DB_QUERY_SECONDS, record_query
+from .schema import apply_migrations
+
+logger = logging.getLogger(__name__)
+
+
+def _to_date(value):
+    """Преобразует дату вида YYYY-MM-DD в date; для пустых и неизвестных значений возвращает None."""
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+# Запросы чтения, общие для DatabaseManager и AsyncDatabaseManager
+TOURNAMENTS_BY_USER_SQL = """
+SELECT t.id, t.title, to_char(t.date_start, 'YYYY-MM-DD') AS date_start,
+    to_char(t.date_end, 'YYYY-MM-DD') AS date_end, t.country_translate, t.city_translate, p.place, p.gg, p.elo
+FROM participations p
+JOIN tournaments t ON t.id = p.tournament_id
+WHERE p.user_id = %(user_id)s
+ORDER BY t.date_start
+"""
+
+# Турниры без даты начала в ряд ELO не входят: их нельзя ни поставить на ось дат, ни отнести к периоду
+ELO_SERIES_SQL = """
+SELECT to_char(t.date_start, 'YYYY-MM-DD') AS date,
+    %(start_elo)s + SUM(p.elo) OVER (ORDER BY t.date_start, t.id ROWS UNBOUNDED PRECEDING) AS elo
+FROM participations p
+JOIN tournaments t ON t.id = p.tournament_id
+WHERE p.user_id = %(user_id)s AND t.date_start IS NOT NULL
+ORDER BY t.date_start, t.id
+"""
+
+ELO_BUCKET_SERIES_SQL = """
+SELECT to_char(period, 'YYYY-MM-DD') AS date,
+    %(start_elo)s + SUM(period_elo) OVER (ORDER BY period) AS elo
+FROM (
+    SELECT date_trunc(%(bucket)s, t.date_start)::date AS period, SUM(p.elo) AS period_elo
+    FROM participations p
+    JOIN tournaments t ON t.id = p.tournament_id
+    WHERE p.user_id = %(user_id)s AND t.date_start IS NOT NULL
+    GROUP BY 1
+) AS periods
+ORDER BY period
+"""
+
+# Задача в работе дольше stale_after секунд — её обработчик упал; задача в очереди столько же — её некому выполнить
+RECLAIM_STALE_JOB_SQL = """
+UPDATE scrape_jobs SET status = 'queued', started_at = NULL
+WHERE id = %(id)s AND (
+    (status = 'running' AND started_at < now() - make_interval(secs => %(stale_after)s))
+    OR (status = 'queued' AND created_at < now() - make_interval(secs => %(stale_after)s))
+)
+RETURNING id
+"""
+
+SEARCH_USERS_SQL = """
+SELECT id, login
+FROM users
+WHERE (lower(login) COLLATE "C" LIKE %(pattern)s OR id = %(player_id)s::integer) AND load_id IS NULL
+    AND (%(after_id)s::integer IS NULL
+        OR (lower(login) COLLATE "C", id) > (%(after_login)s::text COLLATE "C", %(after_id)s::integer))
+ORDER BY lower(login) COLLATE "C", id
+LIMIT %(limit)s
+"""
+
+
+ROLE_STATS_SQL = """
+SELECT r.code AS role, r.translate AS role_translate, COUNT(*) AS games,
+    COUNT(*) FILTER (WHERE res.code = r.team) AS wins,
+    ROUND(100.0 * COUNT(*) FILTER (WHERE res.code = r.team) / COUNT(*), 1)::float AS win_rate
+FROM games g
+JOIN game_roles r ON r.id = g.role_id
+LEFT JOIN game_results res ON res.id = g.win_id
+WHERE g.user_id = %(user_id)s
+GROUP BY r.id
+ORDER BY games DESC
+"""
+
+
+PG_INTEGER_MAX = 2 ** 31 - 1  # Наибольшее значение столбца INTEGER (users.id)
+
+
+def parse_player_id(value: Optional[str]) -> Optional[int]:
+    """
+    Переводит строку в ID игрока или возвращает None, если это не ASCII-цифры или число не помещается
+    в INTEGER. str.isdigit() пропускает и символы вроде "²", которые int() не разбирает.
+    """
+    if not value or not (value.isascii() and value.isdigit()):
+        return None
+    player_id = int(value)
+    return player_id if player_id <= PG_INTEGER_MAX else None
+
+
+def search_users_params(query: str, limit: int, after_login: str = None, after_id: int = None) -> Dict:
+    """Параметры SEARCH_USERS_SQL: шаблон LIKE по префиксу или, от трёх символов, по подстроке."""
+    query = query.strip().lower()
+    # Экранируем спецсимволы LIKE, чтобы они искались буквально
+    pattern = query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    pattern = f"%{pattern}%" if len(query) >= 3 else f"{pattern}%"
+    return {"pattern": pattern, "player_id": parse_player_id(query), "limit": limit,
+            "after_login": (after_login or "").lower(), "after_id": after_id}
+
+
+def _timed(method):
+    """Замеряет время метода в гистограмме scraper_db_query_seconds с именем метода в метке query."""
+    return DB_QUERY_SECONDS.timed(query=method.__name__)(method)
+
+
+class _CountingCursor(RealDictCursor):
+    """RealDictCursor, который учитывает выполненные запросы в метриках текущего HTTP-запроса."""
+
+    def execute(self, query, vars=None):
+        record_query()
+        return super().execute(query, vars)
 
 
 class DatabaseManager:
     _instance = None
-    _conn = None
+    _instance_lock = threading.Lock()
+    _pool = None
+    INSERT_PAGE_SIZE = 1000  # Количество строк в одном многострочном INSERT
+    PLAYER_LOCK_NAMESPACE = 7113  # Первый ключ advisory-блокировок по ID игрока
+    PLAYER_WRITE_LOCK_NAMESPACE = 7114  # Первый ключ блокировок записи нового игрока (на время транзакции)
+    START_ELO = 1000  # Начальное значение ELO игрока
+    ELO_BUCKETS = ("week", "month")  # Допустимые периоды группировки графика ELO
+    ELO_CACHE_SIZE = int(os.getenv("ELO_CACHE_SIZE", 1024))  # Сколько рядов ELO держать в памяти процесса
+    POOL_MIN = int(os.getenv("POSTGRES_POOL_MIN", 1))
+    POOL_MAX = int(os.getenv("POSTGRES_POOL_MAX", 10))
+    POOL_TIMEOUT = float(os.getenv("POSTGRES_POOL_TIMEOUT", 30))  # Сколько ждать свободное соединение, с
+    HEALTH_CHECK_IDLE = float(os.getenv("POSTGRES_HEALTH_CHECK_IDLE", 30))  # После какого простоя проверять соединение, с
 
     def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super().__new__(cls)
-            cls._instance._conn = cls._create_connection()
-            cls._instance._create_tables()
+        with cls._instance_lock:
+            if cls._instance is None:
+                instance = super().__new__(cls)
+                instance._pool = cls._create_pool()
+                # ThreadedConnectionPool не ждёт освобождения соединения, поэтому очередь держим сами
+                instance._slots = threading.BoundedSemaphore(cls.POOL_MAX)
+                instance._last_used = {}
+                instance._inflight = {}  # ID игрока -> Future добавления, выполняемого сейчас в этом процессе
+                instance._inflight_lock = threading.Lock()
+                instance._elo_cache = OrderedDict()  # (ID игрока, период) -> (scrape_version, ряд ELO)
+                instance._elo_cache_lock = threading.Lock()
+                instance._create_tables()
+                cls._instance = instance
         return cls._instance
 
     @staticmethod
-    def _create_connection():
-        """Создаёт соединение с базой данных PostgreSQL."""
+    def _connection_params() -> Dict:
+        """Параметры подключения к PostgreSQL из переменных окружения."""
+        return {
+            "dbname": os.getenv("POSTGRES_DB"),
+            "user": os.getenv("POSTGRES_USER"),
+            "password": os.getenv("POSTGRES_PASSWORD"),
+            "host": os.getenv("POSTGRES_HOST"),
+            "port": os.getenv("POSTGRES_PORT"),
+        }
+
+    @classmethod
+    def _create_pool(cls):
+        """Создаёт потокобезопасный пул соединений с базой данных PostgreSQL."""
         try:
-            return psycopg2.connect(
-                dbname=os.getenv("POSTGRES_DB"),
-                user=os.getenv("POSTGRES_USER"),
-                password=os.getenv("POSTGRES_PASSWORD"),
-                host=os.getenv("POSTGRES_HOST"),
-                port=os.getenv("POSTGRES_PORT"),
-                cursor_factory=RealDictCursor
+            return pool.ThreadedConnectionPool(
+                cls.POOL_MIN,
+                cls.POOL_MAX,
+                cursor_factory=_CountingCursor,
+                **cls._connection_params()
             )
         except Exception as e:
-            print("Ошибка подключения к базе данных:", str(e))
+            logger.error("Ошибка подключения к базе данных: %s", e)
             raise
 
+    def _is_alive(self, conn) -> bool:
+        """Проверяет соединение; долго простаивавшие соединения проверяются запросом SELECT 1."""
+        if conn.closed:
+            return False
+        if time.monotonic() - self._last_used.get(id(conn), 0) < self.HEALTH_CHECK_IDLE:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1")
+            conn.rollback()
+            return True
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            return False
+
+    def _discard(self, conn):
+        """Закрывает соединение и убирает его из пула."""
+        self._last_used.pop(id(conn), None)
+        self._pool.putconn(conn, close=True)
+
+    @contextmanager
+    def _connection(self):
+        """
+        Выдаёт соединение из пула на время блока и возвращает его обратно.
+        При успешном выходе из блока транзакция фиксируется, при ошибке откатывается.
+        Разорванные соединения закрываются, вместо них пул откроет новые.
+        """
+        if not self._slots.acquire(timeout=self.POOL_TIMEOUT):
+            raise Exception("Нет свободных соединений с базой данных")
+        try:
+            conn = self._pool.getconn()
+            while not self._is_alive(conn):
+                self._discard(conn)
+                conn = self._pool.getconn()
+            try:
+                yield conn
+                conn.commit()
+            except Exception:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+            finally:
+                if conn.closed:
+                    self._discard(conn)
+                else:
+                    self._last_used[id(conn)] = time.monotonic()
+                    self._pool.putconn(conn)
+        finally:
+            self._slots.release()
+
     def _create_tables(self):
-        """Создаёт необходимые таблицы, если их ещё нет."""
-        with self._conn.cursor() as cursor:
+        """
+        Создаёт необходимые таблицы, если их ещё нет, и применяет миграции схемы.
+        Здесь описана базовая схема (версия 0), дальнейшие изменения — в schema.MIGRATIONS.
+        """
+        with self._connection() as conn, conn.cursor() as cursor:
             cursor.execute("""
             CREATE TABLE IF NOT EXISTS users (
                 id SERIAL PRIMARY KEY,
@@ -83,11 +290,11 @@ class DatabaseManager:
                 FOREIGN KEY(user_id) REFERENCES users(id)
             );
             """)
-        self._conn.commit()
+            apply_migrations(cursor)
 
-    def insert_user_and_related_data(self, user_data: Dict, tournaments_data: List[Dict], games_data: List[Dict]):
-        """Добавление пользователя и связанных данных."""
-        # Заменяем пустые строки на None (NULL) для числовых значений
+    @staticmethod
+    def _normalize_user(user_data: Dict):
+        """Заменяет пустые строки на None (NULL) или значения по умолчанию для числовых полей."""
         if user_data['vk_id'] == '':
             user_data['vk_id'] = None
         if user_data['referee_license'] == '':
@@ -99,111 +306,650 @@ class DatabaseManager:
         if user_data['since'] == '':
             user_data['since'] = None
 
-        with self._conn.cursor() as cursor:
-            cursor.execute("SELECT id FROM users WHERE id = %s", (user_data['id'],))
+    def _upsert_user(self, cursor, user_data: Dict, load_id: int = None):
+        """
+        Вставляет пользователя или обновляет его профиль и время последнего скрапинга.
+        load_id — метка незавершённой потоковой загрузки (см. begin_player_load), None для готового игрока.
+        """
+        cursor.execute("""
+        INSERT INTO users (id, club_id, login, first_name, last_name, date_registration,
+            icon_type, icon, gcoin, elo, vk_id, referee_license, is_paid, is_can_comment,
+            since, avatar_link, scraped_at, load_id)
+        VALUES (%(id)s, %(club_id)s, %(login)s, %(first_name)s, %(last_name)s, %(date_registration)s,
+            %(icon_type)s, %(icon)s, %(gcoin)s, %(elo)s, %(vk_id)s, %(referee_license)s, %(is_paid)s,
+            %(is_can_comment)s, %(since)s, %(avatar_link)s, now(), %(load_id)s)
+        ON CONFLICT (id) DO UPDATE SET
+            club_id = EXCLUDED.club_id, login = EXCLUDED.login, first_name = EXCLUDED.first_name,
+            last_name = EXCLUDED.last_name, icon_type = EXCLUDED.icon_type, icon = EXCLUDED.icon,
+            gcoin = EXCLUDED.gcoin, elo = EXCLUDED.elo, vk_id = EXCLUDED.vk_id,
+            referee_license = EXCLUDED.referee_license, is_paid = EXCLUDED.is_paid,
+            is_can_comment = EXCLUDED.is_can_comment, since = EXCLUDED.since,
+            avatar_link = EXCLUDED.avatar_link, scraped_at = EXCLUDED.scraped_at, load_id = EXCLUDED.load_id,
+            scrape_version = users.scrape_version + 1
+        """, {**user_data, "load_id": load_id})
+        self._invalidate_elo_cache(int(user_data['id']))
+
+    @_timed
+    def insert_user_and_related_data(self, user_data: Dict, tournaments_data: List[Dict], games_data: List[Dict]):
+        """Добавление пользователя и связанных данных."""
+        self._normalize_user(user_data)
+
+        with self._connection() as conn, conn.cursor() as cursor:
+            # Одновременные записи одного игрока (например, из разных процессов) выполняются по очереди,
+            # и вторая увидит игрока уже добавленным, а не продублирует его игры
+            cursor.execute("SELECT pg_advisory_xact_lock(%s, %s)",
+                           (self.PLAYER_WRITE_LOCK_NAMESPACE, int(user_data['id'])))
+            cursor.execute("SELECT load_id FROM users WHERE id = %s", (user_data['id'],))
             existing_user = cursor.fetchone()
-            if existing_user:
-                print(f"Пользователь с id {user_data['id']} уже существует в базе данных.")
+            if existing_user and existing_user['load_id'] is None:
+                logger.info("Пользователь с id %s уже существует в базе данных.", user_data['id'])
                 return
+            if existing_user:
+                self._discard_partial_load(cursor, user_data['id'])
 
-            cursor.execute("""
-            INSERT INTO users (id, club_id, login, first_name, last_name, date_registration,
-                icon_type, icon, gcoin, elo, vk_id, referee_license, is_paid, is_can_comment,
-                since, avatar_link) 
-            VALUES (%(id)s, %(club_id)s, %(login)s, %(first_name)s, %(last_name)s, %(date_registration)s,
-                %(icon_type)s, %(icon)s, %(gcoin)s, %(elo)s, %(vk_id)s, %(referee_license)s, %(is_paid)s, 
-                %(is_can_comment)s, %(since)s, %(avatar_link)s)
-            """, user_data)
-
-            for game in games_data:
-                game['user_id'] = user_data['id']
-                cursor.execute("""
-                INSERT INTO games (user_id, role, role_translate, place, win, win_translate, elo)
-                VALUES (%(user_id)s, %(role)s, %(role_translate)s, %(place)s, %(win)s, %(win_translate)s, %(elo)s)
-                """, game)
+            self._upsert_user(cursor, user_data)
+            self._insert_tournaments(cursor, user_data['id'], tournaments_data)
+            self._insert_games(cursor, user_data['id'], games_data)
 
-            for tournament in tournaments_data:
-                tournament['user_id'] = user_data['id']
+    @_timed
+    def upsert_player_delta(self, user_data: Dict, tournaments_data: List[Dict], games_data: List[Dict],
+                            replace: bool = False):
+        """
+        Сохраняет результат повторного скрапинга: обновляет профиль и дописывает новые турниры и игры.
+        При replace=True турниры и игры игрока сначала удаляются (полная перезагрузка истории).
+        """
+        self._normalize_user(user_data)
+
+        with self._connection() as conn, conn.cursor() as cursor:
+            # Одновременные обновления игрока (фоновая задача и crawl) выполняются по очереди
+            cursor.execute("SELECT pg_advisory_xact_lock(%s, %s)",
+                           (self.PLAYER_WRITE_LOCK_NAMESPACE, int(user_data['id'])))
+            self._upsert_user(cursor, user_data)
+            if replace:
+                cursor.execute("DELETE FROM games WHERE user_id = %s", (user_data['id'],))
+                cursor.execute("DELETE FROM participations WHERE user_id = %s RETURNING tournament_id",
+                               (user_data['id'],))
+                # Турниры без ID gomafia, на которые больше никто не ссылается, удаляются вместе со статистикой;
+                # настоящие турниры остаются — они общие для всех участников
                 cursor.execute("""
-                INSERT INTO tournaments (user_id, title, date_start, date_end, country_translate,
-                city_translate, place, gg, elo) 
-                VALUES (%(user_id)s, %(title)s, %(date_start)s, %(date_end)s, %(country_translate)s,
-                %(city_translate)s, %(place)s, %(gg)s, %(elo)s)
-                """, tournament)
-        self._conn.commit()
+                DELETE FROM tournaments
+                WHERE id = ANY(%s) AND id < 0
+                    AND NOT EXISTS (SELECT 1 FROM participations WHERE tournament_id = tournaments.id)
+                RETURNING city_translate, date_start
+                """, ([row['tournament_id'] for row in cursor.fetchall()],))
+                self._apply_stats_delta(cursor, cursor.fetchall(), sign=-1)
+            self._insert_tournaments(cursor, user_data['id'], tournaments_data)
+            self._insert_games(cursor, user_data['id'], games_data)
+
+    @_timed
+    def begin_player_load(self, user_data: Dict) -> Optional[int]:
+        """
+        Начинает потоковую загрузку игрока: записывает профиль с меткой загрузки и возвращает её.
+        Пока загрузка не завершена finish_player_load, игрок не виден в is_player_exists, поиске и API,
+        а строки прерванной ранее загрузки удаляются при следующей попытке.
+        Если игрок уже полностью загружен, возвращает None.
+        """
+        self._normalize_user(user_data)
+        load_id = secrets.randbits(63)
+
+        with self._connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_xact_lock(%s, %s)",
+                           (self.PLAYER_WRITE_LOCK_NAMESPACE, int(user_data['id'])))
+            cursor.execute("SELECT load_id FROM users WHERE id = %s", (user_data['id'],))
+            existing_user = cursor.fetchone()
+            if existing_user and existing_user['load_id'] is None:
+                logger.info("Пользователь с id %s уже существует в базе данных.", user_data['id'])
+                return None
+            if existing_user:
+                self._discard_partial_load(cursor, user_data['id'])
+            self._upsert_user(cursor, user_data, load_id)
+        return load_id
+
+    @_timed
+    def write_player_batch(self, user_id: int, load_id: int, tournaments_data: List[Dict], games_data: List[Dict]):
+        """
+        Записывает пакет турниров и игр загрузки load_id отдельной короткой транзакцией.
+        Если загрузку перехватил другой процесс, пакет не записывается и выбрасывается исключение.
+        """
+        with self._connection() as conn, conn.cursor() as cursor:
+            # Блокировка строки игрока упорядочивает пакеты с перехватом загрузки в begin_player_load
+            cursor.execute("SELECT load_id FROM users WHERE id = %s FOR UPDATE", (user_id,))
+            self._check_load(cursor.fetchone(), user_id, load_id)
+            self._insert_tournaments(cursor, user_id, tournaments_data)
+            self._insert_games(cursor, user_id, games_data)
+
+    @_timed
+    def finish_player_load(self, user_id: int, load_id: int):
+        """Завершает загрузку load_id: игрок становится виден приложению."""
+        with self._connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT load_id FROM users WHERE id = %s FOR UPDATE", (user_id,))
+            self._check_load(cursor.fetchone(), user_id, load_id)
+            cursor.execute("""
+            UPDATE users SET load_id = NULL, scraped_at = now(), scrape_version = scrape_version + 1
+            WHERE id = %s
+            """, (user_id,))
+        self._invalidate_elo_cache(user_id)
+
+    def insert_player_stream(self, user_data: Dict, batches) -> bool:
+        """
+        Записывает игрока потоково: batches — итератор пакетов (турниры, игры), например PlayerScraper.iter_batches.
+        Каждый пакет пишется своей транзакцией по мере получения, поэтому в памяти одновременно держится
+        один пакет, а не вся история игрока. Возвращает False, если игрок уже был в базе.
+        """
+        load_id = self.begin_player_load(user_data)
+        if load_id is None:
+            if hasattr(batches, "close"):
+                batches.close()
+            return False
+        user_id = int(user_data['id'])
+        for tournaments_data, games_data in batches:
+            self.write_player_batch(user_id, load_id, tournaments_data, games_data)
+        self.finish_player_load(user_id, load_id)
+        return True
+
+    @staticmethod
+    def _check_load(row: Optional[Dict], user_id: int, load_id: int):
+        if row is None or row['load_id'] != load_id:
+            raise Exception(f"Загрузка игрока с ID {user_id} прервана: её перехватила другая загрузка.")
+
+    @staticmethod
+    def _discard_partial_load(cursor, user_id: int):
+        """Удаляет игры и участия игрока, записанные незавершённой загрузкой; общие турниры остаются."""
+        logger.warning("Удаляются данные незавершённой загрузки игрока с ID %s.", user_id)
+        cursor.execute("DELETE FROM games WHERE user_id = %s", (user_id,))
+        cursor.execute("DELETE FROM participations WHERE user_id = %s", (user_id,))
+
+    @_timed
+    def get_stored_tournaments_state(self, user_id: int) -> Dict:
+        """
+        Возвращает, что уже сохранено об истории игрока: ID турниров gomafia, их количество
+        и признак турниров без ID gomafia (записанных до миграции 2), которые требуют полной перезагрузки.
+        """
+        with self._connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT tournament_id FROM participations WHERE user_id = %s", (user_id,))
+            rows = cursor.fetchall()
+            # Игры, записанные до миграции 8, не связаны с турниром — связать их можно только перезагрузкой
+            cursor.execute("SELECT EXISTS (SELECT 1 FROM games WHERE user_id = %s AND tournament_id IS NULL)",
+                           (user_id,))
+            has_unlinked_games = cursor.fetchone()['exists']
+        known_ids = {row['tournament_id'] for row in rows if row['tournament_id'] > 0}
+        return {"known_ids": known_ids, "total": len(rows),
+                "has_legacy": len(known_ids) < len(rows) or has_unlinked_games}
 
+    def _insert_games(self, cursor, user_id: int, games_data: List[Dict]):
+        """
+        Вставляет игры пользователя многострочными INSERT по INSERT_PAGE_SIZE строк.
+        Роль и победитель хранятся ссылками на справочники game_roles и game_results.
+        Уже сохранённые игры (тот же турнир и номер игры) пропускаются.
+        Турниры игр должны быть записаны раньше самих игр.
+        """
+        role_ids = self._lookup_ids(cursor, "game_roles",
+                                    {game['role']: game['role_translate'] for game in games_data})
+        result_ids = self._lookup_ids(cursor, "game_results",
+                                      {game['win']: game['win_translate'] for game in games_data})
+        for game in games_data:
+            game['user_id'] = user_id
+            game['tournament_id'] = int(game['tournament_id']) if str(game.get('tournament_id')).isdigit() else None
+            game['game_num'] = int(game['game_num']) if str(game.get('game_num')).isdigit() else None
+            game['role_id'] = role_ids.get(game['role'])
+            game['win_id'] = result_ids.get(game['win'])
+        execute_values(cursor, """
+        INSERT INTO games (user_id, tournament_id, game_num, role_id, place, win_id, elo)
+        VALUES %s
+        ON CONFLICT (user_id, tournament_id, game_num) DO NOTHING
+        """, games_data,
+            template="(%(user_id)s, %(tournament_id)s, %(game_num)s, %(role_id)s, %(place)s, %(win_id)s, %(elo)s)",
+            page_size=self.INSERT_PAGE_SIZE)
+
+    @staticmethod
+    def _lookup_ids(cursor, table: str, translations: Dict[str, str]) -> Dict[str, int]:
+        """
+        Возвращает ID значений справочника table (game_roles или game_results) по их кодам;
+        отсутствующие в справочнике коды добавляются.
+        """
+        if not translations:
+            return {}
+        execute_values(cursor, sql.SQL("""
+        INSERT INTO {} (code, translate) VALUES %s ON CONFLICT (code) DO NOTHING
+        """).format(sql.Identifier(table)), sorted(translations.items()))
+        cursor.execute(sql.SQL("SELECT id, code FROM {} WHERE code = ANY(%s)").format(sql.Identifier(table)),
+                       (list(translations),))
+        return {row['code']: row['id'] for row in cursor}
+
+    def _insert_tournaments(self, cursor, user_id: int, tournaments_data: List[Dict]):
+        """
+        Записывает турниры и участие в них пользователя многострочными INSERT по INSERT_PAGE_SIZE строк.
+        Турнир хранится один раз на всех участников: уже сохранённые турниры пропускаются,
+        и в статистику попадают только новые.
+        """
+        rows = []
+        for tournament in tournaments_data:
+            if not str(tournament['id']).isdigit():
+                logger.warning("Турнир без ID gomafia пропущен: %s", tournament.get('title'))
+                continue
+            tournament['user_id'] = user_id
+            tournament['tournament_id'] = int(tournament['id'])
+            tournament['date_start'] = _to_date(tournament['date_start'])
+            tournament['date_end'] = _to_date(tournament['date_end'])
+            rows.append(tournament)
+        # Одинаковый порядок вставки в параллельных транзакциях исключает взаимную блокировку
+        rows.sort(key=lambda tournament: tournament['tournament_id'])
+        inserted = execute_values(cursor, """
+        INSERT INTO tournaments (id, title, date_start, date_end, country_translate, city_translate)
+        VALUES %s
+        ON CONFLICT (id) DO NOTHING
+        RETURNING city_translate, date_start
+        """, rows,
+            template="""(%(tournament_id)s, %(title)s, %(date_start)s, %(date_end)s,
+            %(country_translate)s, %(city_translate)s)""",
+            page_size=self.INSERT_PAGE_SIZE, fetch=True)
+        self._apply_stats_delta(cursor, inserted)
+        execute_values(cursor, """
+        INSERT INTO participations (user_id, tournament_id, place, gg, elo)
+        VALUES %s
+        ON CONFLICT (user_id, tournament_id) DO UPDATE SET
+            place = EXCLUDED.place, gg = EXCLUDED.gg, elo = EXCLUDED.elo
+        """, rows,
+            template="(%(user_id)s, %(tournament_id)s, %(place)s, %(gg)s, %(elo)s)",
+            page_size=self.INSERT_PAGE_SIZE)
+
+    @staticmethod
+    def _apply_stats_delta(cursor, tournaments: List[Dict], sign: int = 1):
+        """
+        Прибавляет (sign=1) или вычитает (sign=-1) турниры из сводных таблиц статистики
+        и увеличивает версию статистики. Ключи обновляются в отсортированном порядке,
+        чтобы параллельные транзакции не блокировали друг друга взаимно.
+        """
+        if not tournaments:
+            return
+        cities = Counter(row['city_translate'] or 'Неизвестно' for row in tournaments)
+        dates = Counter(row['date_start'] for row in tournaments if row['date_start'] is not None)
+        execute_values(cursor, """
+        INSERT INTO city_tournament_stats (city, count) VALUES %s
+        ON CONFLICT (city) DO UPDATE SET count = city_tournament_stats.count + EXCLUDED.count
+        """, [(city, sign * count) for city, count in sorted(cities.items())])
+        if dates:
+            execute_values(cursor, """
+            INSERT INTO date_tournament_stats (date, count) VALUES %s
+            ON CONFLICT (date) DO UPDATE SET count = date_tournament_stats.count + EXCLUDED.count
+            """, [(day, sign * count) for day, count in sorted(dates.items())])
+        cursor.execute("UPDATE stats_meta SET version = version + 1, updated_at = now() WHERE id = 1")
+
+    @_timed
     def get_elo_changes_by_date(self, player_id: int) -> List[tuple]:
         """Получает массив изменений ЭЛО игрока по времени из турниров."""
-        with self._conn.cursor() as cursor:
+        with self._connection() as conn, conn.cursor() as cursor:
             cursor.execute("""
-            SELECT date_start, elo 
-            FROM tournaments 
-            WHERE user_id = %s 
-            ORDER BY date_start
+            SELECT to_char(t.date_start, 'YYYY-MM-DD') AS date, p.elo
+            FROM participations p
+            JOIN tournaments t ON t.id = p.tournament_id
+            WHERE p.user_id = %s
+            ORDER BY t.date_start
             """, (player_id,))
-            return [(row['date_start'], row['elo']) for row in cursor]
+            return [(row['date'], row['elo']) for row in cursor]
+
+    @_timed
+    def get_elo_series(self, player_id: int, bucket: str = None) -> List[tuple]:
+        """
+        Возвращает ряд (дата, ELO) игрока, накопленный в PostgreSQL оконной функцией.
+        bucket="week" или "month" группирует турниры по неделям или месяцам (ELO на конец периода).
+        Турниры без даты начала пропускаются вместе с их изменением ELO.
+        Ряд кэшируется в памяти процесса и пересчитывается после повторного скрапинга игрока.
+        """
+        if bucket is not None and bucket not in self.ELO_BUCKETS:
+            raise ValueError(f"Неизвестный период группировки: {bucket}")
+        key = (player_id, bucket)
 
+        with self._connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT scrape_version FROM users WHERE id = %s", (player_id,))
+            row = cursor.fetchone()
+            if row is None:
+                return []
+            version = row['scrape_version']
+            with self._elo_cache_lock:
+                cached = self._elo_cache.get(key)
+                if cached is not None and cached[0] == version:
+                    self._elo_cache.move_to_end(key)
+                    return cached[1]
+
+            if bucket is None:
+                cursor.execute(ELO_SERIES_SQL, {"start_elo": self.START_ELO, "user_id": player_id})
+            else:
+                cursor.execute(ELO_BUCKET_SERIES_SQL,
+                               {"start_elo": self.START_ELO, "user_id": player_id, "bucket": bucket})
+            series = [(row['date'], row['elo']) for row in cursor]
+
+        with self._elo_cache_lock:
+            self._elo_cache[key] = (version, series)
+            self._elo_cache.move_to_end(key)
+            while len(self._elo_cache) > self.ELO_CACHE_SIZE:
+                self._elo_cache.popitem(last=False)
+        return series
+
+    def _invalidate_elo_cache(self, player_id: int):
+        """Удаляет из кэша все ряды ELO игрока."""
+        with self._elo_cache_lock:
+            for key in [key for key in self._elo_cache if key[0] == player_id]:
+                del self._elo_cache[key]
+
+    @_timed
     def get_tournaments_by_user_id(self, user_id: int) -> List[Dict]:
         """Получает массив турниров по ID игрока."""
-        with self._conn.cursor() as cursor:
-            cursor.execute("""
-            SELECT id, title, date_start, date_end, country_translate, city_translate, place, gg, elo 
-            FROM tournaments
-            WHERE user_id = %s
-            ORDER BY date_start
-            """, (user_id,))
+        with self._connection() as conn, conn.cursor() as cursor:
+            cursor.execute(TOURNAMENTS_BY_USER_SQL, {"user_id": user_id})
             return list(cursor)
 
+    @_timed
+    def get_role_stats(self, player_id: int) -> List[Dict]:
+        """
+        Статистика игрока по ролям: количество игр, побед и процент побед.
+        Победой считается игра, в которой выиграла команда роли игрока.
+        """
+        with self._connection() as conn, conn.cursor() as cursor:
+            cursor.execute(ROLE_STATS_SQL, {"user_id": player_id})
+            return list(cursor)
+
+    @contextmanager
+    def _player_lock(self, player_id: int):
+        """
+        Advisory-блокировка PostgreSQL по ID игрока, общая для всех процессов.
+        Держится на отдельном соединении вне пула: блокировка живёт всё время скрапинга, и если бы она
+        занимала соединение пула, то при POOL_MAX одновременно загружаемых игроков запросам внутри
+        блокировки не хватило бы соединений.
+        """
+        conn = psycopg2.connect(**self._connection_params())
+        try:
+            conn.autocommit = True
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT pg_advisory_lock(%s, %s)", (self.PLAYER_LOCK_NAMESPACE, player_id))
+            yield
+        finally:
+            # Закрытие соединения снимает и его блокировки
+            conn.close()
+
     def add_player_from_id(self, player_id: int) -> Dict[str, str]:
-        """Добавляет игрока в базу данных на основе ID."""
+        """
+        Добавляет игрока в базу данных на основе ID.
+        Одновременные вызовы для одного ID в процессе ждут единственный скрапинг и получают его результат,
+        а между процессами скрапинг разделяется advisory-блокировкой.
+        """
+        player_id = int(player_id)
+        with self._inflight_lock:
+            future = self._inflight.get(player_id)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._inflight[player_id] = future
+        if not is_leader:
+            return future.result()
+
+        try:
+            with self._player_lock(player_id):
+                # Пока ждали блокировку, игрока мог добавить другой процесс
+                if self.is_player_exists(player_id):
+                    result = {"status": "success"}
+                else:
+                    result = self._scrape_and_insert_player(player_id)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        else:
+            future.set_result(result)
+            return result
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(player_id, None)
+
+    def _scrape_and_insert_player(self, player_id: int) -> Dict[str, str]:
+        """Скачивает игрока и записывает его в базу пакетами по мере разбора страниц истории."""
         scraper = PlayerScraper(int(player_id))
-        scraper.get_player_tournaments()
+        batches = scraper.iter_batches()
         try:
-            user_data, tournaments_data, games_data = scraper.extract_data()
-            self.insert_user_and_related_data(user_data, tournaments_data, games_data)
+            # Первый пакет заполняет профиль игрока; его ошибки обрабатываются так же, как ошибки следующих
+            first = next(batches, None)
+            self.insert_player_stream(scraper.user_data, chain([first] if first else [], batches))
             return {"status": "success"}
+        except PlayerNotFoundError:
+            logger.warning("Игрока с ID %s нет на gomafia.pro.", player_id)
+            return {"status": "error"}
+        except Exception as e:
+            logger.exception("Ошибка при добавлении игрока с ID %s: %s", player_id, e)
+            return {"status": "error"}
+
+    def scrape_player_delta(self, scraper: PlayerScraper):
+        """
+        Скачивает скраппером только ещё не сохранённую часть истории игрока, который уже есть в базе.
+        Возвращает ((user_data, tournaments_data, games_data), replace) для upsert_player_delta.
+        """
+        state = self.get_stored_tournaments_state(scraper.player_id)
+        if state["has_legacy"]:
+            # У старых строк нет ID gomafia, сопоставить их с сайтом нельзя — перезагружаем историю целиком
+            scraper.get_player_tournaments()
+            return scraper.extract_data(), True
+        scraper.fetch_new_history(state["known_ids"], state["total"])
+        return scraper.extract_data(exclude_ids=state["known_ids"]), False
+
+    def refresh_player_from_id(self, player_id: int) -> Dict[str, str]:
+        """
+        Инкрементально обновляет игрока: загружает только страницы с новыми турнирами
+        и дописывает их в базу. Если игрока ещё нет в базе, добавляет его полностью.
+        """
+        player_id = int(player_id)
+        if not self.is_player_exists(player_id):
+            return self.add_player_from_id(player_id)
+
+        try:
+            (user_data, tournaments_data, games_data), replace = self.scrape_player_delta(PlayerScraper(player_id))
+            self.upsert_player_delta(user_data, tournaments_data, games_data, replace=replace)
+            return {"status": "success", "new_tournaments": len(tournaments_data)}
         except Exception as e:
-            print(f"Ошибка при добавлении игрока с ID {player_id}: {str(e)}")
+            logger.exception("Ошибка при обновлении игрока с ID %s: %s", player_id, e)
             return {"status": "error"}
 
+    @_timed
     def is_player_exists(self, player_id: int) -> bool:
         """Проверяет, существует ли игрок с данным ID в базе данных."""
-        with self._conn.cursor() as cursor:
-            cursor.execute("SELECT 1 FROM users WHERE id = %s", (player_id,))
+        with self._connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT 1 FROM users WHERE id = %s AND load_id IS NULL", (player_id,))
+            return cursor.fetchone() is not None
+
+    @_timed
+    def get_player_version(self, player_id: int) -> Optional[Dict]:
+        """
+        Возвращает {"scrape_version", "scraped_at"} игрока или None, если его нет в базе.
+        Версия увеличивается при каждом скрапинге и служит основой ETag в JSON API.
+        """
+        with self._connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT scrape_version, scraped_at FROM users WHERE id = %s AND load_id IS NULL",
+                           (player_id,))
+            return cursor.fetchone()
+
+    @_timed
+    def get_existing_user_ids(self, player_ids: List[int]) -> set:
+        """Возвращает множество ID из списка, которые уже есть в базе данных."""
+        with self._connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT id FROM users WHERE id = ANY(%s) AND load_id IS NULL", (list(player_ids),))
+            return {row['id'] for row in cursor}
+
+    @_timed
+    def create_scrape_job(self, player_id: int, stale_after: float = None) -> Dict:
+        """
+        Ставит скрапинг игрока в очередь. Если у игрока уже есть незавершённая задача,
+        новая не создаётся. Возвращает {"id": ID задачи, "created": была ли задача создана,
+        "reclaimed": была ли возвращена в очередь брошенная задача}. Брошенной считается задача,
+        которая в работе или в очереди дольше stale_after секунд (если задано); её нужно отправить в работу заново.
+        """
+        while True:
+            with self._connection() as conn, conn.cursor() as cursor:
+                cursor.execute("""
+                INSERT INTO scrape_jobs (player_id) VALUES (%s)
+                ON CONFLICT (player_id) WHERE status IN ('queued', 'running') DO NOTHING
+                RETURNING id
+                """, (player_id,))
+                row = cursor.fetchone()
+                if row:
+                    return {"id": row['id'], "created": True, "reclaimed": False}
+                cursor.execute("""
+                SELECT id FROM scrape_jobs WHERE player_id = %s AND status IN ('queued', 'running')
+                """, (player_id,))
+                row = cursor.fetchone()
+                # Задача могла завершиться между INSERT и SELECT — тогда пробуем снова
+                if row:
+                    reclaimed = stale_after is not None and self._reclaim_stale_job(cursor, row['id'], stale_after)
+                    return {"id": row['id'], "created": False, "reclaimed": reclaimed}
+
+    @staticmethod
+    def _reclaim_stale_job(cursor, job_id: int, stale_after: float) -> bool:
+        """Возвращает в очередь задачу, брошенную упавшим обработчиком; True, если задача была брошенной."""
+        cursor.execute(RECLAIM_STALE_JOB_SQL, {"id": job_id, "stale_after": stale_after})
+        return cursor.fetchone() is not None
+
+    @_timed
+    def claim_scrape_job(self, job_id: int) -> bool:
+        """Атомарно переводит задачу из очереди в работу; False, если её уже забрал другой обработчик."""
+        with self._connection() as conn, conn.cursor() as cursor:
+            cursor.execute("""
+            UPDATE scrape_jobs SET status = 'running', started_at = now()
+            WHERE id = %s AND status = 'queued'
+            RETURNING id
+            """, (job_id,))
             return cursor.fetchone() is not None
 
+    @_timed
+    def finish_scrape_job(self, job_id: int, error: str = None):
+        """Отмечает задачу выполненной или, если передана ошибка, завершившейся с ошибкой."""
+        with self._connection() as conn, conn.cursor() as cursor:
+            cursor.execute("""
+            UPDATE scrape_jobs SET status = %s, error = %s, finished_at = now()
+            WHERE id = %s
+            """, ('failed' if error else 'done', error, job_id))
+
+    @_timed
+    def get_scrape_job(self, job_id: int) -> Dict:
+        """Возвращает задачу скрапинга по ID или None."""
+        with self._connection() as conn, conn.cursor() as cursor:
+            cursor.execute("""
+            SELECT id, player_id, status, error, created_at, started_at, finished_at
+            FROM scrape_jobs WHERE id = %s
+            """, (job_id,))
+            return cursor.fetchone()
+
+    @_timed
+    def get_pending_scrape_jobs(self, stale_after: float) -> List[Dict]:
+        """
+        Возвращает задачи, ожидающие выполнения. Задачи, которые находятся в работе дольше
+        stale_after секунд (процесс обработчика упал), предварительно возвращаются в очередь.
+        """
+        with self._connection() as conn, conn.cursor() as cursor:
+            cursor.execute("""
+            UPDATE scrape_jobs SET status = 'queued', started_at = NULL
+            WHERE status = 'running' AND started_at < now() - make_interval(secs => %s)
+            """, (stale_after,))
+            cursor.execute("SELECT id, player_id FROM scrape_jobs WHERE status = 'queued' ORDER BY id")
+            return cursor.fetchall()
+
+    @_timed
+    def get_crawl_state(self, player_ids: List[int]) -> Dict[int, Dict]:
+        """Возвращает состояние массовой загрузки по ID из списка: {ID: {"status", "attempts", "updated_at"}}."""
+        with self._connection() as conn, conn.cursor() as cursor:
+            cursor.execute("""
+            SELECT player_id, status, attempts, updated_at FROM crawl_state WHERE player_id = ANY(%s)
+            """, (list(player_ids),))
+            return {row.pop('player_id'): row for row in cursor.fetchall()}
+
+    @_timed
+    def get_failed_crawl_ids(self, max_attempts: int = None) -> List[int]:
+        """Возвращает ID, загрузка которых завершилась ошибкой, меньше чем за max_attempts попыток (если задано)."""
+        with self._connection() as conn, conn.cursor() as cursor:
+            cursor.execute("""
+            SELECT player_id FROM crawl_state
+            WHERE status = 'failed' AND (%(max_attempts)s::integer IS NULL OR attempts < %(max_attempts)s)
+            ORDER BY player_id
+            """, {"max_attempts": max_attempts})
+            return [row['player_id'] for row in cursor.fetchall()]
+
+    @_timed
+    def set_crawl_state(self, player_id: int, status: str, error: str = None):
+        """
+        Записывает итог загрузки игрока: 'done', 'not_found' или 'failed'.
+        Ошибки подряд увеличивают счётчик попыток, любой другой итог его сбрасывает.
+        """
+        with self._connection() as conn, conn.cursor() as cursor:
+            cursor.execute("""
+            INSERT INTO crawl_state AS state (player_id, status, attempts, error, scraped_at)
+            VALUES (%(player_id)s, %(status)s, CASE WHEN %(status)s = 'failed' THEN 1 ELSE 0 END, %(error)s,
+                CASE WHEN %(status)s = 'done' THEN now() END)
+            ON CONFLICT (player_id) DO UPDATE SET
+                status = EXCLUDED.status,
+                attempts = CASE WHEN EXCLUDED.status = 'failed' AND state.status = 'failed'
+                    THEN state.attempts + 1 ELSE EXCLUDED.attempts END,
+                error = EXCLUDED.error,
+                updated_at = now(),
+                scraped_at = COALESCE(EXCLUDED.scraped_at, state.scraped_at)
+            """, {"player_id": player_id, "status": status, "error": error})
+
+    @_timed
+    def get_stats_version(self) -> int:
+        """Возвращает текущую версию сводной статистики; она меняется при каждой записи турниров."""
+        with self._connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT version FROM stats_meta WHERE id = 1")
+            row = cursor.fetchone()
+            return row['version'] if row else 0
+
+    @_timed
+    def get_stats_meta(self) -> Dict:
+        """Возвращает {"version", "updated_at"} сводной статистики."""
+        with self._connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT version, updated_at FROM stats_meta WHERE id = 1")
+            return cursor.fetchone() or {"version": 0, "updated_at": None}
+
+    @_timed
     def get_tournament_count_by_city(self) -> List[Dict]:
-        """Получает количество турниров по городам."""
-        with self._conn.cursor() as cursor:
+        """Получает количество турниров по городам из сводной таблицы."""
+        with self._connection() as conn, conn.cursor() as cursor:
             cursor.execute("""
-            SELECT city_translate AS city, COUNT(*) AS count
-            FROM tournaments
-            GROUP BY city_translate
+            SELECT city, count
+            FROM city_tournament_stats
+            WHERE count > 0
             ORDER BY count DESC
             """)
             rows = cursor.fetchall()
             return [{"city": row["city"], "count": row["count"]} for row in rows]
 
+    @_timed
     def get_tournament_load_by_date(self) -> List[Dict]:
-        """Получает нагрузку по количеству турниров на каждую дату."""
-        with self._conn.cursor() as cursor:
+        """Получает нагрузку по количеству турниров на каждую дату из сводной таблицы."""
+        with self._connection() as conn, conn.cursor() as cursor:
             cursor.execute("""
-            SELECT date_start AS date, COUNT(*) AS count
-            FROM tournaments
-            GROUP BY date_start
+            SELECT to_char(date, 'YYYY-MM-DD') AS date, count
+            FROM date_tournament_stats
+            WHERE count > 0
             ORDER BY count DESC
             """)
             rows = cursor.fetchall()
             return [{"date": row["date"], "count": row["count"]} for row in rows]
 
+    @_timed
     def get_users(self) -> List[Dict]:
         """Возвращает список всех пользователей из базы данных."""
-        with self._conn.cursor() as cursor:
-            cursor.execute("SELECT id, login FROM users ORDER BY login")
+        with self._connection() as conn, conn.cursor() as cursor:
+            cursor.execute("SELECT id, login FROM users WHERE load_id IS NULL ORDER BY login")
+            return list(cursor)
+
+    @_timed
+    def search_users(self, query: str, limit: int = 20, after_login: str = None, after_id: int = None) -> List[Dict]:
+        """
+        Ищет игроков по логину: для коротких запросов по префиксу, для запросов от трёх символов
+        по подстроке (триграммный индекс), а для числового запроса также по ID.
+        Результаты упорядочены по (lower(login), id); следующая страница начинается после
+        пары (after_login, after_id) последнего результата предыдущей страницы.
+        """
+        with self._connection() as conn, conn.cursor() as cursor:
+            cursor.execute(SEARCH_USERS_SQL, search_users_params(query, limit, after_login, after_id))
             return list(cursor)
 
     def close(self):
-        """Закрыть соединение с базой данных."""
-        if self._conn:
-            self._conn.close()
-            print("Соединение с базой данных закрыто.")
+        """Закрыть все соединения пула."""
+        if self._pool:
+            self._pool.closeall()
+            logger.info("Соединения с базой данных закрыты.")
@@ -1,8 +1,11 @@
+import logging
 import os
 import sqlite3
 from typing import List, Dict
 from scraper.services.gomafia_scraper import PlayerScraper
 
+logger = logging.getLogger(__name__)
+
 
 class DatabaseManager:
     _instance = None
@@ -79,7 +82,7 @@ class DatabaseManager:
             cursor.execute("SELECT id FROM users WHERE id = ?", (user_data['id'],))
             existing_user = cursor.fetchone()
             if existing_user:
-                print(f"Пользователь с id {user_data['id']} уже существует в базе данных.")
+                logger.info("Пользователь с id %s уже существует в базе данных.", user_data['id'])
                 return
 
             # Вставляем данные о пользователе
@@ -92,23 +95,28 @@ class DatabaseManager:
                 :is_can_comment, :since, :avatar_link)
             """, user_data)
 
-            # Вставляем игры
-            for game in games_data:
-                game['user_id'] = user_data['id']
-                cursor.execute("""
-                INSERT INTO games (user_id, role, role_translate, place, win, win_translate, elo)
-                VALUES (:user_id, :role, :role_translate, :place, :win, :win_translate, :elo)
-                """, game)
-
-            # Вставляем турниры
-            for tournament in tournaments_data:
-                tournament['user_id'] = user_data['id']
-                cursor.execute("""
-                INSERT INTO tournaments (user_id, title, date_start, date_end, country_translate,
-                city_translate, place, gg, elo) 
-                VALUES (:user_id, :title, :date_start, :date_end, :country_translate,
-                :city_translate, :place, :gg, :elo)
-                """, tournament)
+            self._insert_games(cursor, user_data['id'], games_data)
+            self._insert_tournaments(cursor, user_data['id'], tournaments_data)
+
+    def _insert_games(self, cursor, user_id: int, games_data: List[Dict]):
+        """Вставляет игры пользователя одним executemany."""
+        for game in games_data:
+            game['user_id'] = user_id
+        cursor.executemany("""
+        INSERT INTO games (user_id, role, role_translate, place, win, win_translate, elo)
+        VALUES (:user_id, :role, :role_translate, :place, :win, :win_translate, :elo)
+        """, games_data)
+
+    def _insert_tournaments(self, cursor, user_id: int, tournaments_data: List[Dict]):
+        """Вставляет турниры пользователя одним executemany."""
+        for tournament in tournaments_data:
+            tournament['user_id'] = user_id
+        cursor.executemany("""
+        INSERT INTO tournaments (user_id, title, date_start, date_end, country_translate,
+        city_translate, place, gg, elo)
+        VALUES (:user_id, :title, :date_start, :date_end, :country_translate,
+        :city_translate, :place, :gg, :elo)
+        """, tournaments_data)
 
     def get_elo_changes_by_date(self, player_id: int) -> List[tuple[str, float]]:
         """Получает массив изменений ЭЛО игрока по времени из турниров."""
@@ -207,4 +215,4 @@ class DatabaseManager:
         """Закрыть соединение с базой данных."""
         if self._conn:
             self._conn.close()
-            print("Соединение с базой данных закрыто.")
+            logger.info("Соединение с базой данных закрыто.")
@@ -0,0 +1,253 @@
+"""
+Версионированные миграции схемы PostgreSQL.
+
+Базовые таблицы (версия 0) создаёт DatabaseManager._create_tables, все последующие изменения
+описываются здесь. Каждая миграция применяется один раз, номер примененной версии хранится
+в таблице schema_migrations.
+"""
+import logging
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_LOCK_ID = 7_113_001  # Ключ advisory-блокировки, чтобы процессы не мигрировали одновременно
+
+MIGRATIONS = [
+    (1, "Даты турниров в типе DATE, индексы по игроку, дате и городу", r"""
+    ALTER TABLE tournaments
+        ALTER COLUMN date_start TYPE DATE
+            USING CASE WHEN date_start ~ '^\d{4}-\d{2}-\d{2}$' THEN date_start::date END,
+        ALTER COLUMN date_end TYPE DATE
+            USING CASE WHEN date_end ~ '^\d{4}-\d{2}-\d{2}$' THEN date_end::date END;
+    CREATE INDEX IF NOT EXISTS tournaments_user_id_date_start_idx ON tournaments (user_id, date_start);
+    CREATE INDEX IF NOT EXISTS tournaments_date_start_idx ON tournaments (date_start);
+    CREATE INDEX IF NOT EXISTS tournaments_city_translate_idx ON tournaments (city_translate);
+    CREATE INDEX IF NOT EXISTS games_user_id_idx ON games (user_id);
+    """),
+    (2, "ID турнира gomafia и время последнего скрапинга игрока", """
+    ALTER TABLE tournaments ADD COLUMN IF NOT EXISTS gomafia_id INTEGER;
+    CREATE UNIQUE INDEX IF NOT EXISTS tournaments_user_id_gomafia_id_key ON tournaments (user_id, gomafia_id);
+    ALTER TABLE users ADD COLUMN IF NOT EXISTS scraped_at TIMESTAMPTZ;
+    """),
+    (3, "Очередь фоновых задач скрапинга", """
+    CREATE TABLE IF NOT EXISTS scrape_jobs (
+        id SERIAL PRIMARY KEY,
+        player_id INTEGER NOT NULL,
+        status TEXT NOT NULL DEFAULT 'queued',
+        error TEXT,
+        created_at TIMESTAMPTZ NOT NULL DEFAULT now(),
+        started_at TIMESTAMPTZ,
+        finished_at TIMESTAMPTZ
+    );
+    -- Одновременно у игрока может быть только одна незавершённая задача
+    CREATE UNIQUE INDEX IF NOT EXISTS scrape_jobs_active_player_id_key ON scrape_jobs (player_id)
+        WHERE status IN ('queued', 'running');
+    CREATE INDEX IF NOT EXISTS scrape_jobs_status_idx ON scrape_jobs (status);
+    """),
+    (4, "Сводные таблицы статистики по городам и датам", """
+    CREATE TABLE IF NOT EXISTS city_tournament_stats (
+        city TEXT PRIMARY KEY,
+        count INTEGER NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS date_tournament_stats (
+        date DATE PRIMARY KEY,
+        count INTEGER NOT NULL
+    );
+    -- Версия увеличивается при каждом изменении сводных таблиц и служит ключом кэша
+    CREATE TABLE IF NOT EXISTS stats_meta (
+        id INTEGER PRIMARY KEY CHECK (id = 1),
+        version BIGINT NOT NULL,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    );
+    INSERT INTO city_tournament_stats (city, count)
+        SELECT COALESCE(city_translate, 'Неизвестно'), COUNT(*) FROM tournaments
+        GROUP BY COALESCE(city_translate, 'Неизвестно')
+        ON CONFLICT (city) DO UPDATE SET count = EXCLUDED.count;
+    INSERT INTO date_tournament_stats (date, count)
+        SELECT date_start, COUNT(*) FROM tournaments WHERE date_start IS NOT NULL GROUP BY date_start
+        ON CONFLICT (date) DO UPDATE SET count = EXCLUDED.count;
+    INSERT INTO stats_meta (id, version) VALUES (1, 1) ON CONFLICT (id) DO NOTHING;
+    """),
+    (5, "Версия данных игрока, увеличивается при каждом скрапинге", """
+    ALTER TABLE users ADD COLUMN IF NOT EXISTS scrape_version INTEGER NOT NULL DEFAULT 1;
+    """),
+    (6, "Индексы для поиска игроков по логину", """
+    -- Префиксный поиск и keyset-пагинация по (lower(login), id); сравнение побайтовое (COLLATE "C"),
+    -- чтобы один индекс обслуживал и LIKE 'префикс%', и сортировку
+    CREATE INDEX IF NOT EXISTS users_lower_login_id_idx ON users ((lower(login) COLLATE "C"), id);
+    -- Поиск по подстроке через триграммы, если расширение pg_trgm установлено на сервере;
+    -- выражение совпадает с условием поиска, иначе планировщик индекс не использует
+    DO $$
+    BEGIN
+        IF EXISTS (SELECT 1 FROM pg_available_extensions WHERE name = 'pg_trgm') THEN
+            CREATE EXTENSION IF NOT EXISTS pg_trgm;
+            CREATE INDEX IF NOT EXISTS users_lower_login_trgm_idx ON users
+                USING gin ((lower(login) COLLATE "C") gin_trgm_ops);
+        END IF;
+    END
+    $$;
+    """),
+    (7, "Общая таблица турниров по ID gomafia и участия игроков в них", """
+    -- Раньше каждый игрок хранил свою копию турнира; теперь турнир хранится один раз,
+    -- а место, gg и ELO игрока — в participations
+    ALTER TABLE tournaments RENAME TO player_tournaments_v6;
+    CREATE TABLE tournaments (
+        id INTEGER PRIMARY KEY,  -- ID турнира на gomafia; отрицательный у турниров, записанных без него
+        title TEXT,
+        date_start DATE,
+        date_end DATE,
+        country_translate TEXT,
+        city_translate TEXT
+    );
+    CREATE TABLE participations (
+        user_id INTEGER NOT NULL REFERENCES users(id),
+        tournament_id INTEGER NOT NULL REFERENCES tournaments(id),
+        place INTEGER,
+        gg REAL,
+        elo REAL,
+        PRIMARY KEY (user_id, tournament_id)
+    );
+
+    INSERT INTO tournaments (id, title, date_start, date_end, country_translate, city_translate)
+        SELECT DISTINCT ON (gomafia_id) gomafia_id, title, date_start, date_end, country_translate, city_translate
+        FROM player_tournaments_v6
+        WHERE gomafia_id IS NOT NULL
+        ORDER BY gomafia_id, id DESC;
+    INSERT INTO participations (user_id, tournament_id, place, gg, elo)
+        SELECT user_id, gomafia_id, place, gg, elo
+        FROM player_tournaments_v6
+        WHERE gomafia_id IS NOT NULL AND user_id IS NOT NULL
+        ON CONFLICT DO NOTHING;
+
+    -- Строки без ID gomafia (записанные до миграции 2) объединяются по названию, датам и месту
+    -- в турниры с отрицательными ID; при обновлении игрока они заменяются настоящими
+    CREATE TEMPORARY TABLE legacy_rows ON COMMIT DROP AS
+        SELECT user_id, place, gg, elo, title, date_start, date_end, country_translate, city_translate,
+            -DENSE_RANK() OVER (ORDER BY title, date_start, date_end, country_translate, city_translate)
+                AS tournament_id
+        FROM player_tournaments_v6
+        WHERE gomafia_id IS NULL;
+    INSERT INTO tournaments (id, title, date_start, date_end, country_translate, city_translate)
+        SELECT DISTINCT ON (tournament_id) tournament_id, title, date_start, date_end, country_translate,
+            city_translate
+        FROM legacy_rows;
+    INSERT INTO participations (user_id, tournament_id, place, gg, elo)
+        SELECT user_id, tournament_id, place, gg, elo FROM legacy_rows WHERE user_id IS NOT NULL
+        ON CONFLICT DO NOTHING;
+
+    DROP TABLE player_tournaments_v6;
+    CREATE INDEX tournaments_date_start_idx ON tournaments (date_start);
+    CREATE INDEX participations_tournament_id_idx ON participations (tournament_id);
+
+    -- Статистика теперь считает турниры, а не участия в них
+    DELETE FROM city_tournament_stats;
+    DELETE FROM date_tournament_stats;
+    INSERT INTO city_tournament_stats (city, count)
+        SELECT COALESCE(city_translate, 'Неизвестно'), COUNT(*) FROM tournaments
+        GROUP BY COALESCE(city_translate, 'Неизвестно');
+    INSERT INTO date_tournament_stats (date, count)
+        SELECT date_start, COUNT(*) FROM tournaments WHERE date_start IS NOT NULL GROUP BY date_start;
+    UPDATE stats_meta SET version = version + 1, updated_at = now();
+    -- ID турниров в ответах изменились, поэтому сохранённые клиентами ETag должны устареть
+    UPDATE users SET scrape_version = scrape_version + 1;
+    """),
+    (8, "Игры связаны с турниром, роли и победители вынесены в справочники", """
+    CREATE TABLE game_roles (
+        id SMALLSERIAL PRIMARY KEY,
+        code TEXT NOT NULL UNIQUE,
+        translate TEXT,
+        team TEXT  -- Команда роли (city / mafia), с ней сравнивается победитель игры
+    );
+    CREATE TABLE game_results (
+        id SMALLSERIAL PRIMARY KEY,
+        code TEXT NOT NULL UNIQUE,
+        translate TEXT
+    );
+    INSERT INTO game_roles (code, translate, team) VALUES
+        ('red', 'Мирный', 'city'), ('sheriff', 'Шериф', 'city'), ('mafia', 'Мафия', 'mafia'), ('don', 'Дон', 'mafia');
+    INSERT INTO game_results (code, translate) VALUES ('city', 'Мирные'), ('mafia', 'Мафия');
+    INSERT INTO game_roles (code, translate)
+        SELECT DISTINCT ON (role) role, role_translate FROM games WHERE role IS NOT NULL ORDER BY role
+        ON CONFLICT (code) DO NOTHING;
+    INSERT INTO game_results (code, translate)
+        SELECT DISTINCT ON (win) win, win_translate FROM games WHERE win IS NOT NULL ORDER BY win
+        ON CONFLICT (code) DO NOTHING;
+
+    ALTER TABLE games
+        ADD COLUMN tournament_id INTEGER REFERENCES tournaments(id),
+        ADD COLUMN game_num SMALLINT,
+        ADD COLUMN role_id SMALLINT REFERENCES game_roles(id),
+        ADD COLUMN win_id SMALLINT REFERENCES game_results(id);
+    UPDATE games SET role_id = game_roles.id FROM game_roles WHERE game_roles.code = games.role;
+    UPDATE games SET win_id = game_results.id FROM game_results WHERE game_results.code = games.win;
+    -- Старые игры записаны без турнира; такие игроки при обновлении перезагружаются целиком
+    ALTER TABLE games
+        DROP COLUMN role,
+        DROP COLUMN role_translate,
+        DROP COLUMN win,
+        DROP COLUMN win_translate;
+
+    -- Статистика игрока по ролям читается только из индекса (index-only scan)
+    DROP INDEX IF EXISTS games_user_id_idx;
+    CREATE INDEX games_user_id_role_id_idx ON games (user_id, role_id) INCLUDE (win_id);
+    CREATE INDEX games_tournament_id_idx ON games (tournament_id);
+    """),
+    (9, "Метка незавершённой потоковой загрузки игрока", """
+    -- Пока игрок загружается пакетами, здесь хранится метка загрузки, и игрок не виден приложению
+    ALTER TABLE users ADD COLUMN load_id BIGINT;
+    """),
+    (10, "Состояние массовой загрузки по ID игроков", """
+    CREATE TABLE crawl_state (
+        player_id INTEGER PRIMARY KEY,
+        status TEXT NOT NULL CHECK (status IN ('done', 'not_found', 'failed')),
+        attempts INTEGER NOT NULL DEFAULT 0,  -- Неудачных попыток подряд
+        error TEXT,
+        updated_at TIMESTAMPTZ NOT NULL DEFAULT now(),  -- Время последней попытки
+        scraped_at TIMESTAMPTZ  -- Время последней успешной загрузки
+    );
+    CREATE INDEX crawl_state_status_idx ON crawl_state (status);
+    """),
+    (11, "Уникальность игры игрока в турнире", """
+    -- Одновременные обновления одного игрока могли записать одну и ту же игру дважды
+    DELETE FROM games a USING games b
+    WHERE a.user_id = b.user_id AND a.tournament_id = b.tournament_id AND a.game_num = b.game_num AND a.id > b.id;
+    CREATE UNIQUE INDEX games_user_id_tournament_id_game_num_key ON games (user_id, tournament_id, game_num);
+    """),
+    (12, "Триграммный индекс поиска по тому же выражению, что и в запросе", """
+    -- Ранняя версия миграции 6 строила индекс по lower(login), а поиск фильтрует по lower(login) COLLATE "C"
+    DO $$
+    BEGIN
+        IF EXISTS (SELECT 1 FROM pg_indexes
+                   WHERE indexname = 'users_lower_login_trgm_idx' AND indexdef NOT LIKE '%COLLATE "C"%') THEN
+            DROP INDEX users_lower_login_trgm_idx;
+            CREATE INDEX users_lower_login_trgm_idx ON users USING gin ((lower(login) COLLATE "C") gin_trgm_ops);
+        END IF;
+    END
+    $$;
+    """),
+    (13, "Удаление дублирующего индекса префиксного поиска", """
+    -- Префиксный LIKE и сортировку поиска обслуживает users_lower_login_id_idx из миграции 6
+    DROP INDEX IF EXISTS users_lower_login_pattern_idx;
+    """),
+]
+
+
+def apply_migrations(cursor):
+    """Применяет ещё не примененные миграции в текущей транзакции."""
+    cursor.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATION_LOCK_ID,))
+    cursor.execute("""
+    CREATE TABLE IF NOT EXISTS schema_migrations (
+        version INTEGER PRIMARY KEY,
+        description TEXT,
+        applied_at TIMESTAMPTZ NOT NULL DEFAULT now()
+    );
+    """)
+    cursor.execute("SELECT COALESCE(MAX(version), 0) AS version FROM schema_migrations")
+    current_version = cursor.fetchone()['version']
+
+    for version, description, sql in MIGRATIONS:
+        if version <= current_version:
+            continue
+        logger.info("Применяется миграция схемы %s: %s", version, description)
+        cursor.execute(sql)
+        cursor.execute("INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                       (version, description))
@@ -0,0 +1,81 @@
+"""
+Временная база данных для замеров и тестов, которые пишут в базу: создаётся на сервере из POSTGRES_*,
+на время блока подставляется в POSTGRES_DB и удаляется после него, поэтому рабочая база не затрагивается.
+"""
+import logging
+import os
+import secrets
+from contextlib import contextmanager
+import psycopg2
+from psycopg2 import sql
+from .database import DatabaseManager
+
+logger = logging.getLogger(__name__)
+
+TEMPORARY_DB_PREFIX = "scraper_tmp_"  # Начало имени временной базы
+
+
+def _reset_managers():
+    """
+    Закрывает пул DatabaseManager и сбрасывает синглтоны, которые держат менеджер базы,
+    чтобы следующие обращения подключались к текущей POSTGRES_DB.
+    Асинхронные пулы привязаны к своим циклам событий и закрываются в них самих (AsyncDatabaseManager.close).
+    """
+    from ..services.jobs import AsyncScrapeJobQueue, ScrapeJobQueue
+    from ..services.statistics import StatisticsCache
+    from .async_database import AsyncDatabaseManager
+
+    with ScrapeJobQueue._instance_lock:
+        if ScrapeJobQueue._instance is not None:
+            # Задачи очереди пишут в базу, поэтому дожидаемся их до закрытия пула
+            ScrapeJobQueue._instance._executor.shutdown(wait=True)
+            ScrapeJobQueue._instance = None
+    with StatisticsCache._instance_lock:
+        StatisticsCache._instance = None
+    with AsyncScrapeJobQueue._instances_lock:
+        AsyncScrapeJobQueue._instances.clear()
+    with AsyncDatabaseManager._instances_lock:
+        AsyncDatabaseManager._instances.clear()
+    with DatabaseManager._instance_lock:
+        if DatabaseManager._instance is not None:
+            DatabaseManager._instance.close()
+            DatabaseManager._instance = None
+
+
+def is_temporary_database(name: str) -> bool:
+    """Проверяет, что база с именем name создана temporary_database."""
+    return bool(name) and name.startswith(TEMPORARY_DB_PREFIX)
+
+
+@contextmanager
+def temporary_database():
+    """
+    Создаёт пустую базу, на время блока направляет на неё DatabaseManager и AsyncDatabaseManager
+    и возвращает её имя. Схема создаётся миграциями при первом обращении к DatabaseManager.
+    После блока база удаляется вместе с оставшимися подключениями к ней, а POSTGRES_DB восстанавливается.
+    """
+    name = f"{TEMPORARY_DB_PREFIX}{secrets.token_hex(4)}"
+    # Служебное соединение с базой по умолчанию: из самой временной базы удалить её нельзя
+    admin = psycopg2.connect(**DatabaseManager._connection_params())
+    try:
+        admin.autocommit = True
+        with admin.cursor() as cursor:
+            cursor.execute(sql.SQL("CREATE DATABASE {}").format(sql.Identifier(name)))
+        logger.info("Создана временная база %s.", name)
+
+        default = os.environ.get("POSTGRES_DB")
+        _reset_managers()
+        os.environ["POSTGRES_DB"] = name
+        try:
+            yield name
+        finally:
+            _reset_managers()
+            if default is None:
+                os.environ.pop("POSTGRES_DB", None)
+            else:
+                os.environ["POSTGRES_DB"] = default
+            with admin.cursor() as cursor:
+                cursor.execute(sql.SQL("DROP DATABASE IF EXISTS {} WITH (FORCE)").format(sql.Identifier(name)))
+            logger.info("Временная база %s удалена.", name)
+    finally:
+        admin.close()
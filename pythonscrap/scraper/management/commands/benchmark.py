@@ -0,0 +1,65 @@
+import json
+from django.core.management.base import BaseCommand, CommandError
+from scraper.benchmarks import suite
+
+
+class Command(BaseCommand):
+    help = (
+        "Замеряет производительность против локальной заглушки gomafia.pro и выводит результат в JSON. "
+        "Пример: python manage.py benchmark --output after.json --baseline before.json"
+    )
+
+    def add_arguments(self, parser):
+        defaults = suite.DEFAULT_CONFIG
+        parser.add_argument("--players", type=int, default=defaults["players"],
+                            help="Количество игроков, добавляемых через add_player_from_id")
+        parser.add_argument("--pages", type=int, default=defaults["pages"], help="Страниц истории у каждого игрока")
+        parser.add_argument("--games", type=int, default=defaults["games"], help="Игр в каждом турнире")
+        parser.add_argument("--latency", type=float, default=defaults["latency"],
+                            help="Задержка ответа заглушки в секундах")
+        parser.add_argument("--workers", type=int, default=defaults["workers"],
+                            help="Количество игроков, добавляемых одновременно")
+        parser.add_argument("--parse-repeat", type=int, default=defaults["parse_repeat"],
+                            help="Повторов разбора страницы")
+        parser.add_argument("--view-repeat", type=int, default=defaults["view_repeat"],
+                            help="Запросов к каждой странице сайта")
+        parser.add_argument("--insert-games", type=int, default=defaults["insert_games"],
+                            help="Игр в замере записи строк")
+        parser.add_argument("--insert-tournaments", type=int, default=defaults["insert_tournaments"],
+                            help="Турниров в замере записи строк")
+        parser.add_argument("--output", help="Файл для результата в JSON (по умолчанию — вывод в консоль)")
+        parser.add_argument("--baseline", help="JSON предыдущего запуска для сравнения")
+        parser.add_argument("--threshold", type=float, default=0.2,
+                            help="Допустимое ухудшение метрики относительно --baseline (0.2 = 20%%)")
+
+    def handle(self, *args, **options):
+        baseline = None
+        if options["baseline"]:
+            try:
+                with open(options["baseline"], encoding="utf-8") as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Не удалось прочитать {options['baseline']}: {e}")
+
+        result = suite.run(**{key: options[key] for key in suite.DEFAULT_CONFIG})
+        output = json.dumps(result, ensure_ascii=False, indent=2)
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                f.write(output + "\n")
+            self.stdout.write(f"Результат записан в {options['output']}")
+        else:
+            self.stdout.write(output)
+
+        if baseline is None:
+            return
+        if baseline.get("meta", {}).get("config") != result["meta"]["config"]:
+            self.stderr.write("Параметры замера отличаются от --baseline, сравнение может быть некорректным.")
+        changes = suite.compare(result, baseline, options["threshold"])
+        for change in changes:
+            delta = (change["current"] - change["baseline"]) / change["baseline"]
+            line = f"{change['metric']}: {change['baseline']:.3f} -> {change['current']:.3f} ({delta:+.1%})"
+            self.stdout.write(self.style.ERROR(line) if change["regression"] else line)
+        regressions = [change["metric"] for change in changes if change["regression"]]
+        if regressions:
+            raise CommandError(f"Регрессии больше {options['threshold']:.0%}: {', '.join(regressions)}")
+        self.stdout.write(self.style.SUCCESS("Регрессий нет"))
@@ -0,0 +1,288 @@
+import multiprocessing
+import os
+import queue
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import nullcontext
+from django.core.management.base import BaseCommand, CommandError
+from scraper.db.database import DatabaseManager
+from scraper.services.gomafia_scraper import PlayerNotFoundError, PlayerScraper
+from scraper.services.http_cache import HttpCache
+from scraper.services.http_client import HttpClient
+from scraper.services.rate_limiter import AdaptiveRateLimiter
+
+_STOP = object()  # Сигнал завершения для потока записи
+NOT_FOUND_TTL = float(os.getenv("CRAWL_NOT_FOUND_TTL", 7 * 24 * 3600))  # Сколько помнить отсутствующие на сайте ID, с
+
+
+def parse_id_spec(spec):
+    """Разбирает строку вида "500" или "500-1000" (включительно) в диапазон ID."""
+    spec = spec.strip()
+    try:
+        if "-" in spec:
+            start, end = spec.split("-", 1)
+            return range(int(start), int(end) + 1)
+        return range(int(spec), int(spec) + 1)
+    except ValueError:
+        raise CommandError(f"Некорректный ID или диапазон: {spec!r}")
+
+
+class Command(BaseCommand):
+    help = (
+        "Массово загружает игроков gomafia.pro в базу данных. "
+        "Пример: python manage.py crawl 500-1000 1115 --file ids.txt --workers 8 --rps 5. "
+        "Итог по каждому ID сохраняется в таблице crawl_state, поэтому прерванную загрузку можно продолжить "
+        "с --resume, а ошибки повторить с --retry-failed."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("ids", nargs="*", help="ID игроков или диапазоны вида 500-1000")
+        parser.add_argument("--file", action="append", default=[],
+                            help="Файл с ID или диапазонами, по одному на строку (можно указать несколько раз)")
+        parser.add_argument("--workers", type=int, default=8, help="Количество игроков, скачиваемых одновременно")
+        parser.add_argument("--page-workers", type=int, default=2,
+                            help="Количество страниц истории одного игрока, скачиваемых одновременно")
+        parser.add_argument("--rps", type=float, default=AdaptiveRateLimiter.INITIAL_RATE,
+                            help="Начальная частота запросов к gomafia.pro в секунду; дальше она подстраивается "
+                                 "по ответам сайта. 0 — без ограничения")
+        parser.add_argument("--max-rps", type=float, default=AdaptiveRateLimiter.MAX_RATE,
+                            help="Наибольшая частота запросов в секунду")
+        parser.add_argument("--rate-file", default=os.getenv("GOMAFIA_RATE_FILE"),
+                            help="Файл состояния ограничителя, общий для процессов на этой машине "
+                                 "(например, для нескольких crawl и веб-приложения)")
+        parser.add_argument("--queue-size", type=int, default=32,
+                            help="Максимальное количество скачанных пакетов и игроков, ожидающих записи в базу")
+        parser.add_argument("--batch-size", type=int, default=PlayerScraper.BATCH_SIZE,
+                            help="Турниров в одном пакете записи нового игрока")
+        parser.add_argument("--parse-processes", type=int, default=0,
+                            help="Процессов для разбора страниц новых игроков (0 — разбирать в потоках скачивания); "
+                                 "разумно указывать количество ядер")
+        parser.add_argument("--refresh", action="store_true",
+                            help="Инкрементально обновлять игроков, которые уже есть в базе, вместо их пропуска")
+        parser.add_argument("--cache-dir",
+                            help="Каталог кэша страниц на диске; повторный запуск после сбоя берёт страницы из него")
+        parser.add_argument("--cache-ttl", type=float, default=24 * 3600,
+                            help="Сколько секунд страница в кэше считается свежей (вместе с --cache-dir)")
+        parser.add_argument("--offline", action="store_true",
+                            help="Брать страницы только из кэша, не обращаясь к gomafia.pro")
+        parser.add_argument("--resume", action="store_true",
+                            help="Пропускать ID, успешно загруженные прошлыми запусками")
+        parser.add_argument("--retry-failed", action="store_true",
+                            help="Загружать только ID, завершившиеся ошибкой; без списка ID — все такие ID из базы")
+        parser.add_argument("--max-attempts", type=int,
+                            help="Пропускать ID, загрузка которых столько раз подряд завершилась ошибкой")
+        parser.add_argument("--not-found-ttl", type=float, default=NOT_FOUND_TTL,
+                            help="Сколько секунд не проверять заново ID, которых не было на сайте "
+                                 "(0 — проверять всегда)")
+
+    def _collect_ids(self, options):
+        """Собирает уникальные ID из аргументов и файлов, сохраняя порядок."""
+        specs = list(options["ids"])
+        for path in options["file"]:
+            try:
+                with open(path, encoding="utf-8") as f:
+                    specs.extend(line for line in f if line.strip() and not line.startswith("#"))
+            except OSError as e:
+                raise CommandError(f"Не удалось прочитать файл {path}: {e}")
+        if not specs:
+            raise CommandError("Укажите ID игроков, диапазоны или --file.")
+
+        ids = {}
+        for spec in specs:
+            for player_id in parse_id_spec(spec):
+                ids[player_id] = None
+        return list(ids)
+
+    def _skip_by_state(self, database, player_ids, options):
+        """Отбрасывает ID по итогам прошлых запусков из crawl_state и сообщает, сколько пропущено и почему."""
+        states = database.get_crawl_state(player_ids)
+        missing_since = time.time() - options["not_found_ttl"]
+        selected, skipped = [], Counter()
+        for player_id in player_ids:
+            state = states.get(player_id) or {"status": None, "attempts": 0}
+            if options["retry_failed"] and state["status"] != "failed":
+                skipped["без ошибок"] += 1
+            elif options["resume"] and state["status"] == "done":
+                skipped["уже загружены"] += 1
+            elif state["status"] == "not_found" and state["updated_at"].timestamp() > missing_since:
+                skipped["нет на сайте"] += 1
+            elif (options["max_attempts"] and state["status"] == "failed"
+                  and state["attempts"] >= options["max_attempts"]):
+                skipped["исчерпаны попытки"] += 1
+            else:
+                selected.append(player_id)
+        if skipped:
+            self.stdout.write("Пропущено по итогам прошлых запусков: " +
+                              ", ".join(f"{reason} {count}" for reason, count in skipped.items()))
+        return selected
+
+    def handle(self, *args, **options):
+        database = DatabaseManager()
+        if options["retry_failed"] and not options["ids"] and not options["file"]:
+            player_ids = database.get_failed_crawl_ids(options["max_attempts"])
+        else:
+            player_ids = self._collect_ids(options)
+        player_ids = self._skip_by_state(database, player_ids, options)
+
+        existing = database.get_existing_user_ids(player_ids)
+        if options["refresh"]:
+            self.stdout.write(f"К загрузке {len(player_ids) - len(existing)} игроков, к обновлению: {len(existing)}")
+        else:
+            player_ids = [player_id for player_id in player_ids if player_id not in existing]
+            self.stdout.write(f"К загрузке {len(player_ids)} игроков, уже в базе: {len(existing)}")
+
+        http = HttpClient()
+        if options["rps"] > 0:
+            http.rate_limiter = AdaptiveRateLimiter(options["rps"], max_rate=options["max_rps"],
+                                                    state_file=options["rate_file"])
+        else:
+            http.rate_limiter = None
+        if options["cache_dir"]:
+            http.cache = HttpCache(options["cache_dir"], ttl=options["cache_ttl"], offline=options["offline"])
+        elif options["offline"]:
+            if http.cache is None:
+                raise CommandError("Для --offline нужен кэш: укажите --cache-dir или GOMAFIA_CACHE_DIR.")
+            http.cache.offline = True
+        results = queue.Queue(maxsize=options["queue_size"])
+        stats = {"scraped": 0, "saved": 0, "errors": 0, "missing": 0, "pages": 0}
+        stats_lock = threading.Lock()
+
+        def report_error(player_id, stage, error):
+            with stats_lock:
+                stats["errors"] += 1
+            self.stderr.write(f"ID {player_id}: ошибка на этапе {stage}: {error}")
+
+        def scrape_failed(player_id, error):
+            """Сообщает об ошибке скачивания и передаёт её потоку записи для crawl_state."""
+            if isinstance(error, PlayerNotFoundError):
+                with stats_lock:
+                    stats["missing"] += 1
+            else:
+                report_error(player_id, "скачивания", error)
+            results.put(("failed", player_id, error))
+
+        def record(player_id, status, error=None):
+            """Сохраняет итог загрузки ID; ошибка записи состояния не должна останавливать поток записи."""
+            try:
+                database.set_crawl_state(player_id, status, error)
+            except Exception as e:
+                self.stderr.write(f"ID {player_id}: не удалось сохранить состояние загрузки: {e}")
+
+        def scrape(player_id):
+            """
+            Скачивает игрока и кладёт результат в очередь записи (блокируется, если очередь полна).
+            Нового игрока отправляет потоком: "begin" с профилем, пакеты "batch" по мере разбора страниц
+            и "finish", поэтому в памяти не держится вся его история.
+            """
+            scraper = PlayerScraper(player_id, max_workers=options["page_workers"])
+            if player_id in existing:
+                try:
+                    data, replace = database.scrape_player_delta(scraper)
+                except Exception as e:
+                    scrape_failed(player_id, e)
+                    return
+                pages = len(scraper.next_data)
+                results.put(("delta", player_id, (data, replace)))
+            else:
+                began = False
+                try:
+                    for batch in scraper.iter_batches(options["batch_size"], parse_pool=parse_pool):
+                        if not began:
+                            results.put(("begin", player_id, scraper.user_data))
+                            began = True
+                        results.put(("batch", player_id, batch))
+                    if not began:  # Игрок без турниров
+                        results.put(("begin", player_id, scraper.user_data))
+                except Exception as e:
+                    scrape_failed(player_id, e)
+                    return
+                pages = scraper.get_total_pages()
+                results.put(("finish", player_id, None))
+            with stats_lock:
+                stats["scraped"] += 1
+                stats["pages"] += pages
+
+        def write():
+            """
+            Единственный поток записи: забирает игроков и пакеты из очереди, сохраняет их в базу
+            и записывает итог по каждому ID в crawl_state.
+            """
+            loads = {}  # ID игрока -> метка его потоковой загрузки; None — пакеты игрока пропускаются
+            while True:
+                item = results.get()
+                if item is _STOP:
+                    return
+                kind, player_id, payload = item
+                try:
+                    if kind == "delta":
+                        (user_data, tournaments_data, games_data), replace = payload
+                        database.upsert_player_delta(user_data, tournaments_data, games_data, replace=replace)
+                    elif kind == "begin":
+                        # None, если игрока уже добавили в обход crawl
+                        loads[player_id] = database.begin_player_load(payload)
+                        if loads[player_id] is None:
+                            record(player_id, "done")
+                        continue
+                    elif kind == "batch":
+                        if loads.get(player_id) is not None:
+                            database.write_player_batch(player_id, loads[player_id], *payload)
+                        continue
+                    elif kind == "failed":
+                        # Записанные пакеты невидимы и будут удалены при следующей загрузке игрока
+                        loads.pop(player_id, None)
+                        if isinstance(payload, PlayerNotFoundError):
+                            record(player_id, "not_found")
+                        else:
+                            record(player_id, "failed", str(payload))
+                        continue
+                    else:
+                        load_id = loads.pop(player_id, None)
+                        if load_id is None:
+                            continue
+                        database.finish_player_load(player_id, load_id)
+                except Exception as e:
+                    if kind in ("begin", "batch"):
+                        loads[player_id] = None  # Остальные пакеты игрока уже не записать
+                    report_error(player_id, "записи", e)
+                    record(player_id, "failed", str(e))
+                    continue
+                record(player_id, "done")
+                with stats_lock:
+                    stats["saved"] += 1
+
+        # Разбор HTML упирается в GIL, поэтому его можно вынести в отдельные процессы: потоки скачивания
+        # передают им HTML и получают обратно готовые записи. spawn — чтобы дочерние процессы
+        # не наследовали соединения с базой и блокировки потоков
+        parse_pool = None
+        if options["parse_processes"] > 0:
+            parse_pool = ProcessPoolExecutor(max_workers=options["parse_processes"],
+                                             mp_context=multiprocessing.get_context("spawn"))
+
+        started = time.monotonic()
+        writer = threading.Thread(target=write, name="crawl-writer", daemon=True)
+        writer.start()
+        try:
+            with parse_pool or nullcontext(), ThreadPoolExecutor(max_workers=options["workers"]) as executor:
+                for index, _ in enumerate(executor.map(scrape, player_ids), start=1):
+                    if index % 50 == 0:
+                        self._report(stats, index, len(player_ids), time.monotonic() - started, http.rate_limiter)
+        finally:
+            results.put(_STOP)
+            writer.join()
+
+        self._report(stats, len(player_ids), len(player_ids), time.monotonic() - started, http.rate_limiter)
+        self.stdout.write(self.style.SUCCESS(
+            f"Готово: сохранено {stats['saved']}, нет на сайте {stats['missing']}, ошибок {stats['errors']}"
+        ))
+
+    def _report(self, stats, done, total, elapsed, rate_limiter):
+        """Выводит прогресс, пропускную способность и текущую частоту запросов."""
+        elapsed = max(elapsed, 1e-9)
+        limit = f"{rate_limiter.rate:.2f} запросов/с" if rate_limiter is not None else "не задан"
+        self.stdout.write(
+            f"[{done}/{total}] скачано {stats['scraped']}, сохранено {stats['saved']}, ошибок {stats['errors']} | "
+            f"{stats['scraped'] / elapsed:.2f} игроков/с, {stats['pages'] / elapsed:.2f} страниц/с, "
+            f"лимит {limit}"
+        )
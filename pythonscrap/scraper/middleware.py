@@ -0,0 +1,43 @@
+import time
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from scraper.services.metrics import (HTTP_REQUEST_DB_QUERIES, HTTP_REQUEST_SECONDS, HTTP_REQUESTS_TOTAL,
+                                      count_queries)
+
+
+class MetricsMiddleware:
+    """
+    Записывает для каждого запроса время обработки, код ответа и количество SQL-запросов
+    с меткой представления (имя из urls.py). Работает и с синхронными, и с асинхронными представлениями.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self._acall(request)
+        with count_queries() as queries:
+            started = time.perf_counter()
+            response = self.get_response(request)
+            self._observe(request, response, time.perf_counter() - started, queries[0])
+        return response
+
+    async def _acall(self, request):
+        with count_queries() as queries:
+            started = time.perf_counter()
+            response = await self.get_response(request)
+            self._observe(request, response, time.perf_counter() - started, queries[0])
+        return response
+
+    @staticmethod
+    def _observe(request, response, elapsed, queries):
+        # Несуществующие адреса объединяются под одной меткой, чтобы не плодить ряды метрик
+        view = request.resolver_match.view_name if request.resolver_match else "unmatched"
+        HTTP_REQUEST_SECONDS.observe(elapsed, view=view, method=request.method)
+        HTTP_REQUESTS_TOTAL.inc(view=view, method=request.method, status=response.status_code)
+        HTTP_REQUEST_DB_QUERIES.observe(queries, view=view)
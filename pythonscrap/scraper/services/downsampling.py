@@ -0,0 +1,167 @@
+import numpy as np
+
+METHODS = ("lttb", "minmax")
+# Длина корзины, начиная с которой LTTB выгоднее считать циклом по корзинам, а не таблицей переходов
+LTTB_TABLE_MAX_BUCKET = 50
+LTTB_TABLE_CHUNK = 1 << 20  # Элементов в одном блоке таблицы переходов, ограничивает память
+
+
+def _dates_to_x(dates):
+    """Переводит даты вида YYYY-MM-DD в номера дней для оси X."""
+    return np.asarray(dates, dtype="datetime64[D]").astype(np.float64)
+
+
+def lttb_indices(x, y, threshold):
+    """
+    Алгоритм Largest-Triangle-Three-Buckets: возвращает индексы threshold точек,
+    сохраняющих форму ряда. Первая и последняя точки сохраняются всегда.
+    Границы корзин те же, что в lttb_indices_python. Удвоенная площадь треугольника
+    (a, j, среднее следующей корзины) линейна по x_j и y_j, поэтому площади корзины считаются
+    матричным умножением: для мелких корзин — сразу для всех возможных a из предыдущей корзины
+    (таблица переходов, см. _lttb_table), для крупных — в цикле по корзинам.
+    """
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return np.arange(n)
+
+    every = (n - 2) / (threshold - 2)
+    # Начала корзин для всех точек, кроме первой и последней, и конец последней корзины
+    edges = (np.arange(threshold - 1) * every).astype(np.int64) + 1
+    # Средние точки следующих корзин; после последней корзины «следующая» тянется до конца ряда
+    counts = np.diff(np.append(edges[1:], n))
+    avg_x = np.add.reduceat(x, edges[1:]) / counts
+    avg_y = np.add.reduceat(y, edges[1:]) / counts
+
+    # Корзины в виде строк матрицы; короткие дополняются своей последней точкой,
+    # что не меняет первый максимум площади
+    starts = edges[:-1]
+    width = int(np.diff(edges).max())
+    rows = np.minimum(starts[:, None] + np.arange(width)[None, :], (edges[1:] - 1)[:, None])
+    # Столбцы (y_j, x_j, 1) — площадь равна их скалярному произведению с коэффициентами точки a
+    points = np.stack((y[rows], x[rows], np.ones(rows.shape)), axis=1)
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    if width < LTTB_TABLE_MAX_BUCKET:
+        selected[1:-1] = _lttb_table(x, y, rows, points, avg_x, avg_y)
+        return selected
+
+    x_list, y_list, avg_x, avg_y, starts = x.tolist(), y.tolist(), avg_x.tolist(), avg_y.tolist(), starts.tolist()
+    a = 0
+    for i in range(threshold - 2):
+        x_a, y_a, x_avg, y_avg = x_list[a], y_list[a], avg_x[i], avg_y[i]
+        areas = (x_a - x_avg, y_avg - y_a, x_avg * y_a - x_a * y_avg) @ points[i]
+        # Максимум модуля — наибольший из максимума и минус минимума, без отдельного np.abs
+        high, low = int(areas.argmax()), int(areas.argmin())
+        a = starts[i] + (high if areas[high] >= -areas[low] else low)
+        selected[i + 1] = a
+    return selected
+
+
+def _lttb_table(x, y, rows, points, avg_x, avg_y):
+    """
+    Выбор LTTB для мелких корзин без вызовов numpy на каждую корзину: для каждой корзины и каждой
+    возможной точки a предыдущей корзины (для первой — только точки 0) заранее находится лучшая точка,
+    после чего остаётся пройти по таблице переходов. Таблица строится блоками по LTTB_TABLE_CHUNK элементов.
+    """
+    buckets, width = rows.shape
+    prev_x = np.concatenate((np.full((1, width), x[0]), x[rows[:-1]]))
+    prev_y = np.concatenate((np.full((1, width), y[0]), y[rows[:-1]]))
+    coefficients = np.stack((prev_x - avg_x[:, None], avg_y[:, None] - prev_y,
+                             avg_x[:, None] * prev_y - prev_x * avg_y[:, None]), axis=2)
+    step = max(1, LTTB_TABLE_CHUNK // (width * width))
+    best = []
+    for start in range(0, buckets, step):
+        areas = np.matmul(coefficients[start:start + step], points[start:start + step])
+        np.abs(areas, out=areas)
+        best.extend(areas.argmax(axis=2).tolist())
+
+    starts = rows[:, 0].tolist()
+    selected = []
+    k = 0  # Номер выбранной точки внутри корзины; перед первой корзиной выбрана точка 0
+    for i in range(buckets):
+        k = best[i][k]
+        selected.append(starts[i] + k)
+    return selected
+
+
+def lttb_indices_python(x, y, threshold):
+    """Эталонная реализация LTTB на чистом Python, используется для сравнения в бенчмарке."""
+    n = len(x)
+    if threshold >= n or threshold < 3:
+        return list(range(n))
+
+    every = (n - 2) / (threshold - 2)
+    selected = [0]
+    a = 0
+    for i in range(threshold - 2):
+        next_start = int((i + 1) * every) + 1
+        next_end = min(int((i + 2) * every) + 1, n)
+        if next_start >= next_end:
+            next_start, next_end = n - 1, n
+        avg_x = sum(x[next_start:next_end]) / (next_end - next_start)
+        avg_y = sum(y[next_start:next_end]) / (next_end - next_start)
+
+        start = int(i * every) + 1
+        end = int((i + 1) * every) + 1
+        max_area, max_index = -1.0, start
+        for j in range(start, end):
+            area = abs((x[a] - avg_x) * (y[j] - y[a]) - (x[a] - x[j]) * (avg_y - y[a]))
+            if area > max_area:
+                max_area, max_index = area, j
+        selected.append(max_index)
+        a = max_index
+    selected.append(n - 1)
+    return selected
+
+
+def minmax_indices(y, threshold):
+    """
+    Оставляет в каждой корзине точки минимума и максимума (в порядке следования),
+    поэтому все пики и провалы ряда сохраняются. Полностью векторная реализация.
+    """
+    n = len(y)
+    if threshold >= n:
+        return np.arange(n)
+    if threshold < 4:
+        # На пару min/max корзины места нет — остаются только концы ряда
+        return np.array([0, n - 1])
+
+    bucket_count = (threshold - 2) // 2
+    starts = np.linspace(1, n - 1, bucket_count + 1).astype(np.int64)[:-1]
+    bucket_of = np.repeat(np.arange(bucket_count), np.diff(np.append(starts, n - 1)))
+    inner = y[1:n - 1]
+
+    def first_in_bucket(mask):
+        # Для каждой корзины — первый индекс ряда, на котором выполнено условие
+        positions = np.flatnonzero(mask)
+        _, first = np.unique(bucket_of[positions], return_index=True)
+        return positions[first] + 1
+
+    bucket_min = np.minimum.reduceat(inner, starts - 1)
+    bucket_max = np.maximum.reduceat(inner, starts - 1)
+    min_idx = first_in_bucket(inner == bucket_min[bucket_of])
+    max_idx = first_in_bucket(inner == bucket_max[bucket_of])
+
+    return np.unique(np.concatenate(([0], min_idx, max_idx, [n - 1])))
+
+
+def downsample(dates, values, method, points):
+    """
+    Уменьшает ряд (dates, values) примерно до points точек методом "lttb" или "minmax".
+    Возвращает новые списки дат и значений.
+    """
+    if method not in METHODS:
+        raise ValueError(f"Неизвестный метод прореживания: {method}")
+    if len(values) <= points:
+        return list(dates), list(values)
+
+    y = np.asarray(values, dtype=np.float64)
+    if method == "lttb":
+        indices = lttb_indices(_dates_to_x(dates), y, points)
+    else:
+        indices = minmax_indices(y, points)
+    return [dates[i] for i in indices], y[indices].tolist()
@@ -1,40 +1,97 @@
-import requests
 from bs4 import BeautifulSoup
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+import asyncio
 import json
+import logging
 import math
+import os
+import time
+from .http_client import AsyncHttpClient, HttpClient
+from .metrics import SCRAPE_STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+
+class PlayerNotFoundError(Exception):
+    """Игрока с таким ID нет на gomafia.pro."""
 
 
 class PlayerScraper:
-    BASE_URL = "https://gomafia.pro/stats/"
+    BASE_URL = os.getenv("GOMAFIA_BASE_URL", "https://gomafia.pro/stats/")
     SEARCH_URL = "?tab=history&page="
+    PAGE_SIZE = 10  # Количество турниров на одной странице истории
+    MAX_WORKERS = int(os.getenv("SCRAPER_MAX_WORKERS", 8))
+    BATCH_SIZE = int(os.getenv("SCRAPER_BATCH_SIZE", 100))  # Турниров в одном пакете потоковой записи
 
-    def __init__(self, player_id):
+    def __init__(self, player_id, max_workers=None):
         """
         Инициализация скраппера с указанным ID игрока.
+        max_workers ограничивает число страниц истории, загружаемых одновременно.
         """
         self.player_id = player_id
+        self.max_workers = max_workers or self.MAX_WORKERS
+        self.http = HttpClient()
         self.html_content = None
         self.next_data = []
         self.history_total = None  # Количество турниров, в которых игрок принимал участие
+        self.user_data = None  # Профиль игрока; при потоковой загрузке заполняется с первой страницы
         self.tournaments = []
 
+    @SCRAPE_STAGE_SECONDS.timed(stage="fetch_player_html")
     def fetch_player_html(self, search_number=1):
         """
         Получает HTML-страницу для игрока и проверяет, существует ли он.
         """
-        url = f"{self.BASE_URL}{self.player_id}{self.SEARCH_URL}{search_number}"
-        headers = {
-            "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"}
-        response = requests.get(url, headers=headers)
+        self.html_content = self._download_page(search_number)
+
+    @SCRAPE_STAGE_SECONDS.timed(stage="download_page")
+    def _download_page(self, search_number):
+        """
+        Загружает страницу истории с указанным номером и возвращает её HTML.
+        Не изменяет состояние скраппера, поэтому может вызываться из нескольких потоков.
+        """
+        return self._check_response(self.http.get(self._page_url(search_number)))
 
+    def _page_url(self, search_number):
+        return f"{self.BASE_URL}{self.player_id}{self.SEARCH_URL}{search_number}"
+
+    def _check_response(self, response):
+        """Проверяет ответ сайта и возвращает HTML страницы истории."""
         if response.status_code != 200:
             raise Exception(f"Ошибка при запросе данных для игрока {self.player_id}: HTTP {response.status_code}")
 
-        self.html_content = response.text
+        html_content = response.text
 
         # Проверка на наличие текста, указывающего на отсутствие игрока
-        if "Игрок не найден" in self.html_content or "No player found" in self.html_content:
-            raise Exception(f"Игрок с ID {self.player_id} не существует на сайте.")
+        if "Игрок не найден" in html_content or "No player found" in html_content:
+            raise PlayerNotFoundError(f"Игрок с ID {self.player_id} не существует на сайте.")
+
+        return html_content
+
+    def fetch_history_pages(self, pages):
+        """
+        Параллельно загружает страницы истории с указанными номерами и извлекает из них __NEXT_DATA__.
+        Данные добавляются в next_data в порядке номеров страниц, а не в порядке завершения загрузки.
+        """
+        pages = list(pages)
+        if not pages:
+            return
+
+        with ThreadPoolExecutor(max_workers=min(self.max_workers, len(pages))) as executor:
+            # map возвращает результаты в порядке входных номеров страниц
+            for html_content in executor.map(self._download_page, pages):
+                self.html_content = html_content
+                self.extract_next_data()
+
+    def get_total_pages(self):
+        """
+        Возвращает количество страниц истории по значению historyTotal.
+        """
+        if self.history_total is None:
+            return 1
+        return max(1, math.ceil(float(self.history_total) / self.PAGE_SIZE))
 
     def extract_next_data(self):
         """
@@ -43,16 +100,7 @@ class PlayerScraper:
         if not self.html_content:
             raise Exception("HTML-контент не был загружен. Сначала вызовите fetch_player_html.")
 
-        soup = BeautifulSoup(self.html_content, "html.parser")
-        script_tag = soup.find("script", id="__NEXT_DATA__")
-
-        if not script_tag:
-            raise Exception("Тег <script id='__NEXT_DATA__'> не найден на странице")
-
-        try:
-            self.next_data.append(json.loads(script_tag.string))
-        except json.JSONDecodeError:
-            raise Exception("Ошибка при парсинге JSON из __NEXT_DATA__")
+        self.next_data.append(self._parse_page(self.html_content))
 
     def parse_history_number(self):
         """
@@ -93,79 +141,404 @@ class PlayerScraper:
         self.fetch_player_html()
         self.extract_next_data()
         self.parse_history_number()
-        if self.history_total is not None:
-            for i in range(2, math.ceil(
-                    float(
-                        self.history_total) / 10) + 1):  # Цикл проходит столько раз, сколько страниц в поиске турниров
-                self.fetch_player_html(i)
-                self.extract_next_data()
+        # Первая страница уже загружена, остальные страницы истории загружаем параллельно
+        self.fetch_history_pages(range(2, self.get_total_pages() + 1))
         self.parse_tournaments()
 
-    def extract_data(self):
+    def fetch_new_history(self, known_ids, stored_total=0):
         """
-        Извлекает данные о пользователе, турнирах и играх с проверками на наличие ключей и данных.
+        Загружает только страницы истории с турнирами, которых ещё нет среди known_ids.
+        История на сайте отсортирована от новых турниров к старым, поэтому сначала загружаются
+        страницы, на которых по разнице historyTotal и stored_total должны быть новые турниры,
+        а затем, если известный турнир так и не встретился, — следующие страницы по одной.
         """
-        user_data = self.next_data[0].get('props', {}).get('pageProps', {}).get('serverData', {}).get('user', {})
+        known_ids = {str(tournament_id) for tournament_id in known_ids}
+        self.fetch_player_html()
+        self.extract_next_data()
+        self.parse_history_number()
 
-        # Проверка, если данных о пользователе нет
-        if not user_data:
-            raise Exception(f"Данные о пользователе для игрока с ID {self.player_id} не найдены.")
+        total_pages = self.get_total_pages()
+        new_total = max(0, int(self.history_total or 0) - stored_total)
+        expected_pages = min(total_pages, max(1, math.ceil(new_total / self.PAGE_SIZE)))
+        if not self._has_known_tournament(self.next_data[-1], known_ids):
+            self.fetch_history_pages(range(2, expected_pages + 1))
+
+        page = len(self.next_data)
+        while page < total_pages and not self._has_known_tournament(self.next_data[-1], known_ids):
+            page += 1
+            self.fetch_history_pages([page])
+        self.parse_tournaments()
 
-        # Обрабатываем отсутствие аватара
-        avatar_link = user_data.get('avatar_link', None)
-        if avatar_link is None:
-            user_data['avatar_link'] = 'Аватар отсутствует'
+    @staticmethod
+    def _has_known_tournament(next_data, known_ids):
+        """Проверяет, есть ли на странице истории турнир из known_ids."""
+        history = next_data.get("props", {}).get("pageProps", {}).get("serverData", {}).get("history") or []
+        return any(str(tournament.get("id")) in known_ids for tournament in history)
 
-        print(f"Данные о пользователе: {user_data}")
+    def extract_data(self, exclude_ids=None):
+        """
+        Извлекает данные о пользователе, турнирах и играх с проверками на наличие ключей и данных.
+        Турниры с ID из exclude_ids пропускаются вместе с их играми.
+        """
+        exclude_ids = {str(tournament_id) for tournament_id in exclude_ids or ()}
+        user_data = self._user_data(self.next_data[0])
 
         tournaments_data = []
         games_data = []
-
-        # Проверяем наличие истории турниров
+        seen_ids = set()
         for data in self.next_data:
-            server_data = data.get('props', {}).get('pageProps', {}).get('serverData', {})
-
-            if not server_data:
-                print(f"Нет данных для страницы с ID {self.player_id}. Пропускаем.")
-                continue
-
-            tournament_history = server_data.get('history', [])
-
-            # Если турниров нет, добавляем сообщение о том, что игрок не участвовал в турнирах
-            if not tournament_history:
-                print(f"Игрок с ID {self.player_id} не участвовал в турнирах.")
-                continue
-
-            for tournament in tournament_history:
-                tournament_info = {
-                    'id': tournament.get('id', 'Неизвестно'),
-                    'title': tournament.get('title', 'Неизвестно'),
-                    'date_start': tournament.get('date_start', 'Неизвестно'),
-                    'date_end': tournament.get('date_end', 'Неизвестно'),
-                    'country_translate': tournament.get('country_translate', 'Неизвестно'),
-                    'city_translate': tournament.get('city_translate', 'Неизвестно'),
-                    'place': tournament.get('place', 'Неизвестно'),
-                    'gg': tournament.get('gg', 'Неизвестно'),
-                    'elo': tournament.get('elo', 'Неизвестно')
-                }
-                tournaments_data.append(tournament_info)
-
-                # Данные о играх в турнире
-                games = tournament.get('games', [])
-                if games:
-                    for game in games:
-                        game_info = {
-                            'role': game.get('role', 'Неизвестно'),
-                            'role_translate': game.get('role_translate', 'Неизвестно'),
-                            'place': game.get('place', 'Неизвестно'),
-                            'win': game.get('win', 'Неизвестно'),
-                            'win_translate': game.get('win_translate', 'Неизвестно'),
-                            'elo': game.get('elo', 'Неизвестно')
-                        }
-                        games_data.append(game_info)
+            page_tournaments, page_games = self._page_records(data, exclude_ids, seen_ids)
+            tournaments_data.extend(page_tournaments)
+            games_data.extend(page_games)
 
         return user_data, tournaments_data, games_data
 
+    def _user_data(self, next_data):
+        """Профиль игрока с первой страницы истории."""
+        return user_data_from(self.player_id, next_data)
+
+    @SCRAPE_STAGE_SECONDS.timed(stage="extract_data")
+    def _page_records(self, next_data, exclude_ids, seen_ids):
+        """
+        Возвращает (турниры, игры) одной страницы истории. Турниры из exclude_ids и уже встреченные
+        на предыдущих страницах (их ID накапливаются в seen_ids) пропускаются.
+        """
+        return page_records(self.player_id, next_data, exclude_ids, seen_ids)
+
+    @SCRAPE_STAGE_SECONDS.timed(stage="extract_next_data")
+    def _parse_page(self, html_content):
+        """Извлекает __NEXT_DATA__ из HTML страницы, не сохраняя ни HTML, ни результат в скраппере."""
+        return parse_next_data(html_content)
+
+    def _read_first_page(self, next_data):
+        """Запоминает профиль игрока и количество турниров с первой страницы истории."""
+        self.user_data = self._user_data(next_data)
+        self.history_total = next_data.get("props", {}).get("pageProps", {}).get("serverData", {}).get(
+            "historyTotal")
+
+    def iter_history(self):
+        """
+        Генератор __NEXT_DATA__ страниц истории по порядку номеров. Загружается не больше max_workers страниц
+        вперёд, а разобранная страница нигде не сохраняется, поэтому в памяти одновременно держится
+        лишь несколько страниц независимо от длины истории игрока.
+        """
+        return self._iter_pages(self._parse_page, self._read_first_page)
+
+    def _iter_pages(self, parse, read_first):
+        """
+        Генератор parse(HTML) страниц истории по порядку номеров, с окном из max_workers загрузок.
+        read_first получает результат разбора первой страницы и должен заполнить history_total.
+        """
+        first = parse(self._download_page(1))
+        read_first(first)
+        yield first
+        del first
+
+        pages = iter(range(2, self.get_total_pages() + 1))
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            window = deque(executor.submit(self._download_page, page) for page in islice(pages, self.max_workers))
+            try:
+                while window:
+                    html_content = window.popleft().result()
+                    next_page = next(pages, None)
+                    if next_page is not None:
+                        window.append(executor.submit(self._download_page, next_page))
+                    yield parse(html_content)
+            finally:
+                # Потребитель мог остановиться раньше — ещё не начатые загрузки не нужны
+                for future in window:
+                    future.cancel()
+
+    def iter_batches(self, batch_size=None, exclude_ids=None, parse_pool=None):
+        """
+        Генератор пакетов (турниры, игры) не больше batch_size турниров (по умолчанию BATCH_SIZE), которые
+        выдаются по мере загрузки и разбора страниц истории. После первого next() заполнены user_data
+        и history_total. Турниры с ID из exclude_ids пропускаются вместе с их играми.
+        С parse_pool (ProcessPoolExecutor) HTML разбирается в процессах пула функцией parse_history_page,
+        а в этот поток возвращаются только готовые записи.
+        """
+        batch_size = batch_size or self.BATCH_SIZE
+        exclude_ids = {str(tournament_id) for tournament_id in exclude_ids or ()}
+        seen_ids = set()
+        tournaments_data, games_data = [], []
+        if parse_pool is None:
+            pages = (self._page_records(next_data, exclude_ids, seen_ids) for next_data in self.iter_history())
+        else:
+            pages = self._iter_pool_records(parse_pool, exclude_ids, seen_ids)
+        for page_tournaments, page_games in pages:
+            tournaments_data.extend(page_tournaments)
+            games_data.extend(page_games)
+            if len(tournaments_data) >= batch_size:
+                yield tournaments_data, games_data
+                tournaments_data, games_data = [], []
+        if tournaments_data or games_data:
+            yield tournaments_data, games_data
+
+    def _iter_pool_records(self, parse_pool, exclude_ids, seen_ids):
+        """Генератор (турниры, игры) страниц истории, разобранных в процессах parse_pool."""
+        def parse(html_content):
+            return parse_pool.submit(parse_history_page, self.player_id, html_content,
+                                     frozenset(exclude_ids | seen_ids), self.user_data is None).result()
+
+        def read_first(page):
+            self.user_data, self.history_total = page[0], page[1]
+
+        for _, _, page_tournaments, page_games, timings in self._iter_pages(parse, read_first):
+            # Разбор шёл в другом процессе, поэтому его время записывается в метрики здесь
+            for stage, seconds in timings.items():
+                SCRAPE_STAGE_SECONDS.observe(seconds, stage=stage)
+            seen_ids.update(str(tournament['id']) for tournament in page_tournaments)
+            yield page_tournaments, page_games
+
+
+class AsyncPlayerScraper(PlayerScraper):
+    """
+    Асинхронный вариант PlayerScraper для ASGI: страницы истории загружаются конкурентно
+    в цикле событий через AsyncHttpClient, поэтому ожидание сайта не занимает потоки.
+    Разбор страниц и extract_data общие с синхронным скраппером.
+    """
+
+    def __init__(self, player_id, max_workers=None):
+        super().__init__(player_id, max_workers)
+        self.http = AsyncHttpClient()
+
+    @SCRAPE_STAGE_SECONDS.timed(stage="fetch_player_html")
+    async def fetch_player_html(self, search_number=1):
+        """Получает HTML-страницу для игрока и проверяет, существует ли он."""
+        self.html_content = await self._download_page(search_number)
+
+    @SCRAPE_STAGE_SECONDS.timed(stage="download_page")
+    async def _download_page(self, search_number):
+        """Загружает страницу истории с указанным номером и возвращает её HTML."""
+        return self._check_response(await self.http.get(self._page_url(search_number)))
+
+    async def fetch_history_pages(self, pages):
+        """
+        Конкурентно загружает страницы истории (не больше max_workers одновременно)
+        и добавляет их данные в next_data в порядке номеров страниц.
+        """
+        pages = list(pages)
+        if not pages:
+            return
+
+        semaphore = asyncio.Semaphore(self.max_workers)
+
+        async def download(page):
+            async with semaphore:
+                return await self._download_page(page)
+
+        # gather возвращает результаты в порядке входных номеров страниц
+        for html_content in await asyncio.gather(*(download(page) for page in pages)):
+            self.html_content = html_content
+            self.extract_next_data()
+
+    async def get_player_tournaments(self):
+        """Главный метод: выполняет полный цикл для получения турниров игрока."""
+        await self.fetch_player_html()
+        self.extract_next_data()
+        self.parse_history_number()
+        await self.fetch_history_pages(range(2, self.get_total_pages() + 1))
+        self.parse_tournaments()
+
+    async def fetch_new_history(self, known_ids, stored_total=0):
+        """Загружает только страницы истории с новыми турнирами, как PlayerScraper.fetch_new_history."""
+        known_ids = {str(tournament_id) for tournament_id in known_ids}
+        await self.fetch_player_html()
+        self.extract_next_data()
+        self.parse_history_number()
+
+        total_pages = self.get_total_pages()
+        new_total = max(0, int(self.history_total or 0) - stored_total)
+        expected_pages = min(total_pages, max(1, math.ceil(new_total / self.PAGE_SIZE)))
+        if not self._has_known_tournament(self.next_data[-1], known_ids):
+            await self.fetch_history_pages(range(2, expected_pages + 1))
+
+        page = len(self.next_data)
+        while page < total_pages and not self._has_known_tournament(self.next_data[-1], known_ids):
+            page += 1
+            await self.fetch_history_pages([page])
+        self.parse_tournaments()
+
+    async def iter_history(self):
+        """Асинхронный генератор __NEXT_DATA__ страниц истории, как PlayerScraper.iter_history."""
+        first = self._parse_page(await self._download_page(1))
+        self._read_first_page(first)
+        yield first
+        del first
+
+        pages = iter(range(2, self.get_total_pages() + 1))
+        window = deque(asyncio.ensure_future(self._download_page(page)) for page in islice(pages, self.max_workers))
+        try:
+            while window:
+                html_content = await window.popleft()
+                next_page = next(pages, None)
+                if next_page is not None:
+                    window.append(asyncio.ensure_future(self._download_page(next_page)))
+                yield self._parse_page(html_content)
+        finally:
+            for task in window:
+                task.cancel()
+
+    async def iter_batches(self, batch_size=None, exclude_ids=None):
+        """Асинхронный генератор пакетов (турниры, игры), как PlayerScraper.iter_batches."""
+        batch_size = batch_size or self.BATCH_SIZE
+        exclude_ids = {str(tournament_id) for tournament_id in exclude_ids or ()}
+        seen_ids = set()
+        tournaments_data, games_data = [], []
+        async for next_data in self.iter_history():
+            page_tournaments, page_games = self._page_records(next_data, exclude_ids, seen_ids)
+            tournaments_data.extend(page_tournaments)
+            games_data.extend(page_games)
+            if len(tournaments_data) >= batch_size:
+                yield tournaments_data, games_data
+                tournaments_data, games_data = [], []
+        if tournaments_data or games_data:
+            yield tournaments_data, games_data
+
+
+NEXT_DATA_MARKER = 'id="__NEXT_DATA__"'
+
+
+def find_next_data(html_content):
+    """
+    Быстро извлекает JSON из тега <script id="__NEXT_DATA__"> поиском подстрок, без построения дерева HTML.
+    Возвращает None, если тег не удалось найти или его содержимое не является корректным JSON.
+    """
+    marker = html_content.find(NEXT_DATA_MARKER)
+    if marker == -1:
+        return None
+    tag_start = html_content.rfind("<", 0, marker)
+    start = html_content.find(">", marker)
+    # Маркер должен находиться внутри открывающего тега <script ...>
+    if tag_start == -1 or start == -1 or not html_content.startswith("<script", tag_start):
+        return None
+    end = html_content.find("</script>", start)
+    if end == -1:
+        return None
+    try:
+        return json.loads(html_content[start + 1:end])
+    except json.JSONDecodeError:
+        return None
+
+
+def soup_next_data(html_content):
+    """
+    Извлекает JSON из тега <script id="__NEXT_DATA__"> через полный разбор страницы BeautifulSoup.
+    """
+    soup = BeautifulSoup(html_content, "html.parser")
+    script_tag = soup.find("script", id="__NEXT_DATA__")
+
+    if not script_tag:
+        raise Exception("Тег <script id='__NEXT_DATA__'> не найден на странице")
+
+    try:
+        return json.loads(script_tag.string)
+    except json.JSONDecodeError:
+        raise Exception("Ошибка при парсинге JSON из __NEXT_DATA__")
+
+
+def parse_next_data(html_content):
+    """
+    Извлекает JSON из __NEXT_DATA__: сначала быстрым поиском, а при неудаче через BeautifulSoup.
+    """
+    next_data = find_next_data(html_content)
+    if next_data is None:
+        next_data = soup_next_data(html_content)
+    return next_data
+
+
+def user_data_from(player_id, next_data):
+    """Профиль игрока из __NEXT_DATA__ первой страницы истории."""
+    user_data = next_data.get('props', {}).get('pageProps', {}).get('serverData', {}).get('user', {})
+
+    # Проверка, если данных о пользователе нет
+    if not user_data:
+        raise Exception(f"Данные о пользователе для игрока с ID {player_id} не найдены.")
+
+    # Обрабатываем отсутствие аватара
+    avatar_link = user_data.get('avatar_link', None)
+    if avatar_link is None:
+        user_data['avatar_link'] = 'Аватар отсутствует'
+
+    logger.debug("Данные о пользователе %s: %s", player_id, user_data)
+    return user_data
+
+
+def page_records(player_id, next_data, exclude_ids, seen_ids):
+    """
+    Возвращает (турниры, игры) из __NEXT_DATA__ одной страницы истории. Турниры из exclude_ids и уже
+    встреченные на предыдущих страницах (их ID накапливаются в seen_ids) пропускаются.
+    """
+    tournaments_data = []
+    games_data = []
+    server_data = next_data.get('props', {}).get('pageProps', {}).get('serverData', {})
+
+    if not server_data:
+        logger.warning("Нет данных для страницы с ID %s. Пропускаем.", player_id)
+        return tournaments_data, games_data
+
+    tournament_history = server_data.get('history', [])
+
+    # Если турниров нет, добавляем сообщение о том, что игрок не участвовал в турнирах
+    if not tournament_history:
+        logger.debug("Игрок с ID %s не участвовал в турнирах.", player_id)
+        return tournaments_data, games_data
+
+    for tournament in tournament_history:
+        # Если история сдвинулась во время загрузки, турнир может попасть на две страницы
+        if str(tournament.get('id')) in exclude_ids or str(tournament.get('id')) in seen_ids:
+            continue
+        seen_ids.add(str(tournament.get('id')))
+        tournament_info = {
+            'id': tournament.get('id', 'Неизвестно'),
+            'title': tournament.get('title', 'Неизвестно'),
+            'date_start': tournament.get('date_start', 'Неизвестно'),
+            'date_end': tournament.get('date_end', 'Неизвестно'),
+            'country_translate': tournament.get('country_translate', 'Неизвестно'),
+            'city_translate': tournament.get('city_translate', 'Неизвестно'),
+            'place': tournament.get('place', 'Неизвестно'),
+            'gg': tournament.get('gg', 'Неизвестно'),
+            'elo': tournament.get('elo', 'Неизвестно')
+        }
+        tournaments_data.append(tournament_info)
+
+        # Данные о играх в турнире
+        games = tournament.get('games', [])
+        if games:
+            for game in games:
+                game_info = {
+                    'tournament_id': tournament.get('id'),
+                    'game_num': game.get('game_num'),
+                    'role': game.get('role', 'Неизвестно'),
+                    'role_translate': game.get('role_translate', 'Неизвестно'),
+                    'place': game.get('place', 'Неизвестно'),
+                    'win': game.get('win', 'Неизвестно'),
+                    'win_translate': game.get('win_translate', 'Неизвестно'),
+                    'elo': game.get('elo', 'Неизвестно')
+                }
+                games_data.append(game_info)
+
+    return tournaments_data, games_data
+
+
+def parse_history_page(player_id, html_content, skip_ids=frozenset(), with_user=False):
+    """
+    Разбирает HTML страницы истории в готовые для базы записи:
+    (профиль, historyTotal, турниры, игры, время этапов разбора в секундах).
+    Профиль возвращается только с with_user, турниры из skip_ids пропускаются. Функция уровня модуля
+    без HTTP-клиента, чтобы её можно было дёшево выполнять в процессах ProcessPoolExecutor: туда
+    передаётся HTML, а обратно — только компактные записи без исходного __NEXT_DATA__. Метрики процесса
+    пула никто не читает, поэтому время этапов возвращается вызывающему.
+    """
+    started = time.perf_counter()
+    next_data = parse_next_data(html_content)
+    parsed = time.perf_counter()
+    user_data = user_data_from(player_id, next_data) if with_user else None
+    history_total = next_data.get("props", {}).get("pageProps", {}).get("serverData", {}).get("historyTotal")
+    tournaments_data, games_data = page_records(player_id, next_data, skip_ids, set())
+    timings = {"extract_next_data": parsed - started, "extract_data": time.perf_counter() - parsed}
+    return user_data, history_total, tournaments_data, games_data, timings
+
 
 def simplify_dict(d):
     """
@@ -187,3 +560,4 @@ def simplify_dict(d):
 #     scraper.get_player_tournaments()
 #     user_data, tournaments_data, games_data = scraper.extract_data()
 #     print(tournaments_data)
+
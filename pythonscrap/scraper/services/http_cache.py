@@ -0,0 +1,203 @@
+import hashlib
+import os
+import sqlite3
+import tempfile
+import threading
+import time
+import zlib
+import requests
+from requests.structures import CaseInsensitiveDict
+
+
+class HttpCache:
+    """
+    Кэш ответов gomafia.pro на диске.
+    Тела ответов сжимаются zlib и хранятся по SHA-256 содержимого (objects/ab/<хэш>.z), поэтому одинаковые
+    страницы занимают место один раз. Индекс URL -> (хэш тела, ETag, Last-Modified, время загрузки)
+    лежит в SQLite рядом, и им могут одновременно пользоваться несколько потоков и процессов.
+    Записи старше ttl перепроверяются условным запросом, а при превышении max_bytes удаляются
+    давно не использованные (LRU по времени последнего обращения).
+    """
+    INDEX_NAME = "index.sqlite"
+    EVICT_TO = 0.9  # После вытеснения кэш занимает не больше этой доли max_bytes
+
+    def __init__(self, directory, ttl=3600, max_bytes=512 * 1024 * 1024, offline=False):
+        self.directory = os.path.abspath(directory)
+        self.ttl = float(ttl)
+        self.max_bytes = int(max_bytes)
+        self.offline = offline  # Только чтение из кэша, без обращений к сайту
+        self._local = threading.local()
+        os.makedirs(os.path.join(self.directory, "objects"), exist_ok=True)
+        with self._index() as index:
+            index.executescript("""
+            PRAGMA journal_mode = WAL;
+            CREATE TABLE IF NOT EXISTS entries (
+                url TEXT PRIMARY KEY,
+                digest TEXT NOT NULL,
+                encoding TEXT,
+                etag TEXT,
+                last_modified TEXT,
+                fetched_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS blobs (
+                digest TEXT PRIMARY KEY,
+                size INTEGER NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_accessed_at_idx ON entries (accessed_at);
+            CREATE INDEX IF NOT EXISTS entries_digest_idx ON entries (digest);
+            """)
+
+    @classmethod
+    def from_env(cls):
+        """Создаёт кэш по переменным окружения GOMAFIA_CACHE_*; без GOMAFIA_CACHE_DIR кэш выключен."""
+        directory = os.getenv("GOMAFIA_CACHE_DIR")
+        if not directory:
+            return None
+        return cls(
+            directory,
+            ttl=float(os.getenv("GOMAFIA_CACHE_TTL", 3600)),
+            max_bytes=int(os.getenv("GOMAFIA_CACHE_MAX_MB", 512)) * 1024 * 1024,
+            offline=os.getenv("GOMAFIA_CACHE_OFFLINE", "0") == "1",
+        )
+
+    def _index(self) -> sqlite3.Connection:
+        """Соединение с индексом, своё для каждого потока."""
+        index = getattr(self._local, "index", None)
+        if index is None:
+            index = sqlite3.connect(os.path.join(self.directory, self.INDEX_NAME), timeout=30)
+            index.row_factory = sqlite3.Row
+            self._local.index = index
+        return index
+
+    def _blob_path(self, digest):
+        return os.path.join(self.directory, "objects", digest[:2], f"{digest}.z")
+
+    def lookup(self, url):
+        """
+        Возвращает запись индекса для URL вместе с телом ответа (ключ "body") или None; отмечает
+        обращение для LRU. Тело читается сразу, чтобы вытеснение другим процессом после поиска
+        не оставило запись без файла.
+        """
+        with self._index() as index:
+            entry = index.execute("SELECT * FROM entries WHERE url = ?", (url,)).fetchone()
+            if entry is None:
+                return None
+            try:
+                with open(self._blob_path(entry["digest"]), "rb") as f:
+                    body = zlib.decompress(f.read())
+            except FileNotFoundError:
+                # Файл тела удалили вручную или его только что вытеснили — запись бесполезна
+                self._forget(index, url, entry["digest"])
+                return None
+            index.execute("UPDATE entries SET accessed_at = ? WHERE url = ?", (time.time(), url))
+        return {**dict(entry), "body": body}
+
+    @staticmethod
+    def _forget(index, url, digest):
+        """Удаляет запись URL, указывающую на digest, и строку тела, если на него больше никто не ссылается."""
+        index.execute("DELETE FROM entries WHERE url = ? AND digest = ?", (url, digest))
+        index.execute("""
+        DELETE FROM blobs WHERE digest = ? AND NOT EXISTS (SELECT 1 FROM entries WHERE digest = ?)
+        """, (digest, digest))
+
+    def is_fresh(self, entry) -> bool:
+        return time.time() - entry["fetched_at"] < self.ttl
+
+    @staticmethod
+    def validators(entry) -> dict:
+        """Заголовки условного запроса для перепроверки устаревшей записи."""
+        headers = {}
+        if entry["etag"]:
+            headers["If-None-Match"] = entry["etag"]
+        if entry["last_modified"]:
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def response(self, entry) -> requests.Response:
+        """Собирает из записи кэша ответ с кодом 200, как если бы страница была загружена."""
+        response = requests.Response()
+        response.status_code = 200
+        response.url = entry["url"]
+        response._content = entry["body"]
+        response.encoding = entry["encoding"] or "utf-8"
+        response.headers = CaseInsensitiveDict({"X-Cache": "HIT"})
+        if entry["etag"]:
+            response.headers["ETag"] = entry["etag"]
+        if entry["last_modified"]:
+            response.headers["Last-Modified"] = entry["last_modified"]
+        response.from_cache = True
+        return response
+
+    def update(self, url, entry, response):
+        """
+        Обрабатывает ответ сайта на запрос URL с записью entry (или None):
+        304 продлевает запись и возвращает ответ из кэша, 200 сохраняется в кэш,
+        остальные ответы возвращаются как есть.
+        """
+        if response.status_code == 304 and entry is not None:
+            with self._index() as index:
+                index.execute("UPDATE entries SET fetched_at = ? WHERE url = ?", (time.time(), url))
+            return self.response(entry)
+        if response.status_code == 200:
+            self.store(url, response.content, response.encoding,
+                       response.headers.get("ETag"), response.headers.get("Last-Modified"))
+        return response
+
+    def store(self, url, body, encoding=None, etag=None, last_modified=None):
+        """Сохраняет тело ответа и обновляет запись индекса для URL."""
+        digest = hashlib.sha256(body).hexdigest()
+        path = self._blob_path(digest)
+        now = time.time()
+        with self._index() as index:
+            # Блокировка записи индекса: вытеснение не удалит файл между проверкой и вставкой строк
+            index.execute("BEGIN IMMEDIATE")
+            if not os.path.exists(path):
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                data = zlib.compress(body, 6)
+                # Пишем во временный файл и переименовываем, чтобы другой процесс не прочитал файл наполовину
+                fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+                with os.fdopen(fd, "wb") as f:
+                    f.write(data)
+                os.replace(tmp_path, path)
+                size = len(data)
+            else:
+                size = os.path.getsize(path)
+            index.execute("INSERT OR IGNORE INTO blobs (digest, size) VALUES (?, ?)", (digest, size))
+            index.execute("""
+            INSERT INTO entries (url, digest, encoding, etag, last_modified, fetched_at, accessed_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (url) DO UPDATE SET digest = excluded.digest, encoding = excluded.encoding,
+                etag = excluded.etag, last_modified = excluded.last_modified,
+                fetched_at = excluded.fetched_at, accessed_at = excluded.accessed_at
+            """, (url, digest, encoding, etag, last_modified, now, now))
+            total = index.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+        if total > self.max_bytes:
+            self.evict()
+
+    def evict(self):
+        """
+        Удаляет давно не использованные записи, пока кэш не уменьшится до EVICT_TO от max_bytes.
+        Файлы удаляются под той же блокировкой записи индекса, что и строки; читатель, не успевший
+        открыть удалённый файл, считает это промахом (см. lookup).
+        """
+        target = self.max_bytes * self.EVICT_TO
+        with self._index() as index:
+            index.execute("BEGIN IMMEDIATE")
+            total = index.execute("SELECT COALESCE(SUM(size), 0) FROM blobs").fetchone()[0]
+            rows = index.execute("SELECT url FROM entries ORDER BY accessed_at").fetchall()
+            for row in rows:
+                if total <= target:
+                    break
+                digest = index.execute("SELECT digest FROM entries WHERE url = ?", (row["url"],)).fetchone()[0]
+                index.execute("DELETE FROM entries WHERE url = ?", (row["url"],))
+                # Тело удаляется, только если на него не ссылается другой URL
+                if index.execute("SELECT 1 FROM entries WHERE digest = ? LIMIT 1", (digest,)).fetchone():
+                    continue
+                size = index.execute("SELECT size FROM blobs WHERE digest = ?", (digest,)).fetchone()
+                index.execute("DELETE FROM blobs WHERE digest = ?", (digest,))
+                total -= size[0] if size else 0
+                try:
+                    os.remove(self._blob_path(digest))
+                except FileNotFoundError:
+                    pass
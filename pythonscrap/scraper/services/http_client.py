@@ -0,0 +1,218 @@
+import asyncio
+import os
+import random
+import threading
+import time
+from email.utils import parsedate_to_datetime
+import httpx
+import requests
+from requests.adapters import HTTPAdapter
+from .http_cache import HttpCache
+from .rate_limiter import AdaptiveRateLimiter
+
+
+def retry_after_seconds(value):
+    """Значение заголовка Retry-After в секундах: он задаётся числом секунд или HTTP-датой. None, если не разобран."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class HttpClient:
+    """
+    Общий HTTP-клиент для запросов к gomafia.pro.
+    Держит одну сессию с пулом keep-alive соединений и повторяет запросы
+    с экспоненциальной задержкой при ответах 429/5xx и сетевых ошибках.
+    Частоту запросов ограничивает rate_limiter; о каждом ответе ему сообщается, чтобы
+    AdaptiveRateLimiter мог подстроить частоту под сайт.
+    Если задан кэш (HttpCache), свежие страницы берутся с диска, а устаревшие перепроверяются
+    условным запросом.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    USER_AGENT = "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
+    RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+    def __new__(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                # Экземпляр публикуется только настроенным, иначе другой поток получит его без сессии
+                instance = super().__new__(cls)
+                instance._configure()
+                cls._instance = instance
+        return cls._instance
+
+    def _configure(self):
+        """Читает настройки из переменных окружения и создаёт сессию."""
+        self.pool_size = int(os.getenv("GOMAFIA_POOL_SIZE", 16))
+        self.connect_timeout = float(os.getenv("GOMAFIA_CONNECT_TIMEOUT", 5))
+        self.read_timeout = float(os.getenv("GOMAFIA_READ_TIMEOUT", 20))
+        self.max_retries = int(os.getenv("GOMAFIA_MAX_RETRIES", 4))
+        self.backoff_base = float(os.getenv("GOMAFIA_BACKOFF_BASE", 0.5))
+        self.backoff_max = float(os.getenv("GOMAFIA_BACKOFF_MAX", 30))
+        self.session = self._create_session()
+        self.rate_limiter = AdaptiveRateLimiter.from_env()  # Общий для всех запросов процесса или None
+        self.cache = HttpCache.from_env()  # Кэш ответов на диске или None
+
+    def _create_session(self):
+        """Создаёт сессию с пулом соединений нужного размера."""
+        session = requests.Session()
+        session.headers["User-Agent"] = self.USER_AGENT
+        # Повторы выполняем сами, поэтому у адаптера они отключены
+        adapter = HTTPAdapter(pool_connections=self.pool_size, pool_maxsize=self.pool_size, max_retries=0)
+        session.mount("https://", adapter)
+        session.mount("http://", adapter)
+        return session
+
+    def _backoff_delay(self, attempt, retry_after=None):
+        """
+        Возвращает задержку перед повтором: экспонента с полным джиттером,
+        либо retry_after (Retry-After в секундах), если сервер его прислал.
+        """
+        if retry_after is not None:
+            return min(retry_after, self.backoff_max)
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+
+    def _on_response(self, response):
+        """Сообщает ограничителю частоты об ответе сайта и возвращает Retry-After в секундах или None."""
+        retry_after = retry_after_seconds(response.headers.get("Retry-After"))
+        if self.rate_limiter is not None:
+            self.rate_limiter.on_response(response.status_code, self._limiter_pause(retry_after))
+        return retry_after
+
+    def _limiter_pause(self, retry_after):
+        """Пауза ограничителя по Retry-After, не длиннее backoff_max."""
+        return None if retry_after is None else min(retry_after, self.backoff_max)
+
+    def _cache_lookup(self, url, kwargs):
+        """
+        Возвращает (ответ из кэша или None, запись кэша). Для устаревшей записи добавляет в kwargs
+        заголовки условного запроса; в офлайн-режиме отсутствие страницы в кэше — ошибка.
+        """
+        entry = self.cache.lookup(url)
+        if entry is not None and (self.cache.offline or self.cache.is_fresh(entry)):
+            return self.cache.response(entry), entry
+        if self.cache.offline:
+            raise Exception(f"Страницы {url} нет в кэше, а загрузка с сайта отключена (офлайн-режим)")
+        if entry is not None:
+            kwargs["headers"] = {**(kwargs.get("headers") or {}), **self.cache.validators(entry)}
+        return None, entry
+
+    def get(self, url, **kwargs):
+        """
+        Выполняет GET-запрос с повторами, используя кэш, если он задан. Возвращает последний
+        полученный ответ; если сервер так и не ответил, пробрасывает последнюю сетевую ошибку.
+        """
+        if self.cache is None:
+            return self._fetch(url, **kwargs)
+        cached, entry = self._cache_lookup(url, kwargs)
+        if cached is not None:
+            return cached
+        return self.cache.update(url, entry, self._fetch(url, **kwargs))
+
+    def _fetch(self, url, **kwargs):
+        """Выполняет GET-запрос к сайту с повторами."""
+        kwargs.setdefault("timeout", (self.connect_timeout, self.read_timeout))
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                self.rate_limiter.acquire()
+            try:
+                response = self.session.get(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+                time.sleep(self._backoff_delay(attempt))
+            else:
+                retry_after = self._on_response(response)
+                if response.status_code not in self.RETRY_STATUSES or attempt >= self.max_retries:
+                    return response
+                time.sleep(self._backoff_delay(attempt, retry_after))
+            attempt += 1
+
+    def close(self):
+        """Закрывает все соединения пула."""
+        self.session.close()
+
+
+class AsyncHttpClient(HttpClient):
+    """
+    Асинхронный вариант HttpClient на httpx для работы внутри цикла событий (ASGI).
+    Настройки, повторы и задержки те же, что у синхронного клиента. Клиент httpx привязан
+    к циклу событий, поэтому для каждого цикла создаётся свой экземпляр.
+    """
+    _instances = {}
+    _instances_lock = threading.Lock()
+
+    def __new__(cls):
+        loop = asyncio.get_running_loop()
+        with cls._instances_lock:
+            instance = cls._instances.get(loop)
+            if instance is None:
+                # Экземпляры закрытых циклов больше не нужны
+                for closed in [key for key in cls._instances if key.is_closed()]:
+                    del cls._instances[closed]
+                instance = object.__new__(cls)
+                instance._configure()
+                cls._instances[loop] = instance
+        return instance
+
+    def _create_session(self):
+        """Создаёт асинхронный клиент httpx с пулом соединений нужного размера."""
+        return httpx.AsyncClient(
+            headers={"User-Agent": self.USER_AGENT},
+            limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+            timeout=httpx.Timeout(self.read_timeout, connect=self.connect_timeout),
+        )
+
+    async def get(self, url, **kwargs):
+        """
+        Выполняет GET-запрос с повторами и кэшем, не блокируя цикл событий. Возвращает последний ответ;
+        если сервер так и не ответил, пробрасывает последнюю сетевую ошибку.
+        Обращения к кэшу (SQLite и сжатие zlib) выполняются в отдельном потоке.
+        """
+        if self.cache is None:
+            return await self._fetch(url, **kwargs)
+        cached, entry = await asyncio.to_thread(self._cache_lookup, url, kwargs)
+        if cached is not None:
+            return cached
+        response = await self._fetch(url, **kwargs)
+        return await asyncio.to_thread(self.cache.update, url, entry, response)
+
+    async def _fetch(self, url, **kwargs):
+        """Выполняет GET-запрос к сайту с повторами."""
+        attempt = 0
+        while True:
+            if self.rate_limiter is not None:
+                await self.rate_limiter.acquire_async()
+            try:
+                response = await self.session.get(url, **kwargs)
+            except httpx.TransportError:
+                if attempt >= self.max_retries:
+                    raise
+                await asyncio.sleep(self._backoff_delay(attempt))
+            else:
+                retry_after = await self._on_response_async(response)
+                if response.status_code not in self.RETRY_STATUSES or attempt >= self.max_retries:
+                    return response
+                await asyncio.sleep(self._backoff_delay(attempt, retry_after))
+            attempt += 1
+
+    async def _on_response_async(self, response):
+        """То же, что _on_response, но файл состояния ограничителя не блокирует цикл событий."""
+        retry_after = retry_after_seconds(response.headers.get("Retry-After"))
+        if self.rate_limiter is not None:
+            await self.rate_limiter.on_response_async(response.status_code, self._limiter_pause(retry_after))
+        return retry_after
+
+    async def close(self):
+        """Закрывает все соединения клиента."""
+        await self.session.aclose()
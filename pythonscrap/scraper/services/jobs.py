@@ -0,0 +1,125 @@
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from ..db.async_database import AsyncDatabaseManager
+from ..db.database import DatabaseManager
+
+
+class ScrapeJobQueue:
+    """
+    Фоновая очередь скрапинга игроков внутри процесса.
+    Задачи хранятся в таблице scrape_jobs, поэтому их статус доступен из любого процесса,
+    а незавершённые задачи подхватываются после перезапуска.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+    MAX_WORKERS = int(os.getenv("SCRAPE_JOB_WORKERS", 2))
+    STALE_AFTER = float(os.getenv("SCRAPE_JOB_STALE_AFTER", 900))  # Через сколько секунд задача в работе считается брошенной
+
+    def __new__(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                instance = super().__new__(cls)
+                instance._database = DatabaseManager()
+                instance._executor = ThreadPoolExecutor(max_workers=cls.MAX_WORKERS,
+                                                        thread_name_prefix="scrape-job")
+                instance._resume_pending()
+                cls._instance = instance
+        return cls._instance
+
+    def _resume_pending(self):
+        """Отправляет в работу задачи, оставшиеся в очереди с прошлого запуска."""
+        for job in self._database.get_pending_scrape_jobs(self.STALE_AFTER):
+            self._executor.submit(self._run, job['id'], job['player_id'])
+
+    def enqueue(self, player_id: int) -> int:
+        """
+        Ставит скрапинг игрока в очередь и возвращает ID задачи; повторные запросы получают ту же задачу.
+        Брошенная задача (например, её поток обработчика погиб) отправляется в работу заново.
+        """
+        job = self._database.create_scrape_job(int(player_id), self.STALE_AFTER)
+        if job["created"] or job["reclaimed"]:
+            self._executor.submit(self._run, job["id"], int(player_id))
+        return job["id"]
+
+    def get_status(self, job_id: int):
+        """Возвращает задачу по ID или None."""
+        return self._database.get_scrape_job(job_id)
+
+    def _run(self, job_id: int, player_id: int):
+        """Выполняет задачу, если её ещё не забрал другой обработчик."""
+        if not self._database.claim_scrape_job(job_id):
+            return
+        try:
+            result = self._database.refresh_player_from_id(player_id)
+            error = None if result.get("status") == "success" else "Ошибка при парсинге данных игрока."
+        except Exception as e:
+            error = str(e)
+        self._database.finish_scrape_job(job_id, error)
+
+
+class AsyncScrapeJobQueue:
+    """
+    Очередь скрапинга для асинхронных представлений. Задачи хранятся в той же таблице scrape_jobs,
+    но выполняются задачами asyncio в цикле событий, а не в пуле потоков: одновременных скрапингов
+    может быть много, их число ограничено только MAX_CONCURRENT. Как и ScrapeJobQueue, при запуске
+    подхватывает незавершённые задачи и заново отправляет в работу брошенные.
+    """
+    _instances = {}
+    _instances_lock = threading.Lock()
+    MAX_CONCURRENT = int(os.getenv("SCRAPE_JOB_CONCURRENCY", 32))
+    STALE_AFTER = ScrapeJobQueue.STALE_AFTER
+
+    def __new__(cls):
+        loop = asyncio.get_running_loop()
+        with cls._instances_lock:
+            instance = cls._instances.get(loop)
+            if instance is None:
+                for closed in [key for key in cls._instances if key.is_closed()]:
+                    del cls._instances[closed]
+                instance = super().__new__(cls)
+                instance._database = AsyncDatabaseManager()
+                instance._semaphore = asyncio.Semaphore(cls.MAX_CONCURRENT)
+                instance._tasks = set()  # Ссылки на выполняемые задачи, чтобы их не собрал сборщик мусора
+                instance._track(asyncio.create_task(instance._resume_pending()))
+                cls._instances[loop] = instance
+        return instance
+
+    def _track(self, task):
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _resume_pending(self):
+        """Отправляет в работу задачи, оставшиеся в очереди с прошлого запуска."""
+        for job in await self._database.get_pending_scrape_jobs(self.STALE_AFTER):
+            self._submit(job['id'], job['player_id'])
+
+    def _submit(self, job_id: int, player_id: int):
+        self._track(asyncio.create_task(self._run(job_id, player_id)))
+
+    async def enqueue(self, player_id: int) -> int:
+        """
+        Ставит скрапинг игрока в очередь и возвращает ID задачи; повторные запросы получают ту же задачу.
+        Брошенная задача отправляется в работу заново.
+        """
+        job = await self._database.create_scrape_job(int(player_id), self.STALE_AFTER)
+        if job["created"] or job["reclaimed"]:
+            self._submit(job["id"], int(player_id))
+        return job["id"]
+
+    async def get_status(self, job_id: int):
+        """Возвращает задачу по ID или None."""
+        return await self._database.get_scrape_job(job_id)
+
+    async def _run(self, job_id: int, player_id: int):
+        """Выполняет задачу, если её ещё не забрал другой обработчик."""
+        async with self._semaphore:
+            if not await self._database.claim_scrape_job(job_id):
+                return
+            try:
+                result = await self._database.refresh_player_from_id(player_id)
+                error = None if result.get("status") == "success" else "Ошибка при парсинге данных игрока."
+            except Exception as e:
+                error = str(e)
+            await self._database.finish_scrape_job(job_id, error)
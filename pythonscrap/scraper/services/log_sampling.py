@@ -0,0 +1,18 @@
+import logging
+import random
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Пропускает только долю rate записей ниже min_level (по умолчанию DEBUG и INFO),
+    чтобы подробные сообщения скрапинга не заваливали журнал при массовой загрузке.
+    Предупреждения и ошибки проходят всегда.
+    """
+
+    def __init__(self, rate=1.0, min_level=logging.WARNING):
+        super().__init__()
+        self.rate = float(rate)
+        self.min_level = min_level if isinstance(min_level, int) else logging.getLevelName(min_level)
+
+    def filter(self, record):
+        return record.levelno >= self.min_level or self.rate >= 1 or random.random() < self.rate
@@ -0,0 +1,188 @@
+import contextvars
+import functools
+import inspect
+import threading
+import time
+from contextlib import contextmanager
+
+PROMETHEUS_CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# Счётчик SQL-запросов текущего HTTP-запроса; список, чтобы его видели и потоки asyncio.to_thread
+_query_count = contextvars.ContextVar("query_count", default=None)
+
+
+def _format_labels(names, values, extra=()):
+    """Метки в формате {name="value",...}; кавычки, обратные слэши и переводы строк экранируются."""
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ""
+    escaped = [(name, str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n"))
+               for name, value in pairs]
+    return "{" + ",".join(f'{name}="{value}"' for name, value in escaped) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class _Metric:
+    TYPE = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}  # Значения меток -> значение метрики
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"Метрика {self.name} ожидает метки {self.labelnames}, получены {tuple(labels)}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.TYPE}"]
+        with self._lock:
+            items = sorted(self._values.items())
+            lines.extend(self._render_sample(key, value) for key, value in items)
+        return "\n".join(lines)
+
+
+class Counter(_Metric):
+    """Монотонно растущий счётчик."""
+    TYPE = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _render_sample(self, key, value):
+        return f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+
+
+class Histogram(_Metric):
+    """Гистограмма с накопительными корзинами, суммой и количеством наблюдений, как в Prometheus."""
+    TYPE = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = {"buckets": [0] * len(self.buckets), "sum": 0.0, "count": 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state["buckets"][i] += 1
+            state["sum"] += value
+            state["count"] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        """Замеряет время выполнения блока в секундах."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def timed(self, **labels):
+        """Декоратор, замеряющий время вызова функции или корутины."""
+        def decorator(func):
+            if inspect.iscoroutinefunction(func):
+                @functools.wraps(func)
+                async def async_wrapper(*args, **kwargs):
+                    with self.time(**labels):
+                        return await func(*args, **kwargs)
+                return async_wrapper
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.time(**labels):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def _render_sample(self, key, state):
+        lines = []
+        for bound, count in zip(self.buckets, state["buckets"]):
+            labels = _format_labels(self.labelnames, key, [("le", _format_value(float(bound)))])
+            lines.append(f"{self.name}_bucket{labels} {count}")
+        lines.append(f"{self.name}_bucket{_format_labels(self.labelnames, key, [('le', '+Inf')])} {state['count']}")
+        lines.append(f"{self.name}_sum{_format_labels(self.labelnames, key)} {_format_value(state['sum'])}")
+        lines.append(f"{self.name}_count{_format_labels(self.labelnames, key)} {state['count']}")
+        return "\n".join(lines)
+
+
+class MetricsRegistry:
+    """
+    Метрики процесса и их вывод в текстовом формате Prometheus.
+    Каждый процесс (воркер gunicorn/uvicorn) хранит свои значения, и Prometheus опрашивает процессы по отдельности.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                instance = super().__new__(cls)
+                instance._metrics = {}
+                instance._lock = threading.Lock()
+                cls._instance = instance
+        return cls._instance
+
+    def _get_or_create(self, metric_class, name, *args, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = metric_class(name, *args, **kwargs)
+            elif not isinstance(metric, metric_class):
+                raise ValueError(f"Метрика {name} уже зарегистрирована с другим типом")
+        return metric
+
+    def counter(self, name, documentation, labelnames=()) -> Counter:
+        return self._get_or_create(Counter, name, documentation, labelnames)
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, documentation, labelnames, buckets)
+
+    def render(self) -> str:
+        return "\n".join(metric.render() for _, metric in sorted(self._metrics.items())) + "\n"
+
+
+@contextmanager
+def count_queries():
+    """Считает SQL-запросы, выполненные внутри блока (в том числе в потоках asyncio.to_thread); выдаёт [количество]."""
+    counter = [0]
+    token = _query_count.set(counter)
+    try:
+        yield counter
+    finally:
+        _query_count.reset(token)
+
+
+def record_query():
+    """Учитывает SQL-запрос в счётчике текущего HTTP-запроса, если он идёт."""
+    counter = _query_count.get()
+    if counter is not None:
+        counter[0] += 1
+
+
+REGISTRY = MetricsRegistry()
+SCRAPE_STAGE_SECONDS = REGISTRY.histogram(
+    "scraper_scrape_stage_seconds", "Время этапов скрапинга игрока (загрузка и разбор страниц)", ["stage"])
+DB_QUERY_SECONDS = REGISTRY.histogram(
+    "scraper_db_query_seconds", "Время методов DatabaseManager", ["query"])
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "scraper_http_request_duration_seconds", "Время обработки HTTP-запроса по представлениям", ["view", "method"])
+HTTP_REQUESTS_TOTAL = REGISTRY.counter(
+    "scraper_http_requests_total", "Количество HTTP-запросов по представлениям и кодам ответа",
+    ["view", "method", "status"])
+HTTP_REQUEST_DB_QUERIES = REGISTRY.histogram(
+    "scraper_http_request_db_queries", "Количество SQL-запросов на один HTTP-запрос", ["view"],
+    buckets=(0, 1, 2, 3, 5, 10, 20, 50, 100))
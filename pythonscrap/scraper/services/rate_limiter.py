@@ -0,0 +1,188 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+
+try:
+    import fcntl
+except ImportError:  # Windows: общий файл состояния недоступен
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+
+class RateLimiter:
+    """
+    Потокобезопасный ограничитель частоты запросов по алгоритму token bucket.
+    rate — количество запросов в секунду, burst — сколько запросов можно выполнить подряд без ожидания.
+    """
+
+    def __init__(self, rate, burst=None):
+        if rate <= 0:
+            raise ValueError("Частота запросов должна быть положительной")
+        self.rate = float(rate)
+        self.burst = float(burst or max(1.0, rate))
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self):
+        """Пополняет корзину токенами за время, прошедшее с прошлого обновления."""
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _try_take(self):
+        """Забирает токен и возвращает 0 либо, если корзина пуста, возвращает время ожидания токена."""
+        with self._lock:
+            self._refill()
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0
+            return (1 - self._tokens) / self.rate
+
+    def acquire(self):
+        """Блокирует поток, пока в корзине не появится токен, и забирает его."""
+        while True:
+            wait = self._try_take()
+            if not wait:
+                return
+            time.sleep(wait)
+
+    async def acquire_async(self):
+        """То же, что acquire, но ожидает токен без блокировки цикла событий."""
+        while True:
+            wait = await self._try_take_async()
+            if not wait:
+                return
+            await asyncio.sleep(wait)
+
+    async def _try_take_async(self):
+        # Корзина в памяти: блокировка держится микросекунды, поток для неё не нужен
+        return self._try_take()
+
+    def on_response(self, status_code, retry_after=None):
+        """Обратная связь от HTTP-клиента о полученном ответе; постоянной частоте она не нужна."""
+
+    async def on_response_async(self, status_code, retry_after=None):
+        """То же, что on_response, для асинхронного клиента."""
+        self.on_response(status_code, retry_after)
+
+
+class AdaptiveRateLimiter(RateLimiter):
+    """
+    Token bucket, частота которого подбирается по AIMD. Каждый успешный ответ прибавляет к частоте
+    increase / rate, то есть примерно increase запросов в секунду за секунду работы, но не выше max_rate.
+    Ответ 429/5xx умножает частоту на decrease, но не ниже min_rate; пачка таких ответов от параллельных
+    запросов уменьшает её один раз за DECREASE_INTERVAL. Retry-After приостанавливает все запросы на указанное время.
+
+    С state_file состояние корзины хранится в файле под блокировкой fcntl.flock, и частоту делят все процессы
+    на машине (например, crawl и веб-приложение). Без него корзина общая для потоков одного процесса.
+    """
+    INITIAL_RATE = float(os.getenv("GOMAFIA_RPS", 5))
+    MIN_RATE = float(os.getenv("GOMAFIA_MIN_RPS", 0.5))
+    MAX_RATE = float(os.getenv("GOMAFIA_MAX_RPS", 50))
+    INCREASE = 0.5
+    DECREASE = 0.5
+    DECREASE_INTERVAL = 1.0  # Секунд между двумя уменьшениями частоты
+
+    _shared = None
+    _shared_lock = threading.Lock()
+
+    def __init__(self, rate=None, min_rate=None, max_rate=None, burst=None, increase=None, decrease=None,
+                 state_file=None):
+        super().__init__(rate or self.INITIAL_RATE, burst)
+        self.min_rate = min(min_rate or self.MIN_RATE, self.rate)
+        self.max_rate = max(max_rate or self.MAX_RATE, self.rate)
+        self.increase = increase or self.INCREASE
+        self.decrease = decrease or self.DECREASE
+        if state_file and fcntl is None:
+            raise Exception("Общий для процессов файл состояния ограничителя не поддерживается на этой платформе")
+        self.state_file = os.path.abspath(state_file) if state_file else None
+        # Время по time.time(), а не monotonic, чтобы оно было общим для процессов
+        self._local_state = {"rate": self.rate, "tokens": self.burst, "updated": time.time(),
+                             "paused_until": 0.0, "decreased_at": 0.0}
+
+    @classmethod
+    def from_env(cls):
+        """
+        Ограничитель по переменным окружения GOMAFIA_RPS, GOMAFIA_MIN_RPS, GOMAFIA_MAX_RPS и GOMAFIA_RATE_FILE,
+        один на процесс; GOMAFIA_RPS=0 выключает ограничение.
+        """
+        if cls.INITIAL_RATE <= 0:
+            return None
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls(state_file=os.getenv("GOMAFIA_RATE_FILE") or None)
+        return cls._shared
+
+    @contextmanager
+    def _state(self):
+        """Состояние корзины под блокировкой; изменения сохраняются при выходе из блока."""
+        with self._lock:
+            if self.state_file is None:
+                yield self._local_state
+                return
+            fd = os.open(self.state_file, os.O_RDWR | os.O_CREAT, 0o644)
+            with os.fdopen(fd, "r+", encoding="utf-8") as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    state = json.loads(f.read() or "null") or dict(self._local_state)
+                except ValueError:
+                    logger.warning("Файл состояния ограничителя %s повреждён и будет перезаписан.", self.state_file)
+                    state = dict(self._local_state)
+                yield state
+                f.seek(0)
+                f.truncate()
+                f.write(json.dumps(state))
+                f.flush()
+
+    def _try_take(self):
+        with self._state() as state:
+            now = time.time()
+            self.rate = state["rate"]
+            if now < state["paused_until"]:
+                return state["paused_until"] - now
+            state["tokens"] = min(self.burst, state["tokens"] + max(0.0, now - state["updated"]) * state["rate"])
+            state["updated"] = now
+            if state["tokens"] >= 1:
+                state["tokens"] -= 1
+                return 0
+            return (1 - state["tokens"]) / state["rate"]
+
+    async def _try_take_async(self):
+        # Файл состояния читается и пишется с блокировкой flock — в цикле событий это блокирующий вызов
+        if self.state_file is None:
+            return self._try_take()
+        return await asyncio.to_thread(self._try_take)
+
+    async def on_response_async(self, status_code, retry_after=None):
+        if self.state_file is None:
+            self.on_response(status_code, retry_after)
+        else:
+            await asyncio.to_thread(self.on_response, status_code, retry_after)
+
+    def on_response(self, status_code, retry_after=None):
+        """
+        Подстраивает частоту по ответу сайта: 429 и 5xx уменьшают её, остальные ответы увеличивают.
+        retry_after — значение Retry-After в секундах, если сервер его прислал.
+        """
+        throttled = status_code == 429 or status_code >= 500
+        with self._state() as state:
+            now = time.time()
+            if not throttled:
+                state["rate"] = min(self.max_rate, state["rate"] + self.increase / state["rate"])
+            else:
+                if now - state["decreased_at"] >= self.DECREASE_INTERVAL:
+                    state["rate"] = max(self.min_rate, state["rate"] * self.decrease)
+                    state["decreased_at"] = now
+                    logger.info("Сайт ответил HTTP %s, частота запросов снижена до %.2f/с", status_code,
+                                state["rate"])
+                if retry_after:
+                    state["paused_until"] = max(state["paused_until"], now + retry_after)
+                    state["tokens"] = 0.0
+                    state["updated"] = state["paused_until"]
+            self.rate = state["rate"]
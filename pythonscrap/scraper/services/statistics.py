@@ -0,0 +1,58 @@
+import json
+import threading
+from ..db.database import DatabaseManager
+
+
+class StatisticsCache:
+    """
+    Кэш сводной статистики турниров в памяти процесса.
+    Ключом служит версия из stats_meta: любая запись турниров увеличивает её в той же транзакции,
+    поэтому кэш сбрасывается при записи из любого процесса, а проверка стоит одного запроса по ключу.
+    """
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    def __new__(cls):
+        with cls._instance_lock:
+            if cls._instance is None:
+                instance = super().__new__(cls)
+                instance._database = DatabaseManager()
+                instance._lock = threading.Lock()
+                instance._cached = None
+                cls._instance = instance
+        return cls._instance
+
+    def get(self) -> dict:
+        """
+        Возвращает {"version", "cities", "dates", "cities_json", "dates_json"}.
+        Статистика перечитывается и сериализуется только после изменения версии.
+        """
+        version = self._database.get_stats_version()
+        cached = self.peek(version)
+        if cached is not None:
+            return cached
+
+        with self._lock:
+            cached = self.peek(version)
+            if cached is not None:
+                return cached
+            return self.store(version, self._database.get_tournament_count_by_city(),
+                              self._database.get_tournament_load_by_date())
+
+    def peek(self, version: int):
+        """Возвращает закэшированную статистику, если она соответствует версии, иначе None."""
+        cached = self._cached
+        if cached is not None and cached["version"] == version:
+            return cached
+        return None
+
+    def store(self, version: int, cities: list, dates: list) -> dict:
+        """Сохраняет статистику версии version (например, прочитанную асинхронно) и возвращает её."""
+        self._cached = {
+            "version": version,
+            "cities": cities,
+            "dates": dates,
+            "cities_json": json.dumps(cities),
+            "dates_json": json.dumps(dates),
+        }
+        return self._cached
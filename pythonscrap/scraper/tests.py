@@ -1,7 +1,492 @@
-from django.test import TestCase
-from db.database import *
-if __name__ == "__main__":
-    database = DatabaseManager()
-    for i in range(500, 1000):
-        database.add_player_from_id(i)
-# Create your tests her.
+import asyncio
+import json
+import os
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import ExitStack
+from datetime import datetime, timedelta, timezone
+from io import StringIO
+from unittest import mock
+
+import numpy as np
+import psycopg2
+import requests
+from django.core.management.base import CommandError
+from django.test import RequestFactory, SimpleTestCase
+
+from scraper import views
+from scraper.benchmarks.gomafia_stub import GomafiaStub
+from scraper.db.async_database import AsyncDatabaseManager
+from scraper.db.database import PG_INTEGER_MAX, DatabaseManager, parse_player_id, search_users_params
+from scraper.db.temporary import temporary_database
+from scraper.management.commands.crawl import Command as CrawlCommand, parse_id_spec
+from scraper.services.downsampling import downsample, lttb_indices, lttb_indices_python, minmax_indices
+from scraper.services.gomafia_scraper import PlayerScraper, find_next_data, parse_history_page, parse_next_data
+from scraper.services.http_cache import HttpCache
+from scraper.services.http_client import AsyncHttpClient, HttpClient
+from scraper.services.rate_limiter import AdaptiveRateLimiter, RateLimiter
+
+
+def history_html(history, user=None, history_total=None, quote='"'):
+    """HTML страницы истории gomafia.pro с заданным __NEXT_DATA__."""
+    next_data = {"props": {"pageProps": {"serverData": {
+        "user": user or {"id": "7", "login": "tester", "avatar_link": None},
+        "history": history,
+        "historyTotal": len(history) if history_total is None else history_total,
+    }}}}
+    return (f'<html><body><div id="__next"></div><script id={quote}__NEXT_DATA__{quote} type="application/json">'
+            f'{json.dumps(next_data, ensure_ascii=False)}</script></body></html>')
+
+
+TOURNAMENTS = [
+    {"id": "101", "title": "Кубок", "date_start": "2024-01-01", "date_end": "2024-01-02", "place": "1",
+     "gg": "10.00", "elo": 12, "games": [
+         {"game_num": "1", "role": "don", "role_translate": "Дон", "place": "3", "win": "mafia",
+          "win_translate": "Мафия", "elo": 5},
+         {"game_num": "2", "role": "civ", "role_translate": "Мирный", "place": "5", "win": "civ",
+          "win_translate": "Мирные", "elo": -2},
+     ]},
+    {"id": "102", "title": "Лига", "date_start": "2024-02-01", "date_end": "2024-02-01", "place": "4",
+     "gg": "3.00", "elo": -4, "games": []},
+]
+
+
+class DownsamplingTests(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        self.x = np.cumsum(rng.integers(1, 8, 5000)).astype(np.float64)
+        self.y = 1000 + np.cumsum(rng.normal(0, 15, 5000))
+
+    def assert_valid_indices(self, indices, n, count=None):
+        indices = np.asarray(indices)
+        if count is not None:
+            self.assertEqual(len(indices), count)
+        self.assertEqual(indices[0], 0)
+        self.assertEqual(indices[-1], n - 1)
+        self.assertTrue((np.diff(indices) > 0).all())
+
+    def test_lttb_keeps_endpoints_and_order(self):
+        # Крупные корзины (цикл по корзинам) и мелкие (таблица переходов)
+        for threshold in (3, 45, 100, 500, 4999):
+            with self.subTest(threshold=threshold):
+                self.assert_valid_indices(lttb_indices(self.x, self.y, threshold), len(self.x), threshold)
+
+    def test_lttb_matches_reference(self):
+        for threshold in (3, 20, 100, 500, 1000, 4999):
+            with self.subTest(threshold=threshold):
+                self.assertEqual(list(lttb_indices(self.x, self.y, threshold)),
+                                 lttb_indices_python(self.x.tolist(), self.y.tolist(), threshold))
+
+    def test_lttb_short_series_is_unchanged(self):
+        self.assertEqual(list(lttb_indices(self.x[:10], self.y[:10], 20)), list(range(10)))
+        self.assertEqual(list(lttb_indices(self.x, self.y, 2)), list(range(len(self.x))))
+
+    def test_minmax_keeps_extremes(self):
+        indices = minmax_indices(self.y, 100)
+        self.assert_valid_indices(indices, len(self.y))
+        self.assertLessEqual(len(indices), 100)
+        self.assertEqual(self.y[indices].max(), self.y.max())
+        self.assertEqual(self.y[indices].min(), self.y.min())
+
+    def test_minmax_small_threshold_keeps_endpoints(self):
+        self.assertEqual(list(minmax_indices(self.y, 3)), [0, len(self.y) - 1])
+        self.assertEqual(list(minmax_indices(self.y[:3], 3)), [0, 1, 2])
+
+    def test_downsample(self):
+        dates = [str(np.datetime64("2020-01-01") + i) for i in range(300)]
+        values = self.y[:300].tolist()
+        new_dates, new_values = downsample(dates, values, "lttb", 50)
+        self.assertEqual(len(new_dates), 50)
+        self.assertEqual((new_dates[0], new_dates[-1]), (dates[0], dates[-1]))
+        self.assertEqual(downsample(dates[:10], values[:10], "minmax", 50), (dates[:10], values[:10]))
+        with self.assertRaises(ValueError):
+            downsample(dates, values, "average", 50)
+
+
+class HistoryParsingTests(SimpleTestCase):
+    def test_find_next_data(self):
+        next_data = find_next_data(history_html(TOURNAMENTS))
+        self.assertEqual(next_data["props"]["pageProps"]["serverData"]["historyTotal"], 2)
+        self.assertIsNone(find_next_data("<html><body>Нет данных</body></html>"))
+        self.assertIsNone(find_next_data('<script id="__NEXT_DATA__">{не json</script>'))
+
+    def test_parse_next_data_falls_back_to_soup(self):
+        html = history_html(TOURNAMENTS, quote="'")
+        self.assertIsNone(find_next_data(html))
+        self.assertEqual(len(parse_next_data(html)["props"]["pageProps"]["serverData"]["history"]), 2)
+
+    def test_parse_history_page(self):
+        user_data, history_total, tournaments, games, timings = parse_history_page(
+            7, history_html(TOURNAMENTS, history_total=25), with_user=True)
+        self.assertEqual(user_data["login"], "tester")
+        self.assertEqual(user_data["avatar_link"], "Аватар отсутствует")
+        self.assertEqual(history_total, 25)
+        self.assertEqual([tournament["id"] for tournament in tournaments], ["101", "102"])
+        self.assertEqual(tournaments[1]["country_translate"], "Неизвестно")
+        self.assertEqual([(game["tournament_id"], game["game_num"]) for game in games], [("101", "1"), ("101", "2")])
+        self.assertEqual(set(timings), {"extract_next_data", "extract_data"})
+
+    def test_parse_history_page_skips_known_tournaments(self):
+        user_data, _, tournaments, games, _ = parse_history_page(7, history_html(TOURNAMENTS), frozenset({"101"}))
+        self.assertIsNone(user_data)
+        self.assertEqual([tournament["id"] for tournament in tournaments], ["102"])
+        self.assertEqual(games, [])
+
+    def test_parse_history_page_without_user(self):
+        html = history_html(TOURNAMENTS).replace('"login": "tester", ', "").replace('"id": "7", ', "")
+        html = html.replace('"avatar_link": null', "")
+        with self.assertRaises(Exception):
+            parse_history_page(7, html, with_user=True)
+
+
+class RateLimiterTests(SimpleTestCase):
+    def test_token_bucket(self):
+        limiter = RateLimiter(10, burst=2)
+        self.assertEqual(limiter._try_take(), 0)
+        self.assertEqual(limiter._try_take(), 0)
+        self.assertGreater(limiter._try_take(), 0)
+        with self.assertRaises(ValueError):
+            RateLimiter(0)
+
+    def test_adaptive_increase_and_decrease(self):
+        limiter = AdaptiveRateLimiter(4, min_rate=1, max_rate=5, increase=2, decrease=0.5)
+        limiter.on_response(200)
+        self.assertAlmostEqual(limiter.rate, 4.5)
+        limiter.on_response(200)
+        limiter.on_response(200)
+        self.assertEqual(limiter.rate, 5)  # Не выше max_rate
+
+        limiter.on_response(429)
+        self.assertEqual(limiter.rate, 2.5)
+        # Пачка ошибок от параллельных запросов уменьшает частоту один раз за DECREASE_INTERVAL
+        limiter.on_response(503)
+        self.assertEqual(limiter.rate, 2.5)
+        limiter._local_state["decreased_at"] -= limiter.DECREASE_INTERVAL
+        limiter.on_response(503)
+        limiter._local_state["decreased_at"] -= limiter.DECREASE_INTERVAL
+        limiter.on_response(503)
+        self.assertEqual(limiter.rate, 1)  # Не ниже min_rate
+
+    def test_retry_after_pauses_requests(self):
+        limiter = AdaptiveRateLimiter(100)
+        limiter.on_response(429, retry_after=30)
+        self.assertGreater(limiter._try_take(), 29)
+
+    def test_state_file_is_shared(self):
+        with tempfile.TemporaryDirectory() as directory:
+            state_file = os.path.join(directory, "rate.json")
+            first = AdaptiveRateLimiter(4, state_file=state_file)
+            second = AdaptiveRateLimiter(4, state_file=state_file)
+            first.on_response(429)
+            self.assertEqual(second._try_take(), 0)
+            self.assertEqual(second.rate, 2)
+
+    def test_from_env_disabled_by_zero_rate(self):
+        with mock.patch.object(AdaptiveRateLimiter, "INITIAL_RATE", 0):
+            self.assertIsNone(AdaptiveRateLimiter.from_env())
+
+
+class HttpCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.cache = HttpCache(self.directory.name, ttl=60, max_bytes=10 ** 6)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def blob_count(self):
+        return self.cache._index().execute("SELECT COUNT(*) FROM blobs").fetchone()[0]
+
+    def test_store_and_lookup(self):
+        self.cache.store("https://gomafia.pro/stats/1", "страница".encode(), "utf-8", '"v1"', None)
+        entry = self.cache.lookup("https://gomafia.pro/stats/1")
+        self.assertTrue(self.cache.is_fresh(entry))
+        self.assertEqual(self.cache.validators(entry), {"If-None-Match": '"v1"'})
+        response = self.cache.response(entry)
+        self.assertEqual(response.text, "страница")
+        self.assertTrue(response.from_cache)
+        self.assertIsNone(self.cache.lookup("https://gomafia.pro/stats/2"))
+
+    def test_not_modified_extends_entry(self):
+        url = "https://gomafia.pro/stats/1"
+        self.cache.store(url, b"body", etag='"v1"')
+        self.cache._index().execute("UPDATE entries SET fetched_at = 0")
+        self.cache._index().commit()
+        entry = self.cache.lookup(url)
+        self.assertFalse(self.cache.is_fresh(entry))
+
+        not_modified = requests.Response()
+        not_modified.status_code = 304
+        response = self.cache.update(url, entry, not_modified)
+        self.assertEqual((response.status_code, response.content), (200, b"body"))
+        self.assertTrue(self.cache.is_fresh(self.cache.lookup(url)))
+
+    def test_identical_bodies_share_blob(self):
+        self.cache.store("a", b"same")
+        self.cache.store("b", b"same")
+        self.assertEqual(self.blob_count(), 1)
+
+    def test_evicts_least_recently_used(self):
+        cache = HttpCache(self.directory.name, max_bytes=2500)
+        for index in range(3):
+            cache.store(f"url{index}", os.urandom(1000))
+            time.sleep(0.01)
+        self.assertIsNone(cache.lookup("url0"))
+        self.assertIsNotNone(cache.lookup("url2"))
+        self.assertLessEqual(cache._index().execute("SELECT SUM(size) FROM blobs").fetchone()[0], 2500)
+        files = sum(len(names) for _, _, names in os.walk(os.path.join(self.directory.name, "objects")))
+        self.assertEqual(files, self.blob_count())
+
+    def test_missing_blob_removes_index_rows(self):
+        self.cache.store("a", b"body")
+        os.remove(self.cache._blob_path(self.cache.lookup("a")["digest"]))
+        self.assertIsNone(self.cache.lookup("a"))
+        self.assertEqual(self.blob_count(), 0)
+
+
+class ConditionalJsonTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.database = mock.Mock()
+        self.database.get_player_version.return_value = {
+            "scrape_version": 3, "scraped_at": datetime(2024, 5, 1, tzinfo=timezone.utc)}
+        self.database.get_tournaments_by_user_id.return_value = [{"id": 101}]
+        patcher = mock.patch.object(views, "DatabaseManager", return_value=self.database)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_etag_and_not_modified(self):
+        response = views.api_player_tournaments(self.factory.get("/api/player/7/tournaments"), 7)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["ETag"], '"tournaments-7-3"')
+        self.assertIn("Last-Modified", response)
+        self.assertEqual(json.loads(response.content)["tournaments"], [{"id": 101}])
+
+        self.database.get_tournaments_by_user_id.reset_mock()
+        request = self.factory.get("/api/player/7/tournaments", HTTP_IF_NONE_MATCH='"tournaments-7-3"')
+        response = views.api_player_tournaments(request, 7)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], '"tournaments-7-3"')
+        self.database.get_tournaments_by_user_id.assert_not_called()
+
+    def test_new_version_changes_etag(self):
+        self.database.get_player_version.return_value["scrape_version"] = 4
+        request = self.factory.get("/api/player/7/tournaments", HTTP_IF_NONE_MATCH='"tournaments-7-3"')
+        response = views.api_player_tournaments(request, 7)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["ETag"], '"tournaments-7-4"')
+
+    def test_missing_player(self):
+        self.database.get_player_version.return_value = None
+        response = views.api_player_tournaments(self.factory.get("/api/player/7/tournaments"), 7)
+        self.assertEqual(response.status_code, 404)
+
+
+class PlayerSearchTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.database = mock.Mock()
+        self.database.search_users.return_value = []
+        patcher = mock.patch.object(views, "DatabaseManager", return_value=self.database)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def search(self, **params):
+        response = views.player_search(self.factory.get("/players/search/", params))
+        self.assertEqual(response.status_code, 200)
+        return self.database.search_users.call_args.args
+
+    def test_parse_player_id(self):
+        self.assertEqual(parse_player_id("575"), 575)
+        self.assertEqual(parse_player_id(str(PG_INTEGER_MAX)), PG_INTEGER_MAX)
+        for value in (None, "", "abc", "-5", "²", "١٢", str(PG_INTEGER_MAX + 1)):
+            with self.subTest(value=value):
+                self.assertIsNone(parse_player_id(value))
+
+    def test_query_out_of_integer_range_is_not_an_id(self):
+        params = search_users_params("99999999999", 20)
+        self.assertIsNone(params["player_id"])
+        self.assertEqual(params["pattern"], "%99999999999%")
+        self.search(q="99999999999")
+
+    def test_unicode_digit_query_is_not_an_id(self):
+        self.assertIsNone(search_users_params("²", 20)["player_id"])
+        self.search(q="²")
+
+    def test_after_id_out_of_integer_range_starts_from_first_page(self):
+        self.assertEqual(self.search(q="ab", after_login="ab", after_id="99999999999")[3], None)
+        self.assertEqual(self.search(q="ab", after_login="ab", after_id="42")[3], 42)
+
+
+class CrawlTests(SimpleTestCase):
+    def test_parse_id_spec(self):
+        self.assertEqual(parse_id_spec("500-502"), range(500, 503))
+        self.assertEqual(parse_id_spec(" 7 "), range(7, 8))
+        with self.assertRaises(CommandError):
+            parse_id_spec("abc")
+
+    def skip(self, states, **options):
+        database = mock.Mock()
+        database.get_crawl_state.return_value = states
+        options = {"not_found_ttl": 3600, "retry_failed": False, "resume": False, "max_attempts": None, **options}
+        return CrawlCommand(stdout=StringIO())._skip_by_state(database, [1, 2, 3, 4, 5], options)
+
+    def test_skip_by_state(self):
+        now = datetime.now(timezone.utc)
+        states = {
+            1: {"status": "done", "attempts": 0, "updated_at": now},
+            2: {"status": "not_found", "attempts": 0, "updated_at": now},
+            3: {"status": "not_found", "attempts": 0, "updated_at": now - timedelta(hours=2)},
+            4: {"status": "failed", "attempts": 3, "updated_at": now},
+        }
+        # Недавно отсутствовавшие на сайте ID пропускаются всегда, устаревшие проверяются заново
+        self.assertEqual(self.skip(states), [1, 3, 4, 5])
+        self.assertEqual(self.skip(states, resume=True), [3, 4, 5])
+        self.assertEqual(self.skip(states, resume=True, max_attempts=3), [3, 5])
+        self.assertEqual(self.skip(states, retry_failed=True), [4])
+
+
+def player(player_id, login="tester"):
+    """Профиль игрока в формате PlayerScraper.extract_data."""
+    return {"id": str(player_id), "club_id": None, "login": login, "first_name": "", "last_name": "",
+            "date_registration": "", "icon_type": None, "icon": None, "gcoin": "", "elo": "", "vk_id": "",
+            "referee_license": "", "is_paid": False, "is_can_comment": False, "since": "", "avatar_link": None}
+
+
+def tournament(tournament_id, date_start, elo):
+    """Турнир игрока в формате PlayerScraper.extract_data."""
+    return {"id": str(tournament_id), "title": f"Турнир {tournament_id}", "date_start": date_start,
+            "date_end": date_start, "country_translate": "Россия", "city_translate": "Иркутск", "place": "1",
+            "gg": "1.00", "elo": elo}
+
+
+class DatabaseTests(SimpleTestCase):
+    """
+    Запись и чтение через DatabaseManager на временной базе (см. scraper.db.temporary), которая
+    создаётся на сервере из POSTGRES_* и удаляется после тестов. Без доступного сервера тесты пропускаются.
+    Игроки и турниры у каждого теста свои, поэтому база между тестами не очищается.
+    """
+
+    @classmethod
+    def setUpClass(cls):
+        stack = ExitStack()
+        try:
+            stack.enter_context(temporary_database())
+        except psycopg2.OperationalError as e:
+            raise unittest.SkipTest(f"PostgreSQL недоступен: {e}")
+        cls.addClassCleanup(stack.close)
+        cls.database = DatabaseManager()
+        super().setUpClass()
+
+    def start_stub(self, **options):
+        """Запускает заглушку gomafia.pro и направляет на неё скраппер без кэша и ограничения частоты."""
+        stub = GomafiaStub(**options).start()
+        self.addCleanup(stub.stop)
+        http = HttpClient()
+        for patcher in (mock.patch.object(PlayerScraper, "BASE_URL", stub.url),
+                        mock.patch.object(http, "cache", None), mock.patch.object(http, "rate_limiter", None)):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        return stub
+
+    def test_streaming_load_is_hidden_until_finished(self):
+        load_id = self.database.begin_player_load(player(901, "streamer"))
+        self.database.write_player_batch(901, load_id, [tournament(90101, "2024-01-01", 10)], [])
+        self.assertFalse(self.database.is_player_exists(901))
+        self.assertEqual(self.database.search_users("streamer"), [])
+
+        self.database.finish_player_load(901, load_id)
+        self.assertTrue(self.database.is_player_exists(901))
+        self.assertEqual([row['id'] for row in self.database.search_users("streamer")], [901])
+        self.assertEqual([row['id'] for row in self.database.get_tournaments_by_user_id(901)], [90101])
+        self.assertIsNone(self.database.begin_player_load(player(901, "streamer")))
+
+    def test_stale_load_is_taken_over(self):
+        stale = self.database.begin_player_load(player(902))
+        self.database.write_player_batch(902, stale, [tournament(90201, "2024-01-01", 10)], [])
+        # Новая загрузка удаляет строки прерванной, а пакеты прерванной больше не записываются
+        current = self.database.begin_player_load(player(902))
+        with self.assertRaises(Exception):
+            self.database.write_player_batch(902, stale, [tournament(90202, "2024-01-02", 5)], [])
+        self.database.write_player_batch(902, current, [tournament(90203, "2024-01-03", 1)], [])
+        with self.assertRaises(Exception):
+            self.database.finish_player_load(902, stale)
+        self.database.finish_player_load(902, current)
+        self.assertEqual([row['id'] for row in self.database.get_tournaments_by_user_id(902)], [90203])
+
+    def test_incremental_refresh(self):
+        stub = self.start_stub(pages=2, games_per_tournament=2)
+        self.assertEqual(self.database.add_player_from_id(903), {"status": "success"})
+        self.assertEqual(stub.requests, 2)
+        self.assertEqual(len(self.database.get_tournaments_by_user_id(903)), 2 * PlayerScraper.PAGE_SIZE)
+
+        # Новых турниров нет — скачивается только первая страница истории
+        self.assertEqual(self.database.refresh_player_from_id(903), {"status": "success", "new_tournaments": 0})
+        self.assertEqual(stub.requests, 3)
+
+        # Самый свежий турнир как будто сыгран после прошлого скрапинга
+        newest = int(parse_next_data(stub.page(903, 1))["props"]["pageProps"]["serverData"]["history"][0]["id"])
+        with self.database._connection() as conn, conn.cursor() as cursor:
+            cursor.execute("DELETE FROM games WHERE user_id = 903 AND tournament_id = %s", (newest,))
+            cursor.execute("DELETE FROM participations WHERE user_id = 903 AND tournament_id = %s", (newest,))
+        self.assertEqual(self.database.refresh_player_from_id(903), {"status": "success", "new_tournaments": 1})
+        self.assertEqual(stub.requests, 4)
+        self.assertEqual(len(self.database.get_tournaments_by_user_id(903)), 2 * PlayerScraper.PAGE_SIZE)
+        self.assertEqual(sum(row['games'] for row in self.database.get_role_stats(903)),
+                         2 * 2 * PlayerScraper.PAGE_SIZE)
+
+    def test_concurrent_adds_scrape_once(self):
+        stub = self.start_stub(pages=3, latency=0.05)
+
+        def add_async():
+            async def main():
+                http = AsyncHttpClient()
+                http.cache, http.rate_limiter = None, None
+                database = AsyncDatabaseManager()
+                try:
+                    return await asyncio.gather(*(database.add_player_from_id(904) for _ in range(2)))
+                finally:
+                    await database.close()
+            return asyncio.run(main())
+
+        # Два синхронных вызова и два цикла событий, в каждом по два вызова: скрапинг должен быть один
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            sync_results = [executor.submit(self.database.add_player_from_id, 904) for _ in range(2)]
+            async_results = [executor.submit(add_async) for _ in range(2)]
+            results = [future.result() for future in sync_results]
+            results += [result for future in async_results for result in future.result()]
+        self.assertEqual(results, [{"status": "success"}] * 6)
+        self.assertEqual(stub.requests, 3)
+
+    def test_elo_series(self):
+        self.database.insert_user_and_related_data(player(905), [
+            tournament(90501, "2024-01-03", 10),
+            tournament(90502, "2024-01-20", -4),
+            tournament(90503, "2024-02-05", 7),
+        ], [])
+        self.assertEqual(self.database.get_elo_series(905),
+                         [("2024-01-03", 1010), ("2024-01-20", 1006), ("2024-02-05", 1013)])
+        self.assertEqual(self.database.get_elo_series(905, "week"),
+                         [("2024-01-01", 1010), ("2024-01-15", 1006), ("2024-02-05", 1013)])
+        self.assertEqual(self.database.get_elo_series(905, "month"), [("2024-01-01", 1006), ("2024-02-01", 1013)])
+
+    def test_elo_series_skips_undated_tournaments(self):
+        self.database.insert_user_and_related_data(player(908), [
+            tournament(90801, "2024-01-03", 10),
+            tournament(90802, "", 50),
+            tournament(90803, "2024-02-05", 7),
+        ], [])
+        self.assertEqual(self.database.get_elo_series(908), [("2024-01-03", 1010), ("2024-02-05", 1017)])
+        self.assertEqual(self.database.get_elo_series(908, "month"), [("2024-01-01", 1010), ("2024-02-01", 1017)])
+
+    def test_search_users(self):
+        self.database.insert_user_and_related_data(player(906, "Ferrari"), [], [])
+        self.database.insert_user_and_related_data(player(907, "ferrum"), [], [])
+        self.assertEqual([row['id'] for row in self.database.search_users("FER")], [906, 907])
+        self.assertEqual([row['id'] for row in self.database.search_users("fer", limit=1)], [906])
+        self.assertEqual([row['id'] for row in self.database.search_users("fer", 1, "ferrari", 906)], [907])
+        self.assertEqual([row['id'] for row in self.database.search_users("906")], [906])
+        self.assertEqual(self.database.search_users("99999999999"), [])
+        self.assertEqual(self.database.search_users("²"), [])
@@ -1,9 +1,21 @@
+from django.conf import settings
 from django.urls import path
 from . import views
 
+if settings.ASYNC_VIEWS:
+    # Под ASGI те же адреса обслуживают асинхронные версии представлений
+    from . import async_views as views
+
 urlpatterns = [
     path('player_tournaments/', views.player_tournaments, name='player_tournaments'),
     path('player/elo-chart/', views.player_elo_graph, name='player_elo_graph'),
     path('', views.index, name='index'),
     path('stats/', views.statistics_view, name='stats'),
+    path('players/search/', views.player_search, name='player_search'),
+    path('jobs/<int:job_id>/', views.scrape_job_status, name='scrape_job_status'),
+    path('api/players/<int:player_id>/tournaments/', views.api_player_tournaments, name='api_player_tournaments'),
+    path('api/players/<int:player_id>/elo/', views.api_player_elo, name='api_player_elo'),
+    path('api/players/<int:player_id>/roles/', views.api_player_roles, name='api_player_roles'),
+    path('api/stats/', views.api_statistics, name='api_statistics'),
+    path('metrics', views.metrics, name='metrics'),
 ]
@@ -1,10 +1,77 @@
 # scraper/views.py
+from django.http import HttpResponse, JsonResponse, Http404
 from django.shortcuts import render
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+from django.views.decorators.http import require_safe
 from scraper.db.database import *
+from scraper.services.jobs import ScrapeJobQueue
+from scraper.services.statistics import StatisticsCache
+from scraper.services.downsampling import METHODS as DOWNSAMPLE_METHODS, downsample
+from scraper.services.metrics import PROMETHEUS_CONTENT_TYPE, REGISTRY
 from django.utils.safestring import mark_safe
 import json
 
 
+ELO_CHART_POINTS = 500  # Точек на графике ELO по умолчанию при прореживании
+ELO_CHART_MAX_POINTS = 5000
+PLAYER_SEARCH_LIMIT = 20  # Размер страницы поиска игроков по умолчанию
+PLAYER_SEARCH_MAX_LIMIT = 50
+API_CACHE_MAX_AGE = 0  # Клиенты JSON API перепроверяют данные по ETag при каждом запросе
+
+
+def _elo_chart_params(request):
+    """
+    Разбирает параметры графика ELO: bucket (week / month — группировка точек),
+    downsample (lttb / minmax — прореживание длинных графиков) и points.
+    """
+    bucket = request.GET.get('bucket') or None
+    if bucket not in DatabaseManager.ELO_BUCKETS:
+        bucket = None
+    method = request.GET.get('downsample') or None
+    if method not in DOWNSAMPLE_METHODS:
+        method = None
+    try:
+        points = min(max(int(request.GET.get('points', ELO_CHART_POINTS)), 3), ELO_CHART_MAX_POINTS)
+    except ValueError:
+        points = ELO_CHART_POINTS
+    return bucket, method, points
+
+
+def _search_params(request):
+    """Разбирает параметры поиска игроков: (q, limit, after_login, after_id)."""
+    try:
+        limit = min(max(int(request.GET.get('limit', PLAYER_SEARCH_LIMIT)), 1), PLAYER_SEARCH_MAX_LIMIT)
+    except ValueError:
+        limit = PLAYER_SEARCH_LIMIT
+    # Некорректный или не помещающийся в INTEGER after_id означает первую страницу
+    after_id = parse_player_id(request.GET.get('after_id'))
+    return request.GET.get('q', ''), limit, request.GET.get('after_login'), after_id
+
+
+def _search_response(rows, limit):
+    """Формирует ответ поиска; rows содержит на одну строку больше limit, если есть следующая страница."""
+    results = [{'id': row['id'], 'login': row['login']} for row in rows[:limit]]
+    next_page = None
+    if len(rows) > limit:
+        next_page = {'after_login': results[-1]['login'], 'after_id': results[-1]['id']}
+    return JsonResponse({'results': results, 'next': next_page})
+
+
+def _job_status_response(job):
+    if job is None:
+        raise Http404("Задача не найдена")
+    error = None
+    if job['status'] == 'failed':
+        error = "Игрока с данным ID не существует, либо возникла ошибка при парсинге."
+    return JsonResponse({
+        'id': job['id'],
+        'player_id': job['player_id'],
+        'status': job['status'],
+        'error': error,
+    })
+
+
 def index(request):
     return render(request, 'scraper/main.html')
 
@@ -12,6 +79,7 @@ def index(request):
 def player_tournaments(request):
     tournaments = []
     player_id = None
+    job_id = None
     error = None
     database = DatabaseManager()
 
@@ -22,9 +90,10 @@ def player_tournaments(request):
         if new_player_id:  # Приоритет нового ID
             try:
                 player_id = int(new_player_id)
-                if not database.is_player_exists(player_id):
-                    database.add_player_from_id(player_id)
-                tournaments = database.get_tournaments_by_user_id(player_id)
+                if database.is_player_exists(player_id):
+                    tournaments = database.get_tournaments_by_user_id(player_id)
+                else:
+                    job_id = ScrapeJobQueue().enqueue(player_id)  # Скрапинг идёт в фоне, страница опрашивает статус
             except Exception as e:
                 error = f"Ошибка получения данных: {str(e)}"
         elif player_id:  # Если введен только ID из списка
@@ -35,12 +104,17 @@ def player_tournaments(request):
                 error = f"Ошибка получения данных: {str(e)}"
         else:
             error = "Выберите игрока или введите его ID."
+    elif request.GET.get('player_id'):  # Переход со страницы после завершения фонового скрапинга
+        try:
+            player_id = int(request.GET['player_id'])
+            tournaments = database.get_tournaments_by_user_id(player_id)
+        except Exception as e:
+            error = f"Ошибка получения данных: {str(e)}"
 
-    users = database.get_users()  # Получаем список пользователей для выпадающего списка
     return render(request, 'scraper/player_tournaments.html', {
         'player_id': player_id,
         'tournaments': tournaments,
-        'users': users,
+        'job_id': job_id,
         'error': error,
     })
 
@@ -48,42 +122,23 @@ def player_tournaments(request):
 def player_elo_graph(request):
     database = DatabaseManager()
     error = None
+    job_id = None
     dates_json = []
     elo_values_json = []
-    print(request)
     player_id = request.GET.get('player_id')  # Получаем ID игрока из GET-запроса
-    users = database.get_users()  # Получаем список пользователей для выпадающего списка
-    print(player_id)
+    bucket, method, points = _elo_chart_params(request)
     if player_id:
         try:
             if database.is_player_exists(int(player_id)):
-                elo_data = database.get_elo_changes_by_date(int(player_id))  # Получаем данные эло
-                print(elo_data)
-
-                # Начальное значение эло
-                current_elo = 1000
-
-                # Обработка изменений по эло
-                for date, elo_change in elo_data:
+                # Накопленное ELO считается в PostgreSQL оконной функцией
+                for date, elo in database.get_elo_series(int(player_id), bucket):
                     dates_json.append(date)
-                    current_elo += elo_change  # Корректируем эло
-                    elo_values_json.append(current_elo)
+                    elo_values_json.append(elo)
+                if method:
+                    dates_json, elo_values_json = downsample(dates_json, elo_values_json, method, points)
             else:
-                status = database.add_player_from_id(int(player_id))
-                if status.get("status") == "success":
-                    elo_data = database.get_elo_changes_by_date(int(player_id))  # Получаем данные эло
-                    print(elo_data)
-
-                    # Начальное значение эло
-                    current_elo = 1000
-
-                    # Обработка изменений по эло
-                    for date, elo_change in elo_data:
-                        dates_json.append(date)
-                        current_elo += elo_change  # Корректируем эло
-                        elo_values_json.append(current_elo)
-                else:
-                    error = "Игрока с данным ID не существует, либо возникла ошибка при парсинге."
+                # Скрапинг идёт в фоне, страница опрашивает статус задачи и перезагружается по готовности
+                job_id = ScrapeJobQueue().enqueue(int(player_id))
         except ValueError:
             error = "Неверный формат ID игрока. Пожалуйста, введите число."
 
@@ -91,25 +146,145 @@ def player_elo_graph(request):
         'player_id': player_id,
         'dates_json': dates_json,
         'elo_values_json': elo_values_json,
-        'users': users,
+        'bucket': bucket,
+        'downsample': method,
+        'points': points,
+        'job_id': job_id,
         'error': error
     })
 
 
-def statistics_view(request):
-    db = DatabaseManager()
+def player_search(request):
+    """
+    Поиск игроков для автодополнения: ?q=логин или ID, ?limit=, а для следующей страницы
+    ?after_login= и ?after_id= из поля next предыдущего ответа.
+    """
+    query, limit, after_login, after_id = _search_params(request)
+    if not query.strip():
+        return JsonResponse({'results': [], 'next': None})
+
+    # Запрашиваем на одну строку больше, чтобы узнать, есть ли следующая страница
+    return _search_response(DatabaseManager().search_users(query, limit + 1, after_login, after_id), limit)
 
-    # Получение данных для статистики
-    city_data = db.get_tournament_count_by_city()
-    date_data = db.get_tournament_load_by_date()
 
-    # Форматируем данные для передачи в шаблон
-    print(city_data)
-    print(date_data)
-    cities_json = json.dumps(city_data)  # Уже в нужном формате [{"city": ..., "count": ...}]
-    dates_json = json.dumps(date_data)  # Уже в нужном формате [{"date": ..., "count": ...}]
+def scrape_job_status(request, job_id):
+    """Возвращает статус фоновой задачи скрапинга для опроса со страниц игрока."""
+    return _job_status_response(ScrapeJobQueue().get_status(job_id))
+
+
+def statistics_view(request):
+    # Статистика берётся из сводных таблиц и сериализуется заново только после записи новых турниров
+    stats = StatisticsCache().get()
 
     return render(request, 'scraper/statistics.html', {
-        'cities_json': mark_safe(cities_json),
-        'dates_json': mark_safe(dates_json),
+        'cities_json': mark_safe(stats['cities_json']),  # [{"city": ..., "count": ...}]
+        'dates_json': mark_safe(stats['dates_json']),  # [{"date": ..., "count": ...}]
     })
+
+
+def _conditional_json(request, etag, last_modified, build_payload):
+    """
+    Отдаёт JSON с ETag и Last-Modified. Если заголовки запроса If-None-Match / If-Modified-Since
+    совпадают с текущей версией, возвращает 304 без тела, не вызывая build_payload.
+    """
+    etag, last_modified = _validators(etag, last_modified)
+    response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+    if response is None:
+        response = JsonResponse(build_payload())
+    return _with_cache_headers(response, etag, last_modified)
+
+
+def _validators(etag, last_modified):
+    """Приводит версию данных к заголовкам: ETag в кавычках и Last-Modified в секундах."""
+    return quote_etag(etag), int(last_modified.timestamp()) if last_modified else None
+
+
+def _with_cache_headers(response, etag, last_modified):
+    # Заголовки нужны и в ответе 304, чтобы клиент обновил сохранённую копию
+    response['ETag'] = etag
+    if last_modified is not None:
+        response['Last-Modified'] = http_date(last_modified)
+    patch_cache_control(response, public=True, max_age=API_CACHE_MAX_AGE, must_revalidate=True)
+    return response
+
+
+def _player_not_found(player_id):
+    return JsonResponse({'error': f"Игрок с ID {player_id} не найден в базе."}, status=404)
+
+
+@require_safe
+def api_player_tournaments(request, player_id):
+    """Турниры игрока в JSON. ETag строится из версии последнего скрапинга игрока."""
+    database = DatabaseManager()
+    version = database.get_player_version(player_id)
+    if version is None:
+        return _player_not_found(player_id)
+
+    return _conditional_json(
+        request,
+        f"tournaments-{player_id}-{version['scrape_version']}",
+        version['scraped_at'],
+        lambda: {'player_id': player_id, 'tournaments': database.get_tournaments_by_user_id(player_id)},
+    )
+
+
+@require_safe
+def api_player_roles(request, player_id):
+    """Статистика игрока по ролям (игры, победы, процент побед) в JSON."""
+    database = DatabaseManager()
+    version = database.get_player_version(player_id)
+    if version is None:
+        return _player_not_found(player_id)
+
+    return _conditional_json(
+        request,
+        f"roles-{player_id}-{version['scrape_version']}",
+        version['scraped_at'],
+        lambda: {'player_id': player_id, 'roles': database.get_role_stats(player_id)},
+    )
+
+
+@require_safe
+def api_player_elo(request, player_id):
+    """
+    Ряд ELO игрока в JSON. Параметры как у страницы графика: ?bucket=week|month,
+    ?downsample=lttb|minmax и ?points=. Они входят в ETag, так как меняют тело ответа.
+    """
+    bucket, method, points = _elo_chart_params(request)
+    database = DatabaseManager()
+    version = database.get_player_version(player_id)
+    if version is None:
+        return _player_not_found(player_id)
+
+    def build_payload():
+        series = database.get_elo_series(player_id, bucket)
+        dates = [date for date, _ in series]
+        values = [elo for _, elo in series]
+        if method:
+            dates, values = downsample(dates, values, method, points)
+        return {'player_id': player_id, 'bucket': bucket, 'downsample': method, 'dates': dates, 'elo': values}
+
+    return _conditional_json(request, _elo_etag(player_id, version, bucket, method, points),
+                             version['scraped_at'], build_payload)
+
+
+def _elo_etag(player_id, version, bucket, method, points):
+    """ETag ряда ELO: версия скрапинга игрока и параметры, от которых зависит тело ответа."""
+    return f"elo-{player_id}-{version['scrape_version']}-{bucket or 'all'}-{method or 'raw'}-{points if method else 0}"
+
+
+@require_safe
+def api_statistics(request):
+    """Сводная статистика турниров в JSON. ETag строится из версии stats_meta."""
+    meta = DatabaseManager().get_stats_meta()
+
+    def build_payload():
+        stats = StatisticsCache().get()
+        return {'cities': stats['cities'], 'dates': stats['dates']}
+
+    return _conditional_json(request, f"stats-{meta['version']}", meta['updated_at'], build_payload)
+
+
+def metrics(request):
+    """Метрики процесса (время этапов скрапинга, запросов к базе и представлений) в формате Prometheus."""
+    return HttpResponse(REGISTRY.render(), content_type=PROMETHEUS_CONTENT_TYPE)